@@ -0,0 +1,116 @@
+"""
+Closed-loop HTTP benchmark for the API.
+
+Logs in once, then keeps `--concurrency` keep-alive connections busy on each
+path for `--duration` seconds and prints requests/sec and latency
+percentiles. Standard library only, so it runs from any machine with Python:
+
+    python bench/http_bench.py --base-url http://localhost:8000 \\
+        --email buyer@example.com --password secret \\
+        /api/products/ /api/orders/
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def login(base, email, password):
+    conn = connect(base)
+    body = json.dumps({'email': email, 'password': password})
+    conn.request('POST', '/api/auth/login/', body, {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    payload = response.read()
+    if response.status != 200:
+        raise SystemExit(f"login failed: {response.status} {payload[:200]!r}")
+    return json.loads(payload)['access']
+
+
+def connect(base):
+    cls = http.client.HTTPSConnection if base.scheme == 'https' else http.client.HTTPConnection
+    return cls(base.hostname, base.port, timeout=30)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def hammer(base, path, headers, concurrency, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        conn = connect(base)
+        local_latencies, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = connect(base)
+                ok = False
+            if ok:
+                local_latencies.append(time.perf_counter() - start)
+            else:
+                local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    args = parser.parse_args()
+
+    base = urlsplit(args.base_url)
+    headers = {'Authorization': f'Bearer {login(base, args.email, args.password)}'}
+
+    print(f"{'path':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for path in args.paths:
+        if args.warmup:
+            hammer(base, path, headers, args.concurrency, args.warmup)
+        result = hammer(base, path, headers, args.concurrency, args.duration)
+        print(f"{result['path']:<24} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+              f"{result['p95']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:19
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_link_link_consumer_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='order_version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='catalog_version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='order_version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
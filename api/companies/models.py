@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
@@ -31,6 +33,11 @@ class Supplier(models.Model):
     )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Replaced whenever the catalog / the orders of this Supplier change;
+    # ETags are derived from them (see companies.services)
+    catalog_version = models.UUIDField(default=uuid.uuid4, editable=False)
+    order_version = models.UUIDField(default=uuid.uuid4, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.company_name
@@ -40,6 +47,7 @@ class Consumer(models.Model):
     address = models.TextField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    order_version = models.UUIDField(default=uuid.uuid4, editable=False)
 
     def __str__(self):
         return self.company_name
@@ -62,10 +70,16 @@ class Link(models.Model):
     )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Status / soft delete changes are what delta sync sees as link removal
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Ensures a Consumer cannot request the same Supplier twice
         unique_together = ('supplier', 'consumer')
+        indexes = [
+            models.Index(fields=['consumer', 'created_at', 'id'], name='link_consumer_created_idx'),
+            models.Index(fields=['supplier', 'created_at', 'id'], name='link_supplier_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.consumer} -> {self.supplier} ({self.status})"
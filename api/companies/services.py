@@ -0,0 +1,81 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from scp_project.profiling import record_cache_lookup
+
+from .models import Consumer, Link, LinkStatus, Supplier
+
+
+def _consumer_key(consumer_id):
+    return f'links:consumer:{consumer_id}'
+
+
+def _supplier_key(supplier_id):
+    return f'links:supplier:{supplier_id}'
+
+
+def _accepted(key, column, **filters):
+    ids = cache.get(key)
+    record_cache_lookup(ids is not None)
+    if ids is None:
+        ids = frozenset(
+            Link.objects.filter(status=LinkStatus.ACCEPTED, is_active=True, **filters)
+            .values_list(column, flat=True)
+        )
+        cache.set(key, ids, settings.LINK_GRAPH_CACHE_TIMEOUT)
+    return ids
+
+
+def accepted_supplier_ids(consumer):
+    """
+    IDs of the Suppliers a Consumer has an active ACCEPTED link with.
+    Served from the cache; the DB is only hit after a miss or a Link change.
+    """
+    consumer_id = getattr(consumer, 'pk', consumer)
+    return _accepted(_consumer_key(consumer_id), 'supplier_id', consumer_id=consumer_id)
+
+
+def accepted_consumer_ids(supplier):
+    """
+    IDs of the Consumers a Supplier has an active ACCEPTED link with.
+    """
+    supplier_id = getattr(supplier, 'pk', supplier)
+    return _accepted(_supplier_key(supplier_id), 'consumer_id', supplier_id=supplier_id)
+
+
+def is_linked(consumer, supplier):
+    """
+    Does an active ACCEPTED link exist between the two companies?
+    """
+    return getattr(supplier, 'pk', supplier) in accepted_supplier_ids(consumer)
+
+
+def invalidate_link(consumer_id, supplier_id):
+    cache.delete_many([_consumer_key(consumer_id), _supplier_key(supplier_id)])
+
+
+def bump_catalog_version(*supplier_ids):
+    """
+    Give the Suppliers a fresh catalog version, invalidating ETags of every
+    product read that includes them. Call inside the writing transaction.
+    """
+    Supplier.objects.filter(id__in=supplier_ids).update(catalog_version=uuid.uuid4())
+
+
+def bump_order_version(consumer_id=None, supplier_id=None):
+    """
+    Fresh order versions for both sides of an order, once the writing
+    transaction commits. Bumping inside it would hold the company rows
+    locked until the commit, so every order of a supplier would queue on
+    its row. A reader in between gets the new orders under the old version;
+    the bump right after changes the ETag again.
+    """
+    def bump():
+        if supplier_id is not None:
+            Supplier.objects.filter(id=supplier_id).update(order_version=uuid.uuid4())
+        if consumer_id is not None:
+            Consumer.objects.filter(id=consumer_id).update(order_version=uuid.uuid4())
+    transaction.on_commit(bump)
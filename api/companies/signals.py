@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Consumer, Link, Supplier
+from .services import bump_catalog_version, bump_order_version, invalidate_link
+
+
+@receiver(post_save, sender=Link)
+@receiver(post_delete, sender=Link)
+def invalidate_link_graph(sender, instance, **kwargs):
+    # Drop the entries now for this transaction, and again after commit in
+    # case another request cached the old state in between
+    invalidate_link(instance.consumer_id, instance.supplier_id)
+    transaction.on_commit(lambda: invalidate_link(instance.consumer_id, instance.supplier_id))
+
+
+@receiver(post_save, sender=Supplier)
+def bump_supplier_versions(sender, instance, **kwargs):
+    # Name and status show up in product and order payloads. A full save
+    # also writes back whatever versions the instance had loaded, so always
+    # move on to fresh ones.
+    bump_catalog_version(instance.id)
+    bump_order_version(supplier_id=instance.id)
+
+
+@receiver(post_save, sender=Consumer)
+def bump_consumer_versions(sender, instance, **kwargs):
+    bump_order_version(consumer_id=instance.id)
@@ -1,14 +1,19 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from companies.models import Supplier, Consumer, Link, LinkStatus
+from companies.services import accepted_consumer_ids, accepted_supplier_ids, is_linked
+from scp_project.testing import QueryCountMixin
 from users.models import UserRole
 
 User = get_user_model()
 
 
-class LinkTests(APITestCase):
+class LinkTests(QueryCountMixin, APITestCase):
     def setUp(self):
         # 1. Target Supplier
         self.supplier_company = Supplier.objects.create(company_name="Beka Corp", address="123 dasdsad")
@@ -197,6 +202,16 @@ class LinkTests(APITestCase):
         self.assertFalse(link.is_active)  # Flag should be False
         self.assertIsNotNone(link.pk)  # Record should still exist
 
+    def test_link_list_queries_do_not_grow(self):
+        Link.objects.create(supplier=self.supplier_company, consumer=self.consumer_company)
+
+        def add_links():
+            for i in range(3):
+                consumer = Consumer.objects.create(company_name=f"Hotel {i}", address="..")
+                Link.objects.create(supplier=self.supplier_company, consumer=consumer)
+
+        self.assertQueriesDoNotGrow(self.list_url, self.supplier_user, add_links)
+
     def test_supplier_list_hides_archived_companies(self):
         """Test that the Supplier List endpoint hides inactive suppliers"""
         self.supplier_company.is_active = False
@@ -209,6 +224,60 @@ class LinkTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        companies = [s['company_name'] for s in response.data]
+        companies = [s['company_name'] for s in response.data['results']]
         self.assertIn("Active One", companies)
-        self.assertNotIn("Beka Corp", companies)
\ No newline at end of file
+        self.assertNotIn("Beka Corp", companies)
+
+
+class LinkGraphCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(company_name="Graph Supply", address="1 A St")
+        self.consumer = Consumer.objects.create(company_name="Graph Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@graph.com", "pass", role=UserRole.CONSUMER, consumer=self.consumer)
+        self.owner = User.objects.create_user("owner@graph.com", "pass", role=UserRole.OWNER, supplier=self.supplier)
+        self.link = Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.PENDING)
+
+    def test_accepted_ids_are_cached(self):
+        self.assertEqual(accepted_supplier_ids(self.consumer), frozenset())
+
+        # Second lookup is served from the cache
+        with self.assertNumQueries(0):
+            self.assertFalse(is_linked(self.consumer, self.supplier))
+
+    def test_status_change_invalidates_both_sides(self):
+        accepted_supplier_ids(self.consumer)
+        accepted_consumer_ids(self.supplier)
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.patch(reverse('link-detail', args=[self.link.id]), {"status": LinkStatus.ACCEPTED})
+
+        self.assertEqual(accepted_supplier_ids(self.consumer), {self.supplier.id})
+        self.assertEqual(accepted_consumer_ids(self.supplier), {self.consumer.id})
+
+    def test_unlink_and_delete_invalidate(self):
+        self.link.status = LinkStatus.ACCEPTED
+        self.link.save()
+        self.assertTrue(is_linked(self.consumer, self.supplier))
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.delete(reverse('link-detail', args=[self.link.id]))
+        self.assertFalse(is_linked(self.consumer, self.supplier))
+
+        self.link.is_active = True
+        self.link.save()
+        self.assertTrue(is_linked(self.consumer, self.supplier))
+        self.link.delete()
+        self.assertFalse(is_linked(self.consumer, self.supplier))
+
+    def test_product_list_skips_link_lookup_when_warm(self):
+        self.link.status = LinkStatus.ACCEPTED
+        self.link.save()
+        self.client.force_authenticate(user=self.buyer)
+        self.client.get(reverse('product-list'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('product-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries if 'companies_link' in q['sql']])
@@ -2,6 +2,9 @@ from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiPara
 from rest_framework import viewsets, permissions, exceptions, generics
 
 from users.models import UserRole
+from idempotency.mixins import IdempotentCreateMixin
+from scp_project.eager import EagerLoadingMixin
+from scp_project.profiling import SerializerTimingMixin
 from .models import Link, Supplier, LinkStatus
 from .serializers import LinkSerializer, LinkCreateSerializer, SupplierSerializer
 
@@ -46,7 +49,7 @@ from .serializers import LinkSerializer, LinkCreateSerializer, SupplierSerialize
     )
 )
 
-class LinkViewSet(viewsets.ModelViewSet):
+class LinkViewSet(IdempotentCreateMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Link.objects.none()
 
@@ -100,7 +103,7 @@ class LinkViewSet(viewsets.ModelViewSet):
         instance.is_active = False
         instance.save()
 
-class SupplierListView(generics.ListAPIView):
+class SupplierListView(SerializerTimingMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = SupplierSerializer
     queryset = Supplier.objects.filter(is_active=True)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'format', 'status', 'requested_by', 'rows_written', 'total_rows', 'created_at')
+    list_filter = ('status', 'kind', 'format')
+    search_fields = ('requested_by__email', 'error')
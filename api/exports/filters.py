@@ -0,0 +1,59 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def date_bound(params, name):
+    """
+    (aware datetime, whether only a date was given) for a date filter, or None.
+    """
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        day = parse_date(raw)
+        value = datetime.combine(day, time.min) if day else parse_datetime(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: "A date or datetime is required."})
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value, day is not None
+
+
+def status_list(params, choices):
+    raw = params.get('status')
+    if not raw:
+        return None
+    statuses = [value.strip().upper() for value in raw.split(',') if value.strip()]
+    invalid = set(statuses) - set(choices)
+    if invalid:
+        raise ValidationError({'status': f"Unknown status: {', '.join(sorted(invalid))}."})
+    return statuses
+
+
+def filter_export(queryset, params, statuses=None, status_field='status', created_field='created_at'):
+    """
+    Apply the export filters ?status=, ?created_after= and ?created_before=.
+
+    Dates are inclusive; full datetimes are also accepted. `statuses` lists
+    the allowed status values; without it ?status= is ignored.
+    """
+    if statuses is not None:
+        selected = status_list(params, statuses)
+        if selected:
+            queryset = queryset.filter(**{f'{status_field}__in': selected})
+    created_after = date_bound(params, 'created_after')
+    if created_after:
+        queryset = queryset.filter(**{f'{created_field}__gte': created_after[0]})
+    created_before = date_bound(params, 'created_before')
+    if created_before:
+        value, whole_day = created_before
+        if whole_day:
+            queryset = queryset.filter(**{f'{created_field}__lt': value + timedelta(days=1)})
+        else:
+            queryset = queryset.filter(**{f'{created_field}__lte': value})
+    return queryset
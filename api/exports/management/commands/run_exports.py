@@ -0,0 +1,44 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from exports.services import purge_expired, run_next
+
+PURGE_INTERVAL = 3600  # seconds
+
+
+class Command(BaseCommand):
+    help = "Run queued export jobs and write their files under EXPORTS_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help="Seconds to wait when there is nothing to do")
+        parser.add_argument('--once', action='store_true',
+                            help="Run the jobs queued right now and exit")
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        last_purge = None
+        while self.running:
+            close_old_connections()
+            # A job in progress is finished before stopping
+            if run_next():
+                total += 1
+                continue
+            if options['once']:
+                break
+            if last_purge is None or time.monotonic() - last_purge > PURGE_INTERVAL:
+                purge_expired()
+                last_purge = time.monotonic()
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Export worker stopped after {total} jobs."))
+
+    def stop(self, signum, frame):
+        self.running = False
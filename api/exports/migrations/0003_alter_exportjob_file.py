@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:42
+
+import exports.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0002_exportjob_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=exports.storage.ExportStorage(), upload_to=''),
+        ),
+    ]
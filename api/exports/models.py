@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .storage import export_storage
+
+
+class ExportKind(models.TextChoices):
+    ORDERS = 'ORDERS', 'Orders with items'
+    COMPLAINTS = 'COMPLAINTS', 'Complaints'
+    PRODUCTS = 'PRODUCTS', 'Product catalog'
+
+
+class ExportFormat(models.TextChoices):
+    CSV = 'CSV', 'CSV'
+    XLSX = 'XLSX', 'Excel'
+    PARQUET = 'PARQUET', 'Parquet'
+
+
+class ExportStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    RUNNING = 'RUNNING', 'Running'
+    DONE = 'DONE', 'Done'
+    FAILED = 'FAILED', 'Failed'
+
+
+class ExportJob(models.Model):
+    """
+    A requested export. The API only inserts the row; `manage.py run_exports`
+    claims it, writes the file under EXPORTS_ROOT and records progress
+    on the row as it goes.
+    """
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='export_jobs'
+    )
+    kind = models.CharField(max_length=20, choices=ExportKind.choices)
+    format = models.CharField(max_length=20, choices=ExportFormat.choices, default=ExportFormat.CSV)
+    # Filters as sent by the client, validated when the job was created
+    params = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(
+        max_length=20,
+        choices=ExportStatus.choices,
+        default=ExportStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # A failed job waits until then before it is claimed again
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(storage=export_storage, max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped with every progress update, so it doubles as the worker's heartbeat
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['requested_by', 'created_at', 'id'], name='export_user_created_idx'),
+            # Workers only ever scan unfinished jobs
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                name='export_open_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} export #{self.id} ({self.status})"
@@ -0,0 +1,61 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from .models import ExportJob, ExportStatus
+from .sources import SOURCES
+from .writers import format_available
+
+FILTERS = ('status', 'created_after', 'created_before')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'format', 'params', 'status', 'total_rows', 'rows_written', 'progress', 'error',
+                  'download_url', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_progress(self, obj) -> float | None:
+        if obj.status == ExportStatus.DONE:
+            return 1.0
+        if not obj.total_rows:
+            return None
+        return min(obj.rows_written / obj.total_rows, 1.0)
+
+    def get_download_url(self, obj) -> str | None:
+        if obj.status != ExportStatus.DONE:
+            return None
+        return reverse('export-job-download', args=[obj.id])
+
+
+class ExportJobCreateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = ['kind', 'format', 'params']
+
+    def validate_format(self, value):
+        if not format_available(value):
+            raise serializers.ValidationError(f"{value} exports are not available on this server.")
+        return value
+
+    def validate_params(self, value):
+        unknown = set(value) - set(FILTERS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(sorted(unknown))}.")
+        if not all(isinstance(item, str) for item in value.values()):
+            raise serializers.ValidationError("Filter values must be strings.")
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if not (user.supplier or user.consumer):
+            raise serializers.ValidationError("Only company staff can export data.")
+        # Same filter checks the worker runs, so bad input fails now
+        try:
+            SOURCES[attrs['kind']](user, attrs.get('params', {}))
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'params': exc.detail})
+        return attrs
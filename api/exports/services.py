@@ -0,0 +1,157 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from notifications.models import NotificationType
+from notifications.services import notify
+from .models import ExportJob, ExportStatus
+from .storage import export_storage
+from .sources import SOURCES
+from .writers import WRITERS
+
+
+def _setting(name):
+    return settings.EXPORTS[name]
+
+
+def _backoff(attempts):
+    delay = _setting('BACKOFF_SECONDS') * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, _setting('MAX_BACKOFF_SECONDS')))
+
+
+def claim_job():
+    """
+    Take the oldest pending job that is due and mark it RUNNING, or return None.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED so several
+    workers can run side by side. A RUNNING job whose heartbeat is older
+    than EXPORTS['STALE_SECONDS'] belonged to a worker that died and is
+    taken over.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('STALE_SECONDS'))
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ExportStatus.PENDING, next_attempt_at__lte=now)
+                    | Q(status=ExportStatus.RUNNING, updated_at__lt=stale))
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportStatus.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.rows_written = 0
+        job.error = ''
+        job.save()
+    return job
+
+
+def _write_file(job):
+    """
+    Stream the job's rows into a new file and return its name under EXPORTS_ROOT.
+
+    Rows are read through a server-side cursor in chunks of
+    EXPORTS['CHUNK_SIZE'], so memory stays flat however large the export.
+    The file is written under a temporary name and renamed once complete.
+    """
+    columns, rows = SOURCES[job.kind](job.requested_by, job.params)
+    job.total_rows = rows.count()
+    ExportJob.objects.filter(id=job.id).update(total_rows=job.total_rows, updated_at=timezone.now())
+
+    writer_class, _ = WRITERS[job.format]
+    # One directory per attempt: a worker taken over for being stale may
+    # still be writing to the previous one
+    name = f"{job.id}-{job.attempts}/{job.kind.lower()}-{timezone.localdate():%Y%m%d}.{writer_class.extension}"
+    path = Path(export_storage.path(name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+
+    chunk_size = _setting('CHUNK_SIZE')
+    iterator = rows.iterator(chunk_size=chunk_size)
+    written = 0
+    last_progress = time.monotonic()
+    writer = writer_class(partial, columns)
+    try:
+        while batch := list(islice(iterator, chunk_size)):
+            writer.write(batch)
+            written += len(batch)
+            if time.monotonic() - last_progress >= _setting('PROGRESS_INTERVAL_SECONDS'):
+                ExportJob.objects.filter(id=job.id).update(rows_written=written, updated_at=timezone.now())
+                last_progress = time.monotonic()
+        writer.close()
+    except BaseException:
+        shutil.rmtree(path.parent, ignore_errors=True)
+        raise
+    os.replace(partial, path)
+    job.rows_written = written
+    return name
+
+
+def run_job(job):
+    """
+    Write a claimed job's file and notify the user who asked for it.
+
+    A failure puts the job back to PENDING, due again after an exponential
+    backoff (EXPORTS['BACKOFF_SECONDS'], doubled per attempt), until
+    EXPORTS['MAX_ATTEMPTS'] is reached; then it is marked FAILED.
+    """
+    try:
+        name = _write_file(job)
+    except Exception as exc:
+        job.error = f"{type(exc).__name__}: {exc}"
+        if job.attempts < _setting('MAX_ATTEMPTS'):
+            job.status = ExportStatus.PENDING
+            job.next_attempt_at = timezone.now() + _backoff(job.attempts)
+            job.save(update_fields=['status', 'error', 'next_attempt_at', 'updated_at'])
+            return job
+        job.status = ExportStatus.FAILED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        notify([job.requested_by_id], NotificationType.SYSTEM, "Export failed",
+               f"Your {job.get_kind_display().lower()} export could not be created.", related_id=job.id,
+               defer=False)
+        return job
+
+    job.file.name = name
+    job.status = ExportStatus.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'rows_written', 'finished_at', 'updated_at'])
+    notify([job.requested_by_id], NotificationType.SYSTEM, "Export ready",
+           f"Your {job.get_kind_display().lower()} export ({job.rows_written} rows) is ready: "
+           f"{reverse('export-job-download', args=[job.id])}", related_id=job.id, defer=False)
+    return job
+
+
+def run_next():
+    """
+    Claim and run one job. Returns the job, or None when the queue is empty.
+    """
+    job = claim_job()
+    return run_job(job) if job else None
+
+
+def purge_expired(older_than=None):
+    """
+    Delete finished jobs and their files after EXPORTS['RETENTION_DAYS'].
+    """
+    older_than = older_than or timedelta(days=_setting('RETENTION_DAYS'))
+    expired = ExportJob.objects.filter(
+        status__in=[ExportStatus.DONE, ExportStatus.FAILED],
+        finished_at__lt=timezone.now() - older_than
+    )
+    for name in expired.exclude(file='').values_list('file', flat=True):
+        shutil.rmtree(Path(export_storage.path(name)).parent, ignore_errors=True)
+    deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,84 @@
+from django.db.models import F
+
+from companies.services import accepted_supplier_ids
+from orders.models import OrderItem, OrderStatus
+from products.models import Product
+from support.models import ComplaintStatus
+from support.services import visible_complaints
+from .filters import filter_export
+from .models import ExportKind
+
+# Column types understood by the writers
+INT, STR, DECIMAL, DATETIME, BOOL = 'int', 'str', 'decimal', 'datetime', 'bool'
+
+
+def order_rows(user, params):
+    """
+    One row per order item, with the order's fields repeated.
+    """
+    items = OrderItem.objects.filter(order__is_active=True)
+    if user.consumer:
+        items = items.filter(order__consumer=user.consumer)
+    elif user.supplier:
+        items = items.filter(order__supplier=user.supplier)
+    else:
+        items = items.none()
+    items = filter_export(
+        items, params, statuses=OrderStatus.values, status_field='order__status', created_field='order__created_at'
+    )
+    columns = [
+        ('Order ID', INT), ('Created At', DATETIME), ('Status', STR), ('Delivery Method', STR),
+        ('Consumer', STR), ('Supplier', STR), ('Order Total', DECIMAL),
+        ('Product ID', INT), ('Product', STR), ('Quantity', INT), ('Unit Price', DECIMAL),
+    ]
+    return columns, items.order_by('order_id', 'id').values_list(
+        'order_id', 'order__created_at', 'order__status', 'order__delivery_method',
+        'order__consumer__company_name', 'order__supplier__company_name', 'order__total_amount',
+        'product_id', 'product__name', 'quantity', 'price_at_time_of_order',
+    )
+
+
+def complaint_rows(user, params):
+    complaints = filter_export(visible_complaints(user), params, statuses=ComplaintStatus.values)
+    columns = [
+        ('ID', INT), ('Created At', DATETIME), ('Order ID', INT), ('Subject', STR),
+        ('Status', STR), ('Escalation Level', STR), ('Created By', STR),
+    ]
+    return columns, complaints.order_by('id').values_list(
+        'id', 'created_at', 'order_id', 'subject', 'status', 'escalation_level', 'created_by__email'
+    )
+
+
+def product_rows(user, params):
+    """
+    Suppliers get their whole catalog including archived products,
+    consumers the products they can order.
+    """
+    if user.supplier:
+        products = Product.objects.filter(supplier=user.supplier)
+    elif user.consumer:
+        products = Product.objects.filter(
+            supplier_id__in=accepted_supplier_ids(user.consumer),
+            supplier__is_active=True,
+            is_archived=False,
+            is_available=True,
+            stock_level__gte=F('min_order_qty'),
+        )
+    else:
+        products = Product.objects.none()
+    columns = [
+        ('ID', INT), ('Supplier', STR), ('Name', STR), ('Unit', STR), ('Price', DECIMAL),
+        ('Discount Price', DECIMAL), ('Stock Level', INT), ('Min Order Qty', INT),
+        ('Available', BOOL), ('Archived', BOOL), ('Updated At', DATETIME),
+    ]
+    return columns, products.order_by('id').values_list(
+        'id', 'supplier__company_name', 'name', 'unit', 'price', 'discount_price',
+        'stock_level', 'min_order_qty', 'is_available', 'is_archived', 'updated_at',
+    )
+
+
+SOURCES = {
+    ExportKind.ORDERS: order_rows,
+    ExportKind.COMPLAINTS: complaint_rows,
+    ExportKind.PRODUCTS: product_rows,
+}
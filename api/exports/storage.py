@@ -0,0 +1,24 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible(path='exports.storage.ExportStorage')
+class ExportStorage(FileSystemStorage):
+    """
+    Files under EXPORTS_ROOT. No URL serves that directory: an export only
+    leaves through the authenticated download view.
+    """
+
+    @property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.EXPORTS_ROOT)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+export_storage = ExportStorage()
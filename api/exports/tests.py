@@ -0,0 +1,184 @@
+import csv
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from notifications.models import Notification
+from orders.models import Order, OrderItem, OrderStatus
+from products.models import Product
+from support.models import Complaint
+from users.models import UserRole
+from exports.models import ExportJob, ExportStatus
+from exports.services import claim_job, purge_expired, run_next
+from exports.writers import format_available
+
+User = get_user_model()
+
+
+class ExportJobTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        media = override_settings(EXPORTS_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.url = reverse('export-job-list')
+        self.supplier = Supplier.objects.create(company_name="Export Farm", address="1 A St")
+        self.owner = User.objects.create_user("owner@export.com", "pass", role=UserRole.OWNER, supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Export Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@export.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+
+        self.milk = Product.objects.create(supplier=self.supplier, name="Milk", price=2, stock_level=50, unit="l")
+        self.eggs = Product.objects.create(supplier=self.supplier, name="Eggs", price=3, stock_level=50, unit="box")
+        self.old_order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=4,
+                                              status=OrderStatus.DELIVERED)
+        Order.objects.filter(id=self.old_order.id).update(created_at=timezone.now() - timedelta(days=400))
+        OrderItem.objects.create(order=self.old_order, product=self.milk, quantity=2, price_at_time_of_order=2)
+        self.order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=8)
+        OrderItem.objects.create(order=self.order, product=self.milk, quantity=1, price_at_time_of_order=2)
+        OrderItem.objects.create(order=self.order, product=self.eggs, quantity=2, price_at_time_of_order=3)
+
+    def request_export(self, user, **data):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url, data, format='json')
+
+    def run_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return run_next()
+
+    def test_request_is_queued(self):
+        response = self.request_export(self.owner, kind='ORDERS', format='CSV', params={'status': 'pending'})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], ExportStatus.PENDING)
+        self.assertIsNone(response.data['download_url'])
+        self.assertEqual(ExportJob.objects.get().requested_by, self.owner)
+
+    def test_invalid_requests_are_rejected(self):
+        bad_filter = self.request_export(self.owner, kind='ORDERS', params={'status': 'LOST'})
+        unknown_filter = self.request_export(self.owner, kind='ORDERS', params={'color': 'red'})
+        loner = User.objects.create_user("loner@export.com", "pass", role=UserRole.CONSUMER)
+        no_company = self.request_export(loner, kind='PRODUCTS')
+
+        self.assertEqual(bad_filter.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('params', bad_filter.data)
+        self.assertEqual(unknown_filter.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(no_company.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_csv_export_of_orders_with_items(self):
+        job_id = self.request_export(self.owner, kind='ORDERS', format='CSV',
+                                     params={'created_after': timezone.localdate().isoformat()}).data['id']
+
+        job = self.run_job()
+
+        self.assertEqual(job.id, job_id)
+        self.assertEqual((job.status, job.rows_written, job.total_rows), (ExportStatus.DONE, 2, 2))
+        with open(Path(self.media) / job.file.name, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:3], ['Order ID', 'Created At', 'Status'])
+        self.assertEqual([(row[0], row[8], row[9]) for row in rows[1:]],
+                         [(str(self.order.id), "Milk", "1"), (str(self.order.id), "Eggs", "2")])
+
+        notification = Notification.objects.get(recipient=self.owner)
+        self.assertEqual(notification.related_id, job.id)
+        self.assertIn(reverse('export-job-download', args=[job.id]), notification.message)
+        self.assertIsNone(run_next())
+
+    def test_download_only_when_done_and_only_by_requester(self):
+        job_id = self.request_export(self.buyer, kind='ORDERS').data['id']
+        url = reverse('export-job-download', args=[job_id])
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_409_CONFLICT)
+        self.run_job()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'Eggs', b''.join(response.streaming_content))
+        job = self.client.get(reverse('export-job-detail', args=[job_id])).data
+        self.assertEqual((job['progress'], job['download_url']), (1.0, url))
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        ExportJob.objects.filter(id=job_id).update(file='exports/1-0123456789abcdef/orders.csv')  # old media path
+        self.client.force_authenticate(user=self.buyer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_410_GONE)
+
+    @skipUnless(format_available('XLSX'), "openpyxl is not installed")
+    def test_xlsx_export(self):
+        Complaint.objects.create(order=self.order, created_by=self.buyer, subject="Late", description="..")
+        self.request_export(self.owner, kind='COMPLAINTS', format='XLSX')
+
+        job = self.run_job()
+
+        from openpyxl import load_workbook
+        rows = list(load_workbook(Path(self.media) / job.file.name, read_only=True).active.values)
+        self.assertEqual(rows[0][:4], ('ID', 'Created At', 'Order ID', 'Subject'))
+        self.assertEqual(rows[1][3], "Late")
+        self.assertEqual(rows[1][6], self.buyer.email)
+
+    @skipUnless(format_available('PARQUET'), "pyarrow is not installed")
+    def test_parquet_export_is_typed(self):
+        self.milk.is_archived = True
+        self.milk.save()
+        self.request_export(self.owner, kind='PRODUCTS', format='PARQUET')
+
+        job = self.run_job()
+
+        import pyarrow.parquet as pq
+        table = pq.read_table(Path(self.media) / job.file.name)
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(str(table.schema.field('price').type), 'decimal128(12, 2)')
+        self.assertEqual(table.column('archived').to_pylist(), [True, False])
+        self.assertEqual(table.column('stock_level').to_pylist(), [50, 50])
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        self.request_export(self.owner, kind='PRODUCTS')
+
+        with mock.patch.dict('exports.services.SOURCES', {'PRODUCTS': mock.Mock(side_effect=RuntimeError("disk"))}):
+            job = self.run_job()
+            self.assertEqual(job.status, ExportStatus.PENDING)
+            self.assertGreater(job.next_attempt_at, timezone.now())
+            self.assertIsNone(claim_job())  # not before the backoff
+            for _ in range(2):
+                ExportJob.objects.filter(id=job.id).update(next_attempt_at=timezone.now())
+                job = self.run_job()
+
+        self.assertEqual(job.status, ExportStatus.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("disk", job.error)
+        self.assertEqual(Notification.objects.get(recipient=self.owner).title, "Export failed")
+        self.assertEqual(list(Path(self.media).iterdir()), [])
+
+    def test_stale_running_job_is_taken_over(self):
+        self.request_export(self.owner, kind='PRODUCTS')
+        claimed = claim_job()
+        self.assertIsNone(claim_job())
+
+        ExportJob.objects.filter(id=claimed.id).update(updated_at=timezone.now() - timedelta(minutes=10))
+
+        self.assertEqual(claim_job().attempts, 2)
+
+    def test_purge_removes_old_files(self):
+        self.request_export(self.owner, kind='PRODUCTS')
+        job = self.run_job()
+        path = Path(self.media) / job.file.name
+        self.assertTrue(path.exists())
+
+        ExportJob.objects.filter(id=job.id).update(finished_at=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(purge_expired(), 1)
+        self.assertFalse(path.exists())
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import ExportJobViewSet
+
+router = DefaultRouter()
+router.register(r'', ExportJobViewSet, basename='export-job')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
\ No newline at end of file
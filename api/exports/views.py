@@ -0,0 +1,57 @@
+import os
+
+from django.http import FileResponse
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import ExportJob, ExportStatus
+from .serializers import ExportJobCreateSerializer, ExportJobSerializer
+
+
+@extend_schema_view(
+    list=extend_schema(summary="List my Export Jobs"),
+    retrieve=extend_schema(summary="Get Export Job Status"),
+    create=extend_schema(
+        summary="Request an Export",
+        description="Queue an export of orders (one row per item), complaints or products as CSV, XLSX or "
+                    "Parquet. `params` takes the filters `status`, `created_after` and `created_before`. "
+                    "Poll the job or wait for the notification, then fetch `download_url`.",
+        request=ExportJobCreateSerializer,
+        responses={202: ExportJobSerializer},
+    ),
+)
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = ExportJob.objects.none()
+
+    def get_queryset(self):
+        # Users only see their own exports
+        return ExportJob.objects.filter(requested_by=self.request.user)
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return ExportJobCreateSerializer
+        return ExportJobSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The export worker picks the job up
+        job = serializer.save(requested_by=request.user)
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(summary="Download an Export", responses={(200, 'application/octet-stream'): bytes})
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportStatus.DONE:
+            return Response({"detail": "Export is not ready."}, status=status.HTTP_409_CONFLICT)
+        try:
+            file = job.file.open('rb')
+        except FileNotFoundError:
+            # Written before EXPORTS_ROOT existed, or removed by hand
+            return Response({"detail": "Export file is gone, request it again."}, status=status.HTTP_410_GONE)
+        return FileResponse(file, as_attachment=True, filename=os.path.basename(job.file.name))
@@ -0,0 +1,133 @@
+import csv
+from datetime import timezone as dt_timezone
+from importlib.util import find_spec
+
+from .models import ExportFormat
+from .sources import BOOL, DATETIME, DECIMAL, INT, STR
+
+
+class CsvExportWriter:
+    extension = 'csv'
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _ in columns])
+        self.datetimes = [i for i, (_, type) in enumerate(columns) if type == DATETIME]
+
+    def write(self, rows):
+        if self.datetimes:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in self.datetimes:
+                    if row[i] is not None:
+                        row[i] = row[i].isoformat()
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxExportWriter:
+    """
+    openpyxl in write-only mode streams rows to a temporary file instead of
+    keeping cells in memory. Sheets roll over at Excel's row limit.
+    """
+    extension = 'xlsx'
+    max_rows = 1_048_575  # per sheet, below the header
+
+    def __init__(self, path, columns):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.header = [name for name, _ in columns]
+        self.datetimes = [i for i, (_, type) in enumerate(columns) if type == DATETIME]
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheets = 0
+
+    def new_sheet(self):
+        self.sheets += 1
+        self.sheet = self.workbook.create_sheet('Export' if self.sheets == 1 else f'Export {self.sheets}')
+        self.sheet.append(self.header)
+        self.sheet_rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= self.max_rows:
+                self.new_sheet()
+            if self.datetimes:
+                row = list(row)
+                # Excel has no time zones, store UTC
+                for i in self.datetimes:
+                    if row[i] is not None:
+                        row[i] = row[i].astimezone(dt_timezone.utc).replace(tzinfo=None)
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        if self.sheet is None:
+            self.new_sheet()
+        self.workbook.save(self.path)
+
+
+class ParquetExportWriter:
+    """
+    Typed columns for analytics tools. Rows are buffered into row groups of
+    `row_group_size` so readers can skip and parallelize by group.
+    """
+    extension = 'parquet'
+    row_group_size = 50_000
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        types = {
+            INT: pa.int64(),
+            STR: pa.string(),
+            DECIMAL: pa.decimal128(12, 2),
+            DATETIME: pa.timestamp('us', tz='UTC'),
+            BOOL: pa.bool_(),
+        }
+        self.schema = pa.schema([
+            (name.lower().replace(' ', '_'), types[type]) for name, type in columns
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self.buffer = []
+
+    def flush(self):
+        if not self.buffer:
+            return
+        columns = zip(*self.buffer)
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        self.buffer = []
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {
+    ExportFormat.CSV: (CsvExportWriter, None),
+    ExportFormat.XLSX: (XlsxExportWriter, 'openpyxl'),
+    ExportFormat.PARQUET: (ParquetExportWriter, 'pyarrow'),
+}
+
+
+def format_available(format):
+    """
+    XLSX and Parquet need optional packages; CSV always works.
+    """
+    _, package = WRITERS[format]
+    return package is None or find_spec(package) is not None
@@ -0,0 +1,52 @@
+"""
+Gunicorn settings for the production profile.
+
+Run with `gunicorn scp_project.asgi:application` from this directory; the
+file is picked up automatically. Uvicorn workers serve the ASGI app, so
+WebSockets and long-polling work next to the REST API. Django runs sync
+views one at a time per worker, so throughput scales with the number of
+worker processes, not threads.
+"""
+import multiprocessing
+import os
+import tempfile
+from pathlib import Path
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+# Long-poll requests hold a worker's socket for up to
+# CHAT_LONG_POLL_MAX_TIMEOUT seconds, keep well above that
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+# Workers share their /metrics counts through files here (scp_project.metrics)
+if 'METRICS_DIR' not in os.environ:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='scp-metrics-')
+
+
+def on_starting(server):
+    # Counts start from zero with the server, as they would in one process
+    directory = Path(os.environ['METRICS_DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.glob('*.json'):
+        path.unlink()
+
+
+def worker_exit(server, worker):
+    from scp_project.metrics import registry
+    registry.flush(os.environ['METRICS_DIR'], force=True)
+
+
+def child_exit(server, worker):
+    from scp_project.metrics import archive
+    archive(os.environ['METRICS_DIR'], worker.pid)
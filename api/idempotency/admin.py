@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import IdempotencyKey
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'key', 'status_code', 'created_at', 'expires_at')
+    search_fields = ('key', 'user__email')
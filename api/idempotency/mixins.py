@@ -0,0 +1,83 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+class IdempotencyKeyReused(exceptions.APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = 'idempotency_key_reused'
+
+
+def _describe(value):
+    if isinstance(value, UploadedFile):
+        return f'file:{value.name}:{value.size}'
+    return str(value)
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    raw = json.dumps([request.method, request.get_full_path(), data], sort_keys=True, default=_describe)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Makes `create` safe to retry: a client sends a unique `Idempotency-Key`
+    header with the POST and sends the same key again when it retries.
+
+    The key row is inserted in the same transaction as the object, before
+    the object is created. A retry that arrives while the first request is
+    still running waits on the row's unique index, and then gets the stored
+    response back (with `Idempotent-Replayed: true`) instead of creating a
+    second object. Failed requests roll the key back, so they can be
+    retried. Keys are per user and last IDEMPOTENCY_KEY_TTL_HOURS; reusing
+    one for a different request is a 422.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise exceptions.ValidationError({HEADER: "Must be at most 255 characters."})
+
+        fingerprint = request_fingerprint(request)
+        now = timezone.now()
+        expires_at = now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=fingerprint, expires_at=expires_at
+                    )
+            except IntegrityError:
+                record = IdempotencyKey.objects.select_for_update().get(user=request.user, key=key)
+                if record.expires_at > now:
+                    if record.fingerprint != fingerprint:
+                        raise IdempotencyKeyReused()
+                    return Response(record.response, status=record.status_code,
+                                    headers={'Idempotent-Replayed': 'true'})
+                # Expired: the key starts over
+                record.fingerprint = fingerprint
+                record.expires_at = expires_at
+
+            response = super().create(request, *args, **kwargs)
+            record.status_code = response.status_code
+            record.response = json.loads(JSONRenderer().render(response.data) or 'null')
+            record.save()
+        return response
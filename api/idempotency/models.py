@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a POST sent with an `Idempotency-Key` header, kept until
+    `expires_at` so a retry of the same request gets it back instead of
+    running again. The row is inserted in the request's own transaction, so
+    it only becomes visible once the request committed.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body; a key may not be reused for another request
+    fingerprint = models.CharField(max_length=64)
+    # Filled in before the request's transaction commits
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
@@ -0,0 +1,137 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from orders.models import Order
+from products.models import Product
+from support.models import Complaint
+from users.models import UserRole
+from idempotency.models import IdempotencyKey
+
+User = get_user_model()
+
+
+class RetryFixtures:
+    def make_world(self):
+        self.supplier = Supplier.objects.create(company_name="Retry Farm", address="1 A St")
+        self.consumer = Consumer.objects.create(company_name="Retry Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@retry.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.apple = Product.objects.create(supplier=self.supplier, name="Apple", price=1, stock_level=10, unit="kg")
+        self.order_data = {"supplier": self.supplier.id, "items": [{"product_id": self.apple.id, "quantity": 3}]}
+
+    def post_order(self, client, key, data=None):
+        return client.post(reverse('order-list'), data or self.order_data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+
+class IdempotencyKeyTests(RetryFixtures, APITestCase):
+    def setUp(self):
+        self.make_world()
+        self.client.force_authenticate(user=self.buyer)
+
+    def test_retried_order_is_placed_once(self):
+        first = self.post_order(self.client, "order-1")
+        retry = self.post_order(self.client, "order-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((retry.status_code, retry.data), (status.HTTP_201_CREATED, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.stock_level, 7)
+
+    def test_new_key_places_new_order(self):
+        self.post_order(self.client, "order-1")
+        self.post_order(self.client, "order-2")
+        self.post_order(self.client, "")
+
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.post_order(self.client, "order-1")
+        other = {"supplier": self.supplier.id, "items": [{"product_id": self.apple.id, "quantity": 4}]}
+
+        response = self.post_order(self.client, "order-1", other)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_can_be_retried(self):
+        Product.objects.filter(id=self.apple.id).update(stock_level=1)
+        failed = self.post_order(self.client, "order-1")
+        Product.objects.filter(id=self.apple.id).update(stock_level=10)
+
+        retry = self.post_order(self.client, "order-1")
+
+        self.assertEqual(failed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+    def test_keys_are_per_user_and_expire(self):
+        colleague = User.objects.create_user("colleague@retry.com", "pass", role=UserRole.CONSUMER,
+                                             consumer=self.consumer)
+        self.post_order(self.client, "order-1")
+        other_client = APIClient()
+        other_client.force_authenticate(user=colleague)
+        self.post_order(other_client, "order-1")
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.post_order(self.client, "order-1")
+        self.assertEqual(Order.objects.count(), 3)
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn("Deleted 1 ", out.getvalue())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_complaints_are_idempotent_too(self):
+        order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=1)
+        data = {"order": order.id, "subject": "Bruised", "description": "..."}
+
+        for _ in range(2):
+            response = self.client.post(reverse('complaint-list'), data, format='json',
+                                        HTTP_IDEMPOTENCY_KEY="complaint-1")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Complaint.objects.count(), 1)
+
+
+class IdempotencyConcurrencyTests(RetryFixtures, TransactionTestCase):
+    def setUp(self):
+        self.make_world()
+
+    def test_parallel_retries_create_one_order(self):
+        barrier = threading.Barrier(4)
+        responses = []
+
+        def send():
+            try:
+                client = APIClient()
+                client.force_authenticate(user=self.buyer)
+                barrier.wait()
+                responses.append(self.post_order(client, "order-1"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({r.status_code for r in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual({r.data['id'] for r in responses}, {Order.objects.get().id})
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.stock_level, 7)
@@ -0,0 +1,123 @@
+from orders.models import Order
+from outbox.services import subscribe
+from realtime.push import push, user_group
+from support.models import Complaint, EscalationLevel, ComplaintStatus, ChatMessage
+from users.models import UserRole
+from .models import Notification, NotificationType
+from .serializers import NotificationSerializer
+from .services import notify, supplier_staff, consumer_staff
+
+# Which supplier roles hear about consumer chat messages at each escalation level
+CHAT_ESCALATION_ROLES = {
+    EscalationLevel.SALES_REP: None,
+    EscalationLevel.MANAGER: [UserRole.MANAGER, UserRole.OWNER],
+    EscalationLevel.OWNER: [UserRole.OWNER],
+}
+
+
+@subscribe('order.created')
+def notify_order_created(payload):
+    # New Order Created -> Notify Supplier Staff
+    order = Order.objects.select_related('consumer').filter(id=payload['order_id']).first()
+    if order is None:
+        return
+    notify(
+        supplier_staff(order.supplier_id),
+        type=NotificationType.ORDER,
+        title="New Order Received",
+        message=f"Order #{order.id} placed by {order.consumer.company_name}.",
+        related_id=order.id,
+        defer=False
+    )
+
+
+@subscribe('order.updated')
+def notify_order_updated(payload):
+    # Status Change -> Notify Consumer
+    order = Order.objects.filter(id=payload['order_id']).first()
+    if order is None:
+        return
+    status = payload['status']
+    notify(
+        consumer_staff(order.consumer_id),
+        type=NotificationType.ORDER,
+        title=f"Order {status.title()}",
+        message=f"Your order #{order.id} is now {status}.",
+        related_id=order.id,
+        defer=False
+    )
+
+
+@subscribe('complaint.created')
+def notify_complaint_created(payload):
+    # New Complaint -> Notify Supplier
+    complaint = Complaint.objects.select_related('order').filter(id=payload['complaint_id']).first()
+    if complaint is None:
+        return
+    notify(
+        supplier_staff(complaint.order.supplier_id, roles=[UserRole.SALES_REP, UserRole.MANAGER, UserRole.OWNER]),
+        type=NotificationType.COMPLAINT,
+        title="New Complaint",
+        message=f"Complaint filed on Order #{complaint.order_id}.",
+        related_id=complaint.id,
+        defer=False
+    )
+
+
+@subscribe('complaint.updated')
+def notify_complaint_updated(payload):
+    complaint = Complaint.objects.select_related('order').filter(id=payload['complaint_id']).first()
+    if complaint is None:
+        return
+
+    # Escalation -> Notify Managers/Owners
+    if payload['escalation_level'] in [EscalationLevel.MANAGER, EscalationLevel.OWNER]:
+        notify(
+            supplier_staff(complaint.order.supplier_id, roles=[UserRole.MANAGER, UserRole.OWNER]),
+            type=NotificationType.COMPLAINT,
+            title="Complaint Escalated",
+            message=f"Complaint #{complaint.id} requires attention (Level: {payload['escalation_level']}).",
+            related_id=complaint.id,
+            defer=False
+        )
+
+    if payload['status'] == ComplaintStatus.RESOLVED:
+        notify(
+            [complaint.created_by_id],  # The user who filed it
+            type=NotificationType.COMPLAINT,
+            title="Complaint Resolved",
+            message=f"Your complaint regarding Order #{complaint.order_id} has been resolved.",
+            related_id=complaint.id,
+            defer=False
+        )
+
+
+@subscribe('chat.message_created')
+def notify_chat_message(payload):
+    # New Message -> Notify the other side of the chat
+    message = ChatMessage.objects.select_related('thread', 'sender').filter(id=payload['message_id']).first()
+    if message is None:
+        return
+    thread = message.thread
+    if message.sender.consumer_id:
+        recipients = supplier_staff(thread.supplier_id, roles=CHAT_ESCALATION_ROLES[thread.escalation_level])
+    else:
+        recipients = consumer_staff(thread.consumer_id)
+    notify(
+        recipients,
+        type=NotificationType.CHAT,
+        title="New Message",
+        message=message.text[:200] or "Sent a file.",
+        related_id=thread.id,
+        defer=False
+    )
+
+
+@subscribe('notification.created')
+def push_notifications(payload):
+    # Live delivery to connected clients. A retry sends the whole batch
+    # again, so a client may see a notification twice
+    push([
+        (user_group(n.recipient_id), 'notification', NotificationSerializer(n).data)
+        for n in Notification.objects.filter(id__in=payload['ids'])
+    ])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_related_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('ORDER', 'Order Update'), ('COMPLAINT', 'Complaint Update'), ('CHAT', 'Chat Message'), ('SYSTEM', 'System Message')], default='SYSTEM', max_length=20),
+        ),
+    ]
@@ -7,6 +7,7 @@ User = get_user_model()
 class NotificationType(models.TextChoices):
     ORDER = 'ORDER', 'Order Update'
     COMPLAINT = 'COMPLAINT', 'Complaint Update'
+    CHAT = 'CHAT', 'Chat Message'
     SYSTEM = 'SYSTEM', 'System Message'
 
 
@@ -23,6 +24,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']  # Newest first
+        indexes = [
+            models.Index(fields=['recipient', 'created_at', 'id'], name='notif_recipient_created_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.recipient.email}: {self.title}"
\ No newline at end of file
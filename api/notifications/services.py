@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from outbox.services import publish
+from .models import Notification
+
+User = get_user_model()
+
+
+def supplier_staff(supplier, roles=None):
+    """
+    Active staff of a Supplier, optionally limited to some roles.
+    """
+    qs = User.objects.filter(supplier=supplier, is_active=True)
+    if roles is not None:
+        qs = qs.filter(role__in=roles)
+    return qs
+
+
+def consumer_staff(consumer):
+    """
+    Active staff of a Consumer.
+    """
+    return User.objects.filter(consumer=consumer, is_active=True)
+
+
+def notify(recipients, type, title, message, related_id=None, defer=True):
+    """
+    Fan a notification out to many users.
+
+    `recipients` is a User queryset or an iterable of users / user ids. They
+    are resolved with one query and all rows go in with one bulk INSERT,
+    together with a `notification.created` outbox event that pushes them to
+    connected clients, so a failed push is retried like any side effect.
+
+    By default nothing is written until the surrounding transaction commits,
+    so a rolled back request never leaves notifications behind. That is for
+    request handlers only: a failure then happens after the caller's work is
+    done and reaches no retry logic. Background workers (outbox handlers,
+    export jobs) pass defer=False to write right away, inside their own
+    transaction.
+    """
+    if hasattr(recipients, 'values_list'):
+        recipients = recipients.values_list('id', flat=True)
+    else:
+        recipients = [getattr(r, 'pk', r) for r in recipients if r is not None]
+
+    def _write():
+        with transaction.atomic():
+            created = Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=recipient_id,
+                    type=type,
+                    title=title,
+                    message=message,
+                    related_id=related_id
+                )
+                for recipient_id in set(recipients)
+            ])
+            if created:
+                publish('notification.created', {'ids': [n.id for n in created]})
+
+    if defer:
+        transaction.on_commit(_write)
+    else:
+        _write()
@@ -1,12 +1,21 @@
+from unittest import mock
+
+from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from companies.models import Supplier, Consumer, Link, LinkStatus
 from products.models import Product
 from orders.models import Order, OrderStatus
-from support.models import Complaint, ComplaintStatus, EscalationLevel
+from support.models import Complaint, ComplaintStatus, EscalationLevel, ChatThread
 from notifications.models import Notification, NotificationType
+from notifications.services import notify, supplier_staff
+from outbox.models import OutboxEvent, OutboxStatus
+from outbox.services import dispatch_batch
 from users.models import UserRole
 
 User = get_user_model()
@@ -34,9 +43,14 @@ class NotificationSystemTests(APITestCase):
         Link.objects.create(supplier=self.supplier, consumer=self.consumer_org, status=LinkStatus.ACCEPTED)
         self.product = Product.objects.create(supplier=self.supplier, name="P1", price=10, stock_level=100, unit="x")
 
+    def run_dispatcher(self):
+        # Side effects run in the outbox dispatcher, after the domain transaction commits
+        dispatch_batch()
+
     def test_order_creation_notifies_supplier_team(self):
         """Test that placing an order notifies Owner, Manager, and Sales Rep"""
         Order.objects.create(consumer=self.consumer_org, supplier=self.supplier, total_amount=10)
+        self.run_dispatcher()
 
         # Verify Owner got it
         self.assertTrue(Notification.objects.filter(recipient=self.owner, type=NotificationType.ORDER).exists())
@@ -57,6 +71,7 @@ class NotificationSystemTests(APITestCase):
         # Action: Supplier ships order
         order.status = OrderStatus.SHIPPED
         order.save()
+        self.run_dispatcher()
 
         # Verify Consumer got it
         notif = Notification.objects.filter(recipient=self.consumer, type=NotificationType.ORDER).first()
@@ -70,6 +85,7 @@ class NotificationSystemTests(APITestCase):
 
         # Action: File Complaint
         Complaint.objects.create(order=order, created_by=self.consumer, subject="Bad", description="..")
+        self.run_dispatcher()
 
         # Verify Supplier Staff notified
         self.assertTrue(Notification.objects.filter(recipient=self.sales, type=NotificationType.COMPLAINT).exists())
@@ -85,6 +101,7 @@ class NotificationSystemTests(APITestCase):
         # Action: Escalate to Manager
         complaint.escalation_level = EscalationLevel.MANAGER
         complaint.save()
+        self.run_dispatcher()
 
         # Verify Manager and Owner got it
         self.assertTrue(Notification.objects.filter(recipient=self.manager, title="Complaint Escalated").exists())
@@ -102,6 +119,7 @@ class NotificationSystemTests(APITestCase):
         # Action: Resolve
         complaint.status = ComplaintStatus.RESOLVED
         complaint.save()
+        self.run_dispatcher()
 
         # Verify Consumer Notification
         notif = Notification.objects.filter(recipient=self.consumer, type=NotificationType.COMPLAINT).first()
@@ -120,8 +138,8 @@ class NotificationSystemTests(APITestCase):
         response = self.client.get(self.list_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['title'], "Consumer Info")
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['title'], "Consumer Info")
 
     def test_mark_notification_as_read(self):
         """Test marking a single notification as read"""
@@ -165,4 +183,106 @@ class NotificationSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
         notif.refresh_from_db()
-        self.assertFalse(notif.is_read)
\ No newline at end of file
+        self.assertFalse(notif.is_read)
+
+    def test_fan_out_is_one_insert_regardless_of_staff_size(self):
+        """Test that notifying a large supplier team costs one SELECT and one INSERT, plus the push event"""
+        User.objects.bulk_create([
+            User(email=f"rep{i}@alert.com", role=UserRole.SALES_REP, supplier=self.supplier)
+            for i in range(50)
+        ])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify(supplier_staff(self.supplier), type=NotificationType.SYSTEM, title="Hi", message="..")
+
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+
+        statements = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(Notification.objects.filter(title="Hi").count(), 53)
+        self.assertEqual(OutboxEvent.objects.filter(topic='notification.created').count(), 1)
+
+    def test_failed_push_is_retried_then_dead_lettered(self):
+        """Test that notifications are written by the handler and a failing push goes through the outbox retries"""
+        Order.objects.create(consumer=self.consumer_org, supplier=self.supplier, total_amount=10)
+        with mock.patch('notifications.handlers.push', side_effect=ConnectionError("channel layer down")) as push:
+            self.run_dispatcher()
+            self.assertEqual(Notification.objects.filter(type=NotificationType.ORDER).count(), 3)
+
+            for attempt in range(1, settings.OUTBOX['MAX_ATTEMPTS'] + 1):
+                OutboxEvent.objects.update(available_at=timezone.now())
+                self.run_dispatcher()
+                event = OutboxEvent.objects.get(topic='notification.created')
+                self.assertEqual(event.attempts, attempt)
+                self.assertIn("channel layer down", event.last_error)
+
+        self.assertEqual(push.call_count, settings.OUTBOX['MAX_ATTEMPTS'])
+        self.assertEqual(event.status, OutboxStatus.DEAD)
+        # The notifications themselves stay
+        self.assertEqual(Notification.objects.filter(type=NotificationType.ORDER).count(), 3)
+
+    def test_rolled_back_order_sends_no_notifications(self):
+        """Test that a rolled back order leaves no event behind to notify about"""
+        try:
+            with transaction.atomic():
+                Order.objects.create(consumer=self.consumer_org, supplier=self.supplier, total_amount=10)
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        self.run_dispatcher()
+
+        self.assertFalse(Notification.objects.exists())
+
+    def test_chat_message_notifies_other_side(self):
+        """Test that a consumer's chat message notifies the supplier team"""
+        thread = ChatThread.objects.create(consumer=self.consumer_org, supplier=self.supplier)
+        url = reverse('chat-messages', args=[thread.id])
+
+        self.client.force_authenticate(user=self.consumer)
+        response = self.client.post(url, {"text": "Where is my order?"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.run_dispatcher()
+
+        self.assertTrue(Notification.objects.filter(recipient=self.sales, type=NotificationType.CHAT).exists())
+        self.assertFalse(Notification.objects.filter(recipient=self.consumer).exists())
+
+    def test_list_is_cursor_paginated(self):
+        """Test walking the notification list page by page, including rows with equal timestamps"""
+        Notification.objects.bulk_create([
+            Notification(recipient=self.consumer, title=f"Msg {i}", message="..") for i in range(7)
+        ])
+        # Same timestamp for all rows: the id tie-breaker must keep pages disjoint
+        Notification.objects.update(created_at=timezone.now())
+
+        self.client.force_authenticate(user=self.consumer)
+        seen = []
+        url = f"{self.list_url}?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen += [n['id'] for n in response.data['results']]
+            url = response.data['next']
+
+        expected = list(Notification.objects.filter(recipient=self.consumer).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_capped(self):
+        """Test that clients cannot ask for more than the server maximum"""
+        Notification.objects.bulk_create([
+            Notification(recipient=self.consumer, title="Bulk", message="..") for _ in range(205)
+        ])
+
+        self.client.force_authenticate(user=self.consumer)
+        response = self.client.get(f"{self.list_url}?page_size=1000")
+
+        self.assertEqual(len(response.data['results']), 200)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.client.force_authenticate(user=self.consumer)
+        response = self.client.get(f"{self.list_url}?cursor=not-a-cursor")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
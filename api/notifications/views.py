@@ -2,11 +2,12 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from scp_project.profiling import SerializerTimingMixin
 from .models import Notification
 from .serializers import NotificationSerializer
 # Create your views here.
 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
     queryset = Notification.objects.none()
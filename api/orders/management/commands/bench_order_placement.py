@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from companies.models import Consumer, Supplier
+from orders.services import place_order
+from products.models import Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark order placement at 1/50/500 lines (all data is rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 50, 500])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['lines'], options['repeat'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, line_counts, repeat):
+        supplier = Supplier.objects.create(company_name="Bench Supplier", address="-")
+        consumer = Consumer.objects.create(company_name="Bench Consumer", address="-")
+        products = Product.objects.bulk_create([
+            Product(supplier=supplier, name=f"Bench {i}", price=10, unit="pcs", stock_level=10 ** 9)
+            for i in range(max(line_counts))
+        ])
+
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'median ms':>10} {'max ms':>8}")
+        for lines in line_counts:
+            items = [{'product_id': p.id, 'quantity': 1} for p in products[:lines]]
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    place_order(consumer, supplier, items)
+                    timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"{lines:>6} {len(ctx.captured_queries):>8} "
+                f"{statistics.median(timings):>10.2f} {max(timings):>8.2f}"
+            )
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_link_link_consumer_created_idx_and_more'),
+        ('orders', '0003_order_delivery_method'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', 'created_at', 'id'], name='order_consumer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', 'created_at', 'id'], name='order_supplier_created_idx'),
+        ),
+    ]
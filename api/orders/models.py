@@ -12,6 +12,13 @@ class OrderStatus(models.TextChoices):
     CANCELED = 'CANCELED', _('Canceled')
     DECLINED = 'DECLINED', _('Declined')
 
+# Allowed status changes; DELIVERED, CANCELED and DECLINED are final
+ORDER_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.CONFIRMED, OrderStatus.DECLINED, OrderStatus.CANCELED},
+    OrderStatus.CONFIRMED: {OrderStatus.SHIPPED, OrderStatus.CANCELED},
+    OrderStatus.SHIPPED: {OrderStatus.DELIVERED},
+}
+
 class OrderDeliveryMethod(models.TextChoices):
     DELIVERY = 'DELIVERY', _('Delivery')
     PICKUP = 'PICKUP', _('Pickup')
@@ -50,6 +57,11 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of order history per side
+            models.Index(fields=['consumer', 'created_at', 'id'], name='order_consumer_created_idx'),
+            models.Index(fields=['supplier', 'created_at', 'id'], name='order_supplier_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.consumer} -> {self.supplier}"
@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from django.db import transaction
 from .models import Order, OrderItem, OrderDeliveryMethod
-from products.models import Product
-from companies.models import Link, LinkStatus, DeliveryMethod
+from .services import can_transition, place_order
+from companies.models import DeliveryMethod
+from companies.services import is_linked
+from scp_project.eager import eager_load
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -50,13 +51,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         if not user.consumer:
             raise serializers.ValidationError("Only Consumers can place orders.")
 
-        has_link = Link.objects.filter(
-            consumer=user.consumer,
-            supplier=supplier,
-            status=LinkStatus.ACCEPTED
-        ).exists()
-
-        if not has_link:
+        if not is_linked(user.consumer, supplier):
             raise serializers.ValidationError("You do not have an active link with this Supplier.")
 
         if supplier.delivery_options == DeliveryMethod.PICKUP and chosen_method == OrderDeliveryMethod.DELIVERY:
@@ -71,61 +66,29 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        The Transactional Logic:
-        1. Create Order
-        2. Loop items -> Check Stock -> Deduct Stock -> Create OrderItem
-        3. Calculate Total
+        The Transactional Logic lives in services.place_order:
+        1. Lock all requested products at once
+        2. Check Stock -> Deduct Stock in one UPDATE
+        3. Create Order + OrderItems in bulk
         """
         items_data = validated_data.pop('items')
         consumer = self.context['request'].user.consumer
         supplier = validated_data['supplier']
         delivery_method = validated_data.get('delivery_method', OrderDeliveryMethod.DELIVERY)
 
-        # Atomic Block: If anything fails here, DB rolls back to start
-        with transaction.atomic():
-            order = Order.objects.create(consumer=consumer, supplier=supplier, delivery_method=delivery_method ,total_amount=0)
-            total_amount = 0
-
-            for item in items_data:
-                product_id = item['product_id']
-                quantity = item['quantity']
-
-                try:
-                    product = Product.objects.select_for_update().get(id=product_id, supplier=supplier)
-                except Product.DoesNotExist:
-                    raise serializers.ValidationError(f"Product {product_id} not found or belongs to another supplier.")
-
-                if quantity < product.min_order_qty:
-                    raise serializers.ValidationError(f"Product '{product.name}' requires a minimum order of {product.min_order_qty} {product.unit}.")
-
-                if product.stock_level < quantity:
-                    raise serializers.ValidationError(
-                        f"Insufficient stock for {product.name}. Available: {product.stock_level}")
-
-                product.stock_level -= quantity
-                product.save()
-
-                final_price = product.price
-                if product.discount_price and product.discount_price > 0:
-                    final_price = product.discount_price
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price_at_time_of_order=final_price
-                )
-
-                total_amount += (final_price * quantity)
-
-            order.total_amount = total_amount
-            order.save()
+        return place_order(consumer, supplier, items_data, delivery_method)
 
-            return order
+    def to_representation(self, instance):
+        # Respond with the full order, not just the IDs that were sent
+        instance = eager_load(Order.objects.filter(pk=instance.pk), OrderReadSerializer).get()
+        return OrderReadSerializer(instance, context=self.context).data
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['status']
 
-    def validate(self, value):
+    def validate_status(self, value):
+        if self.instance is not None and not can_transition(self.instance.status, value):
+            raise serializers.ValidationError(f"Cannot change an order from {self.instance.status} to {value}.")
         return value
\ No newline at end of file
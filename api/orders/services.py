@@ -0,0 +1,217 @@
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+from rest_framework import exceptions, serializers, status
+
+from companies.services import bump_catalog_version, bump_order_version
+from outbox.services import publish
+from products.models import Product
+from stock.models import StockReservation
+from stock.services import record_reservations, release_reservations, return_to_shards, take_from_shards
+from .models import ORDER_TRANSITIONS, Order, OrderItem, OrderDeliveryMethod, OrderStatus
+
+# Orders in these states have given their stock back
+RESTOCKED_STATUSES = (OrderStatus.DECLINED, OrderStatus.CANCELED)
+
+
+class StatusConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The order was changed by someone else. Reload it and try again."
+    default_code = 'status_conflict'
+
+
+def _unit_price(product):
+    if product.discount_price and product.discount_price > 0:
+        return product.discount_price
+    return product.price
+
+
+def place_order(consumer, supplier, items, delivery_method=OrderDeliveryMethod.DELIVERY):
+    """
+    Set-based order placement. The number of queries does not depend on the
+    number of lines:
+    1. Lock every requested product in one id-ordered SELECT ... FOR UPDATE
+    2. Validate min order qty and stock in memory
+    3. Deduct stock with one conditional UPDATE ... FROM unnest()
+    4. Insert the Order and bulk insert its OrderItems
+    5. Bump the Supplier's catalog version (stock changed)
+
+    Sharded (hot) products are not locked: they are read without a lock
+    and take their stock from one of their StockShards instead, recorded
+    as StockReservations (stock app). An order made only of sharded
+    products leaves the catalog version to the reconciler.
+    """
+    # Same product may appear on several lines; stock is checked against the sum
+    requested = OrderedDict()
+    for item in items:
+        requested[item['product_id']] = requested.get(item['product_id'], 0) + item['quantity']
+
+    with transaction.atomic():
+        # Ordering by id keeps lock acquisition deterministic, so two orders
+        # sharing products cannot deadlock each other
+        products = {
+            p.id: p for p in Product.objects.select_for_update()
+            .filter(id__in=list(requested), supplier=supplier, stock_shards=0)
+            .order_by('id')
+        }
+        locked = list(products)
+        if len(products) < len(requested):
+            products.update({
+                p.id: p for p in Product.objects
+                .filter(id__in=[i for i in requested if i not in products], supplier=supplier, stock_shards__gt=0)
+            })
+
+        for product_id in requested:
+            if product_id not in products:
+                raise serializers.ValidationError(f"Product {product_id} not found or belongs to another supplier.")
+
+        for item in items:
+            product = products[item['product_id']]
+            if item['quantity'] < product.min_order_qty:
+                raise serializers.ValidationError(f"Product '{product.name}' requires a minimum order of {product.min_order_qty} {product.unit}.")
+
+        for product_id in locked:
+            product = products[product_id]
+            if product.stock_level < requested[product_id]:
+                raise serializers.ValidationError(
+                    f"Insufficient stock for {product.name}. Available: {product.stock_level}")
+
+        if locked:
+            # The stock guard is redundant while the rows are locked, but keeps
+            # the UPDATE safe on its own if the locking strategy ever changes.
+            # unnest() keeps the statement text constant whatever the line count.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {Product._meta.db_table} AS p
+                    SET stock_level = p.stock_level - d.qty, updated_at = %s
+                    FROM unnest(%s::bigint[], %s::integer[]) AS d(id, qty)
+                    WHERE p.id = d.id AND p.stock_level >= d.qty
+                    """,
+                    [timezone.now(), locked, [requested[i] for i in locked]]
+                )
+                updated = cursor.rowcount
+            if updated != len(locked):
+                raise serializers.ValidationError("Stock changed while placing the order. Please try again.")
+
+        # In id order, like the locks above
+        taken = {
+            product_id: take_from_shards(products[product_id], requested[product_id])
+            for product_id in sorted(requested) if product_id not in locked
+        }
+
+        lines = []
+        total_amount = 0
+        for item in items:
+            product = products[item['product_id']]
+            final_price = _unit_price(product)
+            lines.append((product, item['quantity'], final_price))
+            total_amount += final_price * item['quantity']
+
+        order = Order(
+            consumer=consumer,
+            supplier=supplier,
+            delivery_method=delivery_method,
+            total_amount=total_amount
+        )
+        order.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price_at_time_of_order=price)
+            for product, quantity, price in lines
+        ])
+        if taken:
+            record_reservations(order, taken)
+
+        # Stock is part of the catalog payload. Last, so the Supplier row is
+        # locked only until the commit right after.
+        if locked:
+            bump_catalog_version(supplier.id)
+
+        return order
+
+
+def restock_order(order):
+    """
+    Put an order's items back into stock. Two queries whatever the number
+    of lines:
+    1. Lock the products in id order, like place_order, so a restock and
+       an order sharing products cannot deadlock
+    2. One UPDATE adding each product's summed quantity with
+       stock_level = stock_level + (...), so concurrent stock changes are
+       never lost
+    Stock taken from shards goes back through the ledger instead
+    (stock.services.release_reservations), and so does stock of products
+    sharded since the order was placed (stock.services.return_to_shards).
+    Must run in the transaction that declines or cancels the order.
+    """
+    locked = list(
+        Product.objects.select_for_update()
+        .filter(id__in=OrderItem.objects.filter(order=order).values('product_id'))
+        .annotate(reserved=Exists(StockReservation.objects.filter(order=order, product=OuterRef('pk'))))
+        .order_by('id')
+        .values_list('id', 'stock_shards', 'reserved')
+    )
+    product_ids = [product_id for product_id, shards, reserved in locked if not reserved and not shards]
+    resharded = [product_id for product_id, shards, reserved in locked if not reserved and shards]
+    released = release_reservations(order) if any(reserved for *_, reserved in locked) else 0
+    if resharded:
+        released += return_to_shards(order, resharded)
+    if not product_ids:
+        return released
+    returned = (
+        OrderItem.objects.filter(order=order, product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    updated = Product.objects.filter(id__in=product_ids).update(
+        stock_level=F('stock_level') + Subquery(returned),
+        updated_at=timezone.now()
+    )
+    bump_catalog_version(order.supplier_id)
+    return updated
+
+
+def can_transition(old_status, new_status):
+    return new_status == old_status or new_status in ORDER_TRANSITIONS.get(old_status, ())
+
+
+def transition_order(order, new_status):
+    """
+    Move an order from the status it was read with to `new_status`.
+
+    The change is a compare-and-set, UPDATE ... WHERE status = <read status>,
+    so no lock is held before the write. Of two concurrent requests only one
+    matches a row; it alone restocks, bumps versions and publishes
+    `order.updated`. The other one succeeds without side effects if it asked
+    for the same status and gets a 409 otherwise. Asking for the current
+    status is a no-op. Returns whether the status changed.
+    """
+    expected = order.status
+    if new_status == expected:
+        return False
+    if not can_transition(expected, new_status):
+        raise serializers.ValidationError({'status': f"Cannot change an order from {expected} to {new_status}."})
+
+    with transaction.atomic():
+        changed = Order.objects.filter(pk=order.pk, status=expected).update(
+            status=new_status, updated_at=timezone.now()
+        )
+        if not changed:
+            current = Order.objects.values_list('status', flat=True).get(pk=order.pk)
+            order.status = current
+            if current == new_status:
+                return False
+            raise StatusConflict(f"The order is now {current}.")
+
+        # The order row is locked by the UPDATE; products come next, then
+        # the Supplier row, the same order as place_order
+        if new_status in RESTOCKED_STATUSES:
+            restock_order(order)
+        bump_order_version(order.consumer_id, order.supplier_id)
+        publish('order.updated', {'order_id': order.pk, 'status': new_status})
+
+    order.status = new_status
+    return True
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from companies.services import bump_order_version
+from outbox.services import publish
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, **kwargs):
+    if created:
+        publish('order.created', {'order_id': instance.id})
+    else:
+        publish('order.updated', {'order_id': instance.id, 'status': instance.status})
+
+
+@receiver(post_save, sender=Order)
+def bump_order_versions(sender, instance, **kwargs):
+    bump_order_version(instance.consumer_id, instance.supplier_id)
@@ -1,16 +1,24 @@
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from django.contrib.auth import get_user_model
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from companies.models import Supplier, Consumer, Link, LinkStatus, DeliveryMethod
 from products.models import Product
 from orders.models import Order, OrderStatus, OrderItem, OrderDeliveryMethod
+from orders.services import StatusConflict, place_order, restock_order, transition_order
+from outbox.models import OutboxEvent
+from scp_project.testing import QueryCountMixin
 from users.models import UserRole
 
 User = get_user_model()
 
 
-class OrderTransactionTests(APITestCase):
+class OrderTransactionTests(QueryCountMixin, APITestCase):
     def setUp(self):
         self.list_url = reverse('order-list')
 
@@ -270,4 +278,282 @@ class OrderTransactionTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         order = Order.objects.get(id=response.data['id'])
-        self.assertEqual(order.delivery_method, OrderDeliveryMethod.DELIVERY)
\ No newline at end of file
+        self.assertEqual(order.delivery_method, OrderDeliveryMethod.DELIVERY)
+
+    def test_duplicate_lines_share_stock_check(self):
+        """Test that the same product on two lines is checked against the combined quantity"""
+        self.client.force_authenticate(user=self.user_consumer)
+        data = {
+            "supplier": self.supplier.id,
+            "items": [
+                {"product_id": self.laptop.id, "quantity": 6},
+                {"product_id": self.laptop.id, "quantity": 6}  # 12 > 10 in stock
+            ]
+        }
+        response = self.client.post(self.list_url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock_level, 10)
+
+    def test_unknown_product_rolls_back_everything(self):
+        """Test that one bad line leaves stock of the other lines untouched"""
+        self.client.force_authenticate(user=self.user_consumer)
+        data = {
+            "supplier": self.supplier.id,
+            "items": [
+                {"product_id": self.mouse.id, "quantity": 1},
+                {"product_id": 999999, "quantity": 1}
+            ]
+        }
+        response = self.client.post(self.list_url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock_level, 50)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_order_placement_query_count_is_flat(self):
+        """Test that placing a 20-line order costs the same queries as a 1-line order"""
+        products = Product.objects.bulk_create([
+            Product(supplier=self.supplier, name=f"Bolt {i}", price=1, stock_level=100, unit="pcs")
+            for i in range(20)
+        ])
+        consumer = self.consumer
+
+        def queries_for(lines):
+            items = [{"product_id": p.id, "quantity": 1} for p in products[:lines]]
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(consumer, self.supplier, items)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(1), queries_for(20))
+        self.assertEqual(OrderItem.objects.filter(product__in=products).count(), 21)
+        self.assertEqual(Product.objects.get(id=products[0].id).stock_level, 98)
+
+    def test_order_list_queries_do_not_grow(self):
+        place_order(self.consumer, self.supplier, [{"product_id": self.laptop.id, "quantity": 1}])
+
+        def add_orders():
+            for _ in range(3):
+                place_order(self.consumer, self.supplier, [{"product_id": self.laptop.id, "quantity": 1},
+                                                           {"product_id": self.mouse.id, "quantity": 2}])
+
+        self.assertQueriesDoNotGrow(self.list_url, self.user_consumer, add_orders)
+        self.assertQueriesDoNotGrow(self.list_url, self.user_supplier, add_orders)
+
+    def test_restock_query_count_is_flat(self):
+        """Test that restocking a 20-line order costs the same queries as a 1-line order"""
+        products = Product.objects.bulk_create([
+            Product(supplier=self.supplier, name=f"Nut {i}", price=1, stock_level=100, unit="pcs")
+            for i in range(20)
+        ])
+
+        def queries_for(lines):
+            # Same product twice: its quantities are summed
+            items = [{"product_id": p.id, "quantity": 2} for p in products[:lines]]
+            items.append({"product_id": products[0].id, "quantity": 3})
+            order = place_order(self.consumer, self.supplier, items)
+            with CaptureQueriesContext(connection) as ctx:
+                restock_order(order)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(1), queries_for(20))
+        self.assertEqual(
+            list(Product.objects.filter(id__in=[p.id for p in products]).values_list('stock_level', flat=True)
+                 .distinct()),
+            [100]
+        )
+
+    def test_declined_order_is_restocked_once(self):
+        order = place_order(self.consumer, self.supplier, [{"product_id": self.laptop.id, "quantity": 4}])
+        self.client.force_authenticate(user=self.user_supplier)
+        url = reverse('order-detail', args=[order.id])
+
+        self.client.patch(url, {"status": OrderStatus.DECLINED})
+        repeated = self.client.patch(url, {"status": OrderStatus.DECLINED})
+        canceled = self.client.patch(url, {"status": OrderStatus.CANCELED})
+
+        self.assertEqual(repeated.status_code, status.HTTP_200_OK)
+        self.assertEqual(canceled.status_code, status.HTTP_400_BAD_REQUEST)
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock_level, 10)
+        self.assertEqual(OutboxEvent.objects.filter(topic='order.updated').values('handler').distinct().count(),
+                         OutboxEvent.objects.filter(topic='order.updated').count())
+
+    def test_status_follows_transition_table(self):
+        order = place_order(self.consumer, self.supplier, [{"product_id": self.laptop.id, "quantity": 1}])
+        self.client.force_authenticate(user=self.user_supplier)
+        url = reverse('order-detail', args=[order.id])
+
+        skipped = self.client.patch(url, {"status": OrderStatus.DELIVERED})
+        steps = [self.client.patch(url, {"status": step}).status_code
+                 for step in (OrderStatus.CONFIRMED, OrderStatus.SHIPPED)]
+        late_cancel = self.client.patch(url, {"status": OrderStatus.CANCELED})
+        delivered = self.client.patch(url, {"status": OrderStatus.DELIVERED})
+
+        self.assertEqual(skipped.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(steps, [status.HTTP_200_OK] * 2)
+        self.assertEqual(late_cancel.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(delivered.data['status'], OrderStatus.DELIVERED)
+
+    def test_stale_status_is_a_conflict(self):
+        order = place_order(self.consumer, self.supplier, [{"product_id": self.laptop.id, "quantity": 1}])
+        stale = Order.objects.get(id=order.id)
+        Order.objects.filter(id=order.id).update(status=OrderStatus.CONFIRMED)
+
+        with self.assertRaises(StatusConflict):
+            transition_order(stale, OrderStatus.DECLINED)
+
+        self.assertFalse(transition_order(Order.objects.get(id=order.id), OrderStatus.CONFIRMED))
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock_level, 9)
+
+
+class OrderConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.list_url = reverse('order-list')
+        self.supplier = Supplier.objects.create(company_name="ETag Supply", address="1 A St")
+        self.user_supplier = User.objects.create_user("sup@etag.com", "pass", role=UserRole.OWNER,
+                                                      supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="ETag Buyer", address="2 B St")
+        self.user_consumer = User.objects.create_user("con@etag.com", "pass", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.product = Product.objects.create(supplier=self.supplier, name="Widget", price=5,
+                                              stock_level=100, unit="pcs")
+        self.order = place_order(self.consumer, self.supplier, [{"product_id": self.product.id, "quantity": 2}])
+
+    def get(self, user, etag=None, url=None):
+        self.client.force_authenticate(user=user)
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(url or self.list_url, headers=headers)
+
+    def test_unchanged_orders_return_304(self):
+        first = self.get(self.user_consumer)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        second = self.get(self.user_consumer, first['ETag'])
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, b'')
+
+    def test_status_change_invalidates_both_sides(self):
+        consumer_etag = self.get(self.user_consumer)['ETag']
+        supplier_etag = self.get(self.user_supplier)['ETag']
+
+        self.client.force_authenticate(user=self.user_supplier)
+        with self.captureOnCommitCallbacks(execute=True):  # versions move on commit
+            self.client.patch(reverse('order-detail', args=[self.order.id]), {"status": OrderStatus.CONFIRMED})
+
+        self.assertEqual(self.get(self.user_consumer, consumer_etag).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(self.user_supplier, supplier_etag).status_code, status.HTTP_200_OK)
+
+    def test_versions_move_after_commit(self):
+        """Test that an order does not write the company rows in its transaction"""
+        before = Supplier.objects.get(id=self.supplier.id).order_version
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            place_order(self.consumer, self.supplier, [{"product_id": self.product.id, "quantity": 1}])
+            self.assertEqual(Supplier.objects.get(id=self.supplier.id).order_version, before)
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(Supplier.objects.get(id=self.supplier.id).order_version, before)
+
+    def test_detail_and_list_have_separate_etags(self):
+        detail_url = reverse('order-detail', args=[self.order.id])
+        list_etag = self.get(self.user_consumer)['ETag']
+
+        response = self.get(self.user_consumer, list_etag, url=detail_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(self.user_consumer, response['ETag'], url=detail_url).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+
+class OrderConcurrencyTests(TransactionTestCase):
+    """
+    Real concurrent transactions: restocks must not lose stock changes made
+    by orders placed at the same time, and each status change must have its
+    side effects exactly once.
+    """
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Race Supply", address="1 A St")
+        self.user_supplier = User.objects.create_user("sup@race.com", "pass", role=UserRole.OWNER,
+                                                      supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Race Buyer", address="2 B St")
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.bolt = Product.objects.create(supplier=self.supplier, name="Bolt", price=1, stock_level=100, unit="pcs")
+        self.nut = Product.objects.create(supplier=self.supplier, name="Nut", price=1, stock_level=100, unit="pcs")
+
+    def run_concurrently(self, jobs):
+        barrier = threading.Barrier(len(jobs))
+        errors = []
+
+        def run(job):
+            try:
+                barrier.wait()
+                job()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(job,)) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def patch_status(self, order, new_status):
+        client = APIClient()
+        client.force_authenticate(user=self.user_supplier)
+        return client.patch(reverse('order-detail', args=[order.id]), {"status": new_status})
+
+    def test_concurrent_restocks_and_orders_keep_stock_exact(self):
+        lines = [{"product_id": self.bolt.id, "quantity": 2}, {"product_id": self.nut.id, "quantity": 1}]
+        orders = [place_order(self.consumer, self.supplier, lines) for _ in range(6)]
+
+        def decline(order):
+            def job():
+                response = self.patch_status(order, OrderStatus.DECLINED)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return job
+
+        def buy():
+            place_order(self.consumer, self.supplier, lines[::-1])
+
+        # Every order declined twice at once, while new orders come in
+        self.run_concurrently([decline(order) for order in orders] * 2 + [buy] * 6)
+
+        self.bolt.refresh_from_db()
+        self.nut.refresh_from_db()
+        self.assertEqual((self.bolt.stock_level, self.nut.stock_level), (100 - 6 * 2, 100 - 6))
+        self.assertEqual(Order.objects.filter(status=OrderStatus.DECLINED).count(), 6)
+        events = OutboxEvent.objects.filter(topic='order.updated')
+        self.assertEqual(events.values('payload', 'handler').distinct().count(), events.count())
+
+    def test_concurrent_confirm_and_decline_one_wins(self):
+        lines = [{"product_id": self.bolt.id, "quantity": 5}]
+        orders = [place_order(self.consumer, self.supplier, lines) for _ in range(4)]
+        results = []
+
+        def change(order, new_status):
+            def job():
+                results.append(self.patch_status(order, new_status).status_code)
+            return job
+
+        self.run_concurrently([change(order, OrderStatus.CONFIRMED) for order in orders] +
+                              [change(order, OrderStatus.DECLINED) for order in orders])
+
+        # A loser that read the order before the winner committed gets 409,
+        # one that read it after is refused by the transition table
+        self.assertEqual(results.count(status.HTTP_200_OK), 4)
+        self.assertLessEqual(set(results), {status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST, status.HTTP_409_CONFLICT})
+        declined = Order.objects.filter(status=OrderStatus.DECLINED).count()
+        self.bolt.refresh_from_db()
+        self.assertEqual(self.bolt.stock_level, 100 - 5 * (4 - declined))
+        self.assertEqual(OutboxEvent.objects.filter(topic='order.updated').values('payload').distinct().count(), 4)
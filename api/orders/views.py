@@ -1,9 +1,15 @@
-from rest_framework import viewsets, permissions, exceptions, status
-from rest_framework.response import Response
+from rest_framework import viewsets, permissions, exceptions
 from django.db import transaction
 from drf_spectacular.utils import extend_schema, extend_schema_view
-from .models import Order, OrderStatus
+from companies.models import Consumer, Supplier
+from companies.services import accepted_supplier_ids
+from idempotency.mixins import IdempotentCreateMixin
+from scp_project.conditional import ConditionalGetMixin
+from scp_project.eager import EagerLoadingMixin
+from scp_project.profiling import SerializerTimingMixin
+from .models import Order
 from .serializers import OrderReadSerializer, OrderCreateSerializer, OrderUpdateSerializer
+from .services import transition_order
 
 
 @extend_schema_view(
@@ -11,15 +17,18 @@ from .serializers import OrderReadSerializer, OrderCreateSerializer, OrderUpdate
     retrieve=extend_schema(summary="Get Order Details"),
     create=extend_schema(
         summary="Place a New Order",
-        description="Atomic transaction. Deducts stock immediately. Fails if stock is low or link is missing.",
+        description="Atomic transaction. Deducts stock immediately. Fails if stock is low or link is missing. "
+                    "Send an `Idempotency-Key` header to make retries safe.",
         responses={201: OrderReadSerializer}
     ),
     partial_update=extend_schema(
         summary="Update Order Status",
-        description="Suppliers can Confirm, Ship, or Decline orders. Declining restores stock."
+        description="Suppliers move orders PENDING -> CONFIRMED -> SHIPPED -> DELIVERED, or decline (from PENDING) "
+                    "or cancel (before shipping) them, which restores stock. Repeating the current status is a "
+                    "no-op; 409 if someone else changed the order first."
     )
 )
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(IdempotentCreateMixin, ConditionalGetMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_serializer_class(self):
@@ -29,6 +38,22 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderUpdateSerializer
         return OrderReadSerializer
 
+    def get_etag_parts(self):
+        """
+        Orders change with the company's order version; product names and
+        units in the items follow the suppliers' catalog versions.
+        """
+        user = self.request.user
+        if user.supplier:
+            return list(Supplier.objects.filter(id=user.supplier.id).values_list('order_version', 'catalog_version'))
+        if user.consumer:
+            return [
+                *Consumer.objects.filter(id=user.consumer.id).values_list('order_version', flat=True),
+                *Supplier.objects.filter(id__in=accepted_supplier_ids(user.consumer))
+                .order_by('id').values_list('id', 'catalog_version'),
+            ]
+        return None
+
     def get_queryset(self):
         """
         Filter orders:
@@ -47,16 +72,6 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return Order.objects.none()
 
-    def create(self, request, *args, **kwargs):
-        # Override create to return the ReadSerializer
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        order = serializer.save()
-
-        # Return full details instead of just IDs
-        read_serializer = OrderReadSerializer(order)
-        return Response(read_serializer.data, status=status.HTTP_201_CREATED)
-
     def perform_update(self, serializer):
         """
         Handle Status Changes and Restocking Logic.
@@ -65,22 +80,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not user.supplier:
             raise exceptions.PermissionDenied("Only Suppliers can update order status.")
 
-        # Get the previous status from the DB before saving
-        instance = serializer.instance
-        old_status = instance.status
+        # Compare-and-set on the status read with the order: restock and
+        # notifications happen once even when staff click at the same time
         new_status = serializer.validated_data.get('status')
+        if new_status is not None:
+            transition_order(serializer.instance, new_status)
 
-        with transaction.atomic():
-            # Save the new status
-            serializer.save()
-
-            # Logic: If order is cancelled/declined, RESTOCK the items
-            if new_status in [OrderStatus.DECLINED, OrderStatus.CANCELED] and old_status != new_status:
-                for item in instance.items.all():
-                    product = item.product
-                    product.stock_level += item.quantity
-                    product.save()
-
+    @transaction.atomic
     def perform_destroy(self, instance):
         instance.is_active = False
         instance.save()
\ No newline at end of file
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'handler', 'status', 'attempts', 'available_at', 'created_at')
+    list_filter = ('status', 'topic')
+    search_fields = ('topic', 'handler', 'last_error')
@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    DONE = 'DONE', 'Done'
+    DEAD = 'DEAD', 'Dead Letter'
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect waiting to run. Rows are written in the same transaction as
+    the domain change and drained by `manage.py run_dispatcher`.
+    One row exists per (event, handler) so each handler retries on its own.
+    """
+    topic = models.CharField(max_length=100)
+    handler = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(
+        max_length=20,
+        choices=OutboxStatus.choices,
+        default=OutboxStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher only ever scans due PENDING rows
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='outbox_pending_due_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} -> {self.handler} ({self.status})"
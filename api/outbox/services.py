@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent, OutboxStatus
+
+# topic -> {handler name: callable}
+_handlers = {}
+
+
+def _setting(name):
+    return settings.OUTBOX[name]
+
+
+def subscribe(topic):
+    """
+    Register a function as a handler for `topic`:
+
+        @subscribe('order.created')
+        def notify_supplier(payload): ...
+
+    Handlers run in the dispatcher, may be retried and so should be idempotent.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        _handlers.setdefault(topic, {})[name] = func
+        return func
+    return decorator
+
+
+def _resolve(handler_name):
+    for handlers in _handlers.values():
+        if handler_name in handlers:
+            return handlers[handler_name]
+    return None
+
+
+def publish(topic, payload):
+    """
+    Record an event for every handler subscribed to `topic` with one INSERT.
+    Call it inside the transaction that makes the domain change so the event
+    exists if and only if the change commits.
+    """
+    handler_names = list(_handlers.get(topic, {}))
+    if not handler_names:
+        return []
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, handler=name, payload=payload)
+        for name in handler_names
+    ])
+
+
+def _backoff(attempts):
+    delay = _setting('BACKOFF_SECONDS') * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, _setting('MAX_BACKOFF_SECONDS')))
+
+
+def dispatch_batch(batch_size=None):
+    """
+    Run one batch of due events and return how many were processed.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+    dispatchers can drain the table in parallel without double-processing.
+    A failing handler is retried with exponential backoff and ends up in the
+    DEAD state after OUTBOX['MAX_ATTEMPTS'] tries.
+    """
+    batch_size = batch_size or _setting('BATCH_SIZE')
+    now = timezone.now()
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxStatus.PENDING, available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+
+        for event in events:
+            event.attempts += 1
+            try:
+                handler = _resolve(event.handler)
+                if handler is None:
+                    raise LookupError(f"No handler registered as '{event.handler}'.")
+                # Savepoint: a failing handler only rolls back its own writes
+                with transaction.atomic():
+                    handler(event.payload)
+            except Exception as exc:
+                event.last_error = f"{type(exc).__name__}: {exc}"
+                if event.attempts >= _setting('MAX_ATTEMPTS'):
+                    event.status = OutboxStatus.DEAD
+                else:
+                    event.available_at = now + _backoff(event.attempts)
+            else:
+                event.status = OutboxStatus.DONE
+                event.processed_at = now
+                event.last_error = ''
+
+        OutboxEvent.objects.bulk_update(
+            events, ['status', 'attempts', 'last_error', 'available_at', 'processed_at']
+        )
+
+    return len(events)
+
+
+def purge_done(older_than=None):
+    """
+    Delete processed events older than OUTBOX['RETENTION_DAYS'].
+    """
+    older_than = older_than or timedelta(days=_setting('RETENTION_DAYS'))
+    deleted, _ = OutboxEvent.objects.filter(
+        status=OutboxStatus.DONE,
+        processed_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
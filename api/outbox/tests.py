@@ -0,0 +1,121 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth import get_user_model
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from products.models import Product
+from outbox import services
+from outbox.models import OutboxEvent, OutboxStatus
+from outbox.services import publish, dispatch_batch, purge_done
+from users.models import UserRole
+
+User = get_user_model()
+
+calls = []
+
+
+def record(payload):
+    calls.append(payload)
+
+
+def explode(payload):
+    raise RuntimeError("webhook down")
+
+
+class OutboxDispatcherTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        patcher = mock.patch.dict(services._handlers, {
+            'test.ok': {'outbox.tests.record': record},
+            'test.fail': {'outbox.tests.explode': explode},
+        }, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publish_writes_one_row_per_handler(self):
+        """Test that publishing with no subscribers writes nothing"""
+        publish('test.ok', {'id': 1})
+        publish('nobody.listens', {'id': 2})
+
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+        self.assertEqual(OutboxEvent.objects.get().handler, 'outbox.tests.record')
+
+    def test_dispatch_runs_handler_and_marks_done(self):
+        publish('test.ok', {'id': 1})
+
+        self.assertEqual(dispatch_batch(), 1)
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, OutboxStatus.DONE)
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(calls, [{'id': 1}])
+
+        # Nothing left to do
+        self.assertEqual(dispatch_batch(), 0)
+
+    @override_settings(OUTBOX={'BATCH_SIZE': 10, 'MAX_ATTEMPTS': 2, 'BACKOFF_SECONDS': 5,
+                               'MAX_BACKOFF_SECONDS': 60, 'RETENTION_DAYS': 7})
+    def test_failing_handler_backs_off_then_dead_letters(self):
+        publish('test.fail', {'id': 1})
+
+        dispatch_batch()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, OutboxStatus.PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("webhook down", event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+
+        # Not due yet -> skipped
+        self.assertEqual(dispatch_batch(), 0)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        dispatch_batch()
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxStatus.DEAD)
+        self.assertEqual(event.attempts, 2)
+
+    def test_failure_does_not_block_other_events(self):
+        publish('test.fail', {'id': 1})
+        publish('test.ok', {'id': 2})
+
+        self.assertEqual(dispatch_batch(), 2)
+        self.assertEqual(calls, [{'id': 2}])
+        self.assertTrue(OutboxEvent.objects.filter(status=OutboxStatus.DONE).exists())
+
+    def test_purge_removes_old_done_events(self):
+        publish('test.ok', {'id': 1})
+        dispatch_batch()
+        OutboxEvent.objects.update(processed_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(purge_done(), 1)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class OutboxRequestPathTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Outbox Supply", address="1 A St")
+        for i in range(5):
+            User.objects.create_user(f"staff{i}@sup.com", "pass", role=UserRole.SALES_REP, supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Outbox Buyer", address="2 B St")
+        self.user_consumer = User.objects.create_user("buyer@test.com", "pass", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.product = Product.objects.create(supplier=self.supplier, name="P", price=10, stock_level=10, unit="x")
+
+    def test_placing_order_only_records_event(self):
+        """Test that the request path writes the event, not the notifications"""
+        self.client.force_authenticate(user=self.user_consumer)
+        data = {"supplier": self.supplier.id, "items": [{"product_id": self.product.id, "quantity": 1}]}
+        response = self.client.post(reverse('order-list'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        events = OutboxEvent.objects.filter(topic='order.created')
+        self.assertTrue(events.exists())
+        for event in events:
+            self.assertEqual(event.payload, {'order_id': response.data['id']})
+        self.assertFalse(User.objects.filter(notifications__isnull=False).exists())
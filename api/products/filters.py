@@ -0,0 +1,171 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, F, Func, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = (10, 50, 100, 500)
+
+# ?sort= values and the keyset ordering they map to. Prices are what an
+# order charges (Product.effective_price), discounts included.
+SORT_ORDERINGS = {
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+}
+
+
+def get_sort_ordering(request):
+    sort = request.query_params.get('sort')
+    if not sort:
+        return None
+    if sort not in SORT_ORDERINGS:
+        raise ValidationError({'sort': f"Must be one of: {', '.join(SORT_ORDERINGS)}."})
+    return SORT_ORDERINGS[sort]
+
+
+def _true(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _csv(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def _decimal(params, name):
+    try:
+        return Decimal(params[name])
+    except (InvalidOperation, ValueError):
+        raise ValidationError({name: "A valid number is required."})
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Catalog filters:
+
+        ?supplier=1,2  ?unit=kg,box  ?min_price=  ?max_price=
+        ?discounted=true  ?in_stock=true
+
+    Values inside one filter are ORed, filters are ANDed. `get_facets`
+    counts the same queryset per supplier, unit and price bucket. Prices
+    are the discount price when above zero, as orders charge.
+    """
+
+    def get_conditions(self, request):
+        """
+        One Q per facet dimension, only for the filters present.
+        """
+        params = request.query_params
+        conditions = {}
+        if params.get('supplier'):
+            try:
+                ids = [int(value) for value in _csv(params['supplier'])]
+            except ValueError:
+                raise ValidationError({'supplier': "A comma separated list of IDs is required."})
+            conditions['supplier'] = Q(supplier_id__in=ids)
+        if params.get('unit'):
+            conditions['unit'] = Q(unit__in=_csv(params['unit']))
+        price = Q()
+        if params.get('min_price'):
+            price &= Q(effective_price__gte=_decimal(params, 'min_price'))
+        if params.get('max_price'):
+            price &= Q(effective_price__lte=_decimal(params, 'max_price'))
+        if price:
+            conditions['price'] = price
+        if _true(params.get('discounted', '')):
+            # Same rule as the order price: a zero discount is no discount
+            conditions['discounted'] = Q(discount_price__gt=0)
+        if _true(params.get('in_stock', '')):
+            conditions['in_stock'] = Q(stock_level__gte=F('min_order_qty'), stock_level__gt=0)
+        return conditions
+
+    def filter_queryset(self, request, queryset, view):
+        for condition in self.get_conditions(request).values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def get_facets(self, request, queryset):
+        """
+        Facet counts for the sidebar, in one aggregate query.
+
+        Each dimension is counted with every filter applied except its own,
+        so picking one supplier still lists the other suppliers with the
+        number of products they would add. The filters become boolean
+        columns of the visible queryset and GROUPING SETS count all three
+        dimensions plus the total in a single pass.
+        """
+        conditions = self.get_conditions(request)
+        flags = {
+            f'match_{name}': ExpressionWrapper(condition, output_field=BooleanField())
+            for name, condition in conditions.items()
+        }
+        rows = queryset.order_by().annotate(
+            facet_supplier=F('supplier_id'),
+            facet_supplier_name=F('supplier__company_name'),
+            facet_unit=F('unit'),
+            facet_bucket=Func(
+                F('effective_price'),
+                RawSQL('%s::numeric[]', (list(PRICE_BUCKETS),)),
+                function='width_bucket',
+            ),
+            **flags
+        ).values('facet_supplier', 'facet_supplier_name', 'facet_unit', 'facet_bucket', *flags)
+        inner_sql, params = rows.query.sql_with_params()
+
+        def count(skip=None):
+            checks = [f'v.{flag}' for flag in flags if flag != f'match_{skip}']
+            if not checks:
+                return 'COUNT(*)'
+            return f"COUNT(*) FILTER (WHERE {' AND '.join(checks)})"
+
+        sql = f"""
+            SELECT GROUPING(v.facet_supplier), GROUPING(v.facet_unit), GROUPING(v.facet_bucket),
+                   v.facet_supplier, v.facet_supplier_name, v.facet_unit, v.facet_bucket,
+                   {count('supplier')}, {count('unit')}, {count('price')}, {count()}
+            FROM ({inner_sql}) AS v
+            GROUP BY GROUPING SETS (
+                (v.facet_supplier, v.facet_supplier_name), (v.facet_unit), (v.facet_bucket), ()
+            )
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            result = cursor.fetchall()
+
+        facets = {'total': 0, 'suppliers': [], 'units': [], 'price': []}
+        for (no_supplier, no_unit, no_bucket, supplier_id, supplier_name, unit, bucket,
+             by_supplier, by_unit, by_price, total) in result:
+            if not no_supplier:
+                if by_supplier:
+                    facets['suppliers'].append({'id': supplier_id, 'name': supplier_name, 'count': by_supplier})
+            elif not no_unit:
+                if by_unit:
+                    facets['units'].append({'unit': unit, 'count': by_unit})
+            elif not no_bucket:
+                if by_price:
+                    bounds = (0,) + PRICE_BUCKETS + (None,)
+                    facets['price'].append({'min': bounds[bucket], 'max': bounds[bucket + 1], 'count': by_price})
+            else:
+                facets['total'] = total
+
+        facets['suppliers'].sort(key=lambda item: (-item['count'], item['name']))
+        facets['units'].sort(key=lambda item: (-item['count'], item['unit']))
+        facets['price'].sort(key=lambda item: item['min'])
+        return facets
+
+    def get_schema_operation_parameters(self, view):
+        def param(name, type, description):
+            return {'name': name, 'required': False, 'in': 'query',
+                    'description': description, 'schema': {'type': type}}
+        return [
+            param('supplier', 'string', "Comma separated Supplier IDs."),
+            param('unit', 'string', "Comma separated units, e.g. `kg,box`."),
+            param('min_price', 'number', "Lowest price, inclusive. The discount price counts when there is one."),
+            param('max_price', 'number', "Highest price, inclusive. The discount price counts when there is one."),
+            param('discounted', 'boolean', "Only products with a discount price."),
+            param('in_stock', 'boolean', "Only products with at least the minimum order quantity in stock."),
+            param('sort', 'string', f"One of {', '.join(SORT_ORDERINGS)}. Defaults to newest, or best match with `q`."),
+        ]
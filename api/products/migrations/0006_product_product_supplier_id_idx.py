@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_link_link_consumer_created_idx_and_more'),
+        ('products', '0005_product_discount_price_product_min_order_qty'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'id'], name='product_supplier_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_link_link_consumer_created_idx_and_more'),
+        ('products', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_available', True)), fields=['price', 'id'], name='product_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_available', True)), fields=['name', 'id'], name='product_live_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_available', True)), fields=['supplier', 'price', 'id'], name='product_live_sup_price_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0009_link_supplier_updated_at'),
+        ('products', '0010_product_stock_shards'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_live_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_live_sup_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(discount_price__gt=0, then='discount_price'), default='price'), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_available', True)), fields=['effective_price', 'id'], name='product_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_available', True)), fields=['supplier', 'effective_price', 'id'], name='product_live_sup_price_idx'),
+        ),
+    ]
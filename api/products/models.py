@@ -1,5 +1,20 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
+# Text search configuration used for the search column and for queries
+SEARCH_CONFIG = 'english'
+
+# Products a consumer can be shown at all
+LIVE = models.Q(is_archived=False, is_available=True)
+
+
+class ProductManager(models.Manager):
+    def get_queryset(self):
+        # The search column is only ever read by PostgreSQL itself
+        return super().get_queryset().defer('search_vector')
+
+
 class Product(models.Model):
     supplier = models.ForeignKey(
         'companies.Supplier',
@@ -15,18 +30,56 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    # What an order charges (orders.services._unit_price): the discount
+    # price when above zero. Catalog price filters, sort and facets use it.
+    effective_price = models.GeneratedField(
+        expression=models.Case(
+            models.When(discount_price__gt=0, then='discount_price'),
+            default='price',
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     unit = models.CharField(max_length=50)
     stock_level = models.IntegerField()
     min_order_qty = models.PositiveIntegerField(
         default=1,
         help_text="Minimum quantity required to order."
     )
+    # Hot products keep their orderable stock in this many StockShard rows
+    # (stock app) so concurrent orders do not queue on this row. 0 = off.
+    # Change it with stock.services.shard_stock, never directly.
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     is_available = models.BooleanField(default=True)
     is_archived = models.BooleanField(default=False)
     image = models.ImageField(upload_to='product_images/', null=True, blank=True)
+    # Drives delta sync (products.sync). Writes that bypass save() must set it too.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Kept up to date by PostgreSQL itself on every write, bulk or not
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = ProductManager()
 
     class Meta:
         db_table = 'product'  # optional, only if you want exact table name
+        indexes = [
+            models.Index(fields=['supplier', 'id'], name='product_supplier_id_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+            # Catalog sorting and filtering only ever looks at live products;
+            # partial indexes skip archived / unavailable rows entirely
+            models.Index(fields=['effective_price', 'id'], condition=LIVE, name='product_live_price_idx'),
+            models.Index(fields=['name', 'id'], condition=LIVE, name='product_live_name_idx'),
+            models.Index(fields=['supplier', 'effective_price', 'id'], condition=LIVE,
+                         name='product_live_sup_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
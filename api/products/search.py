@@ -0,0 +1,43 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import SEARCH_CONFIG
+
+_trigram_available = None
+
+
+def trigram_available():
+    """
+    Whether pg_trgm is installed (the products migration adds it when the
+    server ships it). Checked once per process.
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            _trigram_available = cursor.fetchone()[0]
+    return _trigram_available
+
+
+def search_products(queryset, text):
+    """
+    Narrow `queryset` to products matching `text` and annotate `search_rank`.
+
+    Words are matched against the generated `search_vector` column (name
+    weighted over description, English stemming, web-search syntax such as
+    "quoted phrases" and -excluded words). With pg_trgm a product whose name
+    merely looks like the query ("tomatoe", "chiken") matches too. Both
+    conditions are served by GIN indexes and combined with a bitmap OR, so
+    only matching rows are read and ranked.
+    """
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    match = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+    if trigram_available():
+        match |= Q(name__trigram_word_similar=text)
+        rank = rank + TrigramWordSimilarity(text, 'name')
+    # Ranks are `real`; as double precision they survive the trip through a
+    # pagination cursor unchanged
+    return queryset.filter(match).annotate(search_rank=Cast(rank, FloatField()))
@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from companies.models import Link, LinkStatus
+from scp_project.eager import eager_load
+from scp_project.pagination import RowCompare
+from .models import Product
+from .serializers import ProductSerializer
+
+PAGE_SIZE = 500
+
+
+def encode_token(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(encoded):
+    """
+    {'since': iso | None, 'started': iso, 'after': [iso, id] | None}
+    """
+    try:
+        raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        data = json.loads(raw)
+        since = data.get('since') and parse_datetime(data['since'])
+        started = parse_datetime(data['started'])
+        after = data.get('after')
+        if after is not None:
+            after = [parse_datetime(after[0]), int(after[1])]
+        if started is None or (data.get('since') and since is None) or (after and after[0] is None):
+            raise ValueError
+    except Exception:
+        raise ValidationError({'since': "Invalid sync token."})
+    return since or None, started, after
+
+
+class ProductChanges:
+    """
+    Delta sync of the product list for offline clients.
+
+    Without a token every visible product is sent (`full`). Afterwards only
+    products written since the token come back: visible ones in `changed`,
+    ones that disappeared (archived, unavailable, out of stock) as IDs in
+    `removed`. Link changes work per supplier: a supplier whose link was
+    removed, blocked or deactivated is listed in `removed_suppliers` and
+    the client drops all of its products; a supplier that became visible
+    (or was renamed) has all of its products sent again.
+
+    Archived products and soft-deleted links stay in their tables, so they
+    are the tombstones. Pages are read in (updated_at, id) order; while
+    `more` is true the client calls again with the new token straight away.
+
+    Timestamps are taken when a row is written, not when it commits, so
+    each window starts SYNC_OVERLAP_SECONDS before the previous sync.
+    Clients upsert by id, so resent rows do no harm.
+    """
+
+    def __init__(self, view, request):
+        self.view = view
+        self.request = request
+        self.user = request.user
+
+    def supplier_changes(self, lower):
+        """
+        (all visible supplier IDs, suppliers to resend in full, suppliers to drop)
+        """
+        if self.user.supplier:
+            return {self.user.supplier.id}, set(), set()
+        if not self.user.consumer:
+            return set(), set(), set()
+
+        visible, resend, dropped = set(), set(), set()
+        links = Link.objects.filter(consumer=self.user.consumer).values_list(
+            'supplier_id', 'status', 'is_active', 'updated_at', 'supplier__is_active', 'supplier__updated_at'
+        )
+        for supplier_id, status, is_active, link_updated, supplier_active, supplier_updated in links:
+            shown = status == LinkStatus.ACCEPTED and is_active and supplier_active
+            changed = lower is not None and max(link_updated, supplier_updated) > lower
+            if shown:
+                visible.add(supplier_id)
+                if changed:
+                    resend.add(supplier_id)
+            elif changed:
+                dropped.add(supplier_id)
+        return visible, resend, dropped
+
+    def get(self, token):
+        since, started, after = decode_token(token) if token else (None, None, None)
+        if after is None:
+            # A new sync; while paging, keep the time the sync began
+            started = timezone.now()
+        full = since is None
+        lower = None if full else since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+
+        suppliers, resend, dropped = self.supplier_changes(lower)
+
+        rows = Product.objects.filter(supplier_id__in=suppliers)
+        if not full:
+            rows = rows.filter(Q(updated_at__gt=lower) | Q(supplier_id__in=resend))
+        if after is not None:
+            rows = rows.filter(RowCompare(('updated_at', 'id'), '>', after))
+        rows = list(eager_load(rows, ProductSerializer).order_by('updated_at', 'id')[:PAGE_SIZE + 1])
+        more = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+
+        # Same rules as the list endpoint decide what the client may keep
+        shown = set(
+            self.view.get_visible_queryset().filter(id__in=[row.id for row in rows]).values_list('id', flat=True)
+        )
+        changed = [row for row in rows if row.id in shown]
+        # A fresh client has nothing to remove
+        removed = [] if full else [row.id for row in rows if row.id not in shown]
+
+        if more:
+            last = rows[-1]
+            next_token = {
+                'since': since and since.isoformat(),
+                'started': started.isoformat(),
+                'after': [last.updated_at.isoformat(), last.id],
+            }
+        else:
+            next_token = {'since': started.isoformat(), 'started': started.isoformat(), 'after': None}
+
+        return {
+            'token': encode_token(next_token),
+            'more': more,
+            'full': full,
+            'changed': ProductSerializer(changed, many=True, context={'request': self.request}).data,
+            'removed': removed,
+            # Only needed once per sync
+            'removed_suppliers': sorted(dropped) if after is None else [],
+        }
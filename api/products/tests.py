@@ -1,15 +1,20 @@
+from unittest import mock, skipUnless
+
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from companies.models import Supplier, Consumer, Link, LinkStatus
 from products.models import Product
+from products.search import trigram_available
+from scp_project.testing import QueryCountMixin
 from users.models import UserRole
 
 User = get_user_model()
 
 
-class ProductCatalogTests(APITestCase):
+class ProductCatalogTests(QueryCountMixin, APITestCase):
     def setUp(self):
         self.list_url = reverse('product-list')
 
@@ -97,7 +102,7 @@ class ProductCatalogTests(APITestCase):
         response = self.client.get(self.list_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)  # Should see 0 products
+        self.assertEqual(len(response.data['results']), 0)  # Should see 0 products
 
     def test_pending_consumer_sees_empty_catalog(self):
         """Test that a PENDING link is not enough to see the catalog"""
@@ -106,7 +111,7 @@ class ProductCatalogTests(APITestCase):
         self.client.force_authenticate(user=self.user_consumer)
         response = self.client.get(self.list_url)
 
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_linked_consumer_sees_only_linked_products(self):
         """Test that ACCEPTED link reveals the catalog"""
@@ -118,8 +123,8 @@ class ProductCatalogTests(APITestCase):
 
         # Should see "Potato" (Supplier A)
         # Should NOT see "Carrot" (Supplier B - not linked)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], "Potato")
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], "Potato")
 
     def test_consumer_cannot_see_unavailable_products(self):
         """Test that hidden products remain hidden even if linked"""
@@ -128,8 +133,8 @@ class ProductCatalogTests(APITestCase):
         self.client.force_authenticate(user=self.user_consumer)
         response = self.client.get(self.list_url)
 
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], "Potato")
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], "Potato")
 
     def test_sales_rep_cannot_manage_catalog(self):
         """Test that Sales Reps cannot Create/Update/Delete products"""
@@ -164,16 +169,27 @@ class ProductCatalogTests(APITestCase):
         response = self.client.get(self.list_url)
 
         # Should only see 'Potato' (Stock 100, Min 1). Should NOT see 'Low Stock'
-        names = [p['name'] for p in response.data]
+        names = [p['name'] for p in response.data['results']]
         self.assertNotIn("Low Stock", names)
         self.assertIn("Potato", names)
 
         # 3. Supplier View -> Should be visible
         self.client.force_authenticate(user=self.user_supplier_a)
         response = self.client.get(self.list_url)
-        names = [p['name'] for p in response.data]
+        names = [p['name'] for p in response.data['results']]
         self.assertIn("Low Stock", names)
 
+    def test_product_list_queries_do_not_grow(self):
+        for supplier in (self.supplier_a, self.supplier_b):
+            Link.objects.create(supplier=supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+
+        def add_products():
+            for supplier in (self.supplier_a, self.supplier_b):
+                Product.objects.create(supplier=supplier, name="Onion", price=2, stock_level=10, unit="kg")
+
+        self.assertQueriesDoNotGrow(self.list_url, self.user_consumer, add_products)
+        self.assertQueriesDoNotGrow(self.list_url, self.user_supplier_a, add_products)
+
     def test_product_soft_delete(self):
         """Test that deleting a product archives it (Soft Delete)"""
         self.client.force_authenticate(user=self.user_supplier_a)
@@ -188,8 +204,8 @@ class ProductCatalogTests(APITestCase):
 
         # Verify List (Should disappear)
         response = self.client.get(self.list_url)
-        self.assertEqual(len(response.data), 1)  # 2 original - 1 deleted
-        ids = [p['id'] for p in response.data]
+        self.assertEqual(len(response.data['results']), 1)  # 2 original - 1 deleted
+        ids = [p['id'] for p in response.data['results']]
         self.assertNotIn(self.potato.id, ids)
 
     def test_supplier_soft_delete_hides_products(self):
@@ -199,7 +215,7 @@ class ProductCatalogTests(APITestCase):
         # Verify visible initially
         self.client.force_authenticate(user=self.user_consumer)
         response = self.client.get(self.list_url)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data['results']) > 0)
 
         # Soft Delete the Supplier
         self.supplier_a.is_active = False
@@ -207,4 +223,315 @@ class ProductCatalogTests(APITestCase):
 
         # Verify products hidden
         response = self.client.get(self.list_url)
-        self.assertEqual(len(response.data), 0)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 0)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('product-list')
+        self.supplier = Supplier.objects.create(company_name="Search Farm", address="1 A St")
+        self.other_supplier = Supplier.objects.create(company_name="Unlinked Farm", address="2 B St")
+        self.consumer = Consumer.objects.create(company_name="Search Buyer", address="3 C St")
+        self.user_consumer = User.objects.create_user("search@test.com", "pass123", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+
+        def make(name, description="", supplier=None):
+            return Product.objects.create(supplier=supplier or self.supplier, name=name, description=description,
+                                          price=5, stock_level=10, unit="kg")
+
+        self.tomatoes = make("Cherry Tomatoes", "Sweet and small")
+        self.sauce = make("Pasta Sauce", "Made from ripe tomatoes")
+        self.cucumber = make("Cucumber", "Crunchy")
+        self.hidden = make("Tomato Paste", supplier=self.other_supplier)
+        self.client.force_authenticate(user=self.user_consumer)
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_search_matches_name_and_description_with_stemming(self):
+        names = [p['name'] for p in self.search("tomato").data['results']]
+
+        self.assertEqual(set(names), {"Cherry Tomatoes", "Pasta Sauce"})
+
+    def test_name_matches_rank_above_description_matches(self):
+        names = [p['name'] for p in self.search("tomatoes").data['results']]
+
+        self.assertEqual(names, ["Cherry Tomatoes", "Pasta Sauce"])
+
+    def test_search_respects_visibility(self):
+        """Test that products of unlinked suppliers never show up in search"""
+        names = [p['name'] for p in self.search("paste").data['results']]
+
+        self.assertEqual(names, [])
+
+    def test_search_results_paginate_by_rank(self):
+        first = self.search("tomatoes", page_size=1)
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([p['name'] for p in first.data['results']], ["Cherry Tomatoes"])
+        self.assertEqual([p['name'] for p in second.data['results']], ["Pasta Sauce"])
+        self.assertIsNone(second.data['next'])
+
+    @skipUnless(trigram_available(), "pg_trgm is not installed")
+    def test_search_tolerates_typos(self):
+        names = [p['name'] for p in self.search("cucumbr").data['results']]
+
+        self.assertEqual(names, ["Cucumber"])
+
+
+class ProductFilterTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('product-list')
+        self.facets_url = reverse('product-facets')
+        self.farm = Supplier.objects.create(company_name="Farm", address="1 A St")
+        self.bakery = Supplier.objects.create(company_name="Bakery", address="2 B St")
+        self.consumer = Consumer.objects.create(company_name="Filter Buyer", address="3 C St")
+        self.user_consumer = User.objects.create_user("filter@test.com", "pass123", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        for supplier in (self.farm, self.bakery):
+            Link.objects.create(supplier=supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+
+        def make(supplier, name, price, unit, discount_price=None):
+            return Product.objects.create(supplier=supplier, name=name, price=price, unit=unit,
+                                          discount_price=discount_price, stock_level=10)
+
+        make(self.farm, "Apples", 5, "kg")
+        make(self.farm, "Honey", 30, "jar", discount_price=25)
+        make(self.farm, "Cheese wheel", 120, "pcs")
+        make(self.bakery, "Bread", 3, "pcs")
+        make(self.bakery, "Cake", 45, "pcs", discount_price=40)
+        self.client.force_authenticate(user=self.user_consumer)
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['name'] for p in response.data['results']]
+
+    def test_filters_combine(self):
+        self.assertEqual(set(self.names(supplier=self.farm.id)), {"Apples", "Honey", "Cheese wheel"})
+        self.assertEqual(set(self.names(unit="pcs", max_price=50)), {"Bread", "Cake"})
+        self.assertEqual(set(self.names(min_price=10, discounted="true")), {"Honey", "Cake"})
+
+    def test_zero_discount_is_not_discounted(self):
+        """Test that the filter and its facet agree with the price an order pays"""
+        Product.objects.create(supplier=self.bakery, name="Pie", price=20, unit="pcs", discount_price=0,
+                               stock_level=10)
+
+        self.assertEqual(set(self.names(discounted="true")), {"Honey", "Cake"})
+        response = self.client.get(self.facets_url, {'discounted': 'true'})
+        self.assertEqual(response.data['total'], 2)
+
+    def test_prices_are_what_orders_charge(self):
+        """Test that price filters, sort and buckets use the discount price"""
+        Product.objects.create(supplier=self.bakery, name="Jam", price=60, unit="jar", discount_price=8,
+                               stock_level=10)
+
+        self.assertEqual(set(self.names(max_price=9)), {"Apples", "Bread", "Jam"})
+        self.assertEqual(set(self.names(min_price=25, max_price=25)), {"Honey"})
+        self.assertEqual(self.names(sort='price'), ["Bread", "Apples", "Jam", "Honey", "Cake", "Cheese wheel"])
+        response = self.client.get(self.facets_url, {'supplier': self.bakery.id})
+        self.assertEqual(response.data['price'], [
+            {'min': 0, 'max': 10, 'count': 2},
+            {'min': 10, 'max': 50, 'count': 1},
+        ])
+
+    def test_sort_by_price_paginates(self):
+        first = self.client.get(self.url, {'sort': 'price', 'page_size': 3})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([p['name'] for p in first.data['results']], ["Bread", "Apples", "Honey"])
+        self.assertEqual([p['name'] for p in second.data['results']], ["Cake", "Cheese wheel"])
+        self.assertEqual(self.names(sort='-name')[0], "Honey")
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'sort': 'stock'}, {'min_price': 'cheap'}, {'supplier': 'farm'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_ignore_their_own_filter(self):
+        """Test that choosing a supplier still lists the other suppliers"""
+        self.client.get(self.facets_url)  # warm the link cache
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.facets_url, {'supplier': self.farm.id, 'unit': 'pcs'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 1)  # Cheese wheel
+        self.assertEqual(response.data['suppliers'], [
+            {'id': self.bakery.id, 'name': "Bakery", 'count': 2},
+            {'id': self.farm.id, 'name': "Farm", 'count': 1},
+        ])
+        self.assertEqual(response.data['units'], [
+            {'unit': "jar", 'count': 1}, {'unit': "kg", 'count': 1}, {'unit': "pcs", 'count': 1},
+        ])
+        self.assertEqual(response.data['price'], [{'min': 100, 'max': 500, 'count': 1}])
+
+    def test_facets_follow_visibility(self):
+        Product.objects.create(supplier=Supplier.objects.create(company_name="Stranger", address="-"),
+                               name="Hidden", price=1, unit="kg", stock_level=10)
+
+        response = self.client.get(self.facets_url)
+
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual(response.data['price'], [
+            {'min': 0, 'max': 10, 'count': 2},
+            {'min': 10, 'max': 50, 'count': 2},
+            {'min': 100, 'max': 500, 'count': 1},
+        ])
+
+
+class ProductConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('product-list')
+        self.supplier = Supplier.objects.create(company_name="ETag Farm", address="1 A St")
+        self.owner = User.objects.create_user("owner@etag.com", "pass123", role=UserRole.OWNER,
+                                              supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="ETag Buyer", address="2 B St")
+        self.user_consumer = User.objects.create_user("buyer@etag.com", "pass123", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        self.link = Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.product = Product.objects.create(supplier=self.supplier, name="Eggs", price=3, stock_level=50, unit="box")
+        self.client.force_authenticate(user=self.user_consumer)
+
+    def revalidate(self, etag):
+        return self.client.get(self.url, headers={'If-None-Match': etag})
+
+    def test_304_skips_the_list_query(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # Only the version lookup runs
+        with self.assertNumQueries(1):
+            response = self.revalidate(etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, {'q': 'eggs'}, headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_product_edit_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.patch(reverse('product-detail', args=[self.product.id]), {"price": "4.00"})
+        self.client.force_authenticate(user=self.user_consumer)
+
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['price'], "4.00")
+
+    def test_stock_change_from_order_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.post(reverse('order-list'), {
+            "supplier": self.supplier.id, "items": [{"product_id": self.product.id, "quantity": 5}]
+        }, format='json')
+
+        self.assertEqual(self.revalidate(etag).status_code, status.HTTP_200_OK)
+
+    def test_link_change_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.link.status = LinkStatus.BLOCKED
+        self.link.save()
+
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class ProductDeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('product-changes')
+        self.supplier = Supplier.objects.create(company_name="Sync Farm", address="1 A St")
+        self.owner = User.objects.create_user("owner@sync.com", "pass123", role=UserRole.OWNER,
+                                              supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Sync Buyer", address="2 B St")
+        self.user_consumer = User.objects.create_user("buyer@sync.com", "pass123", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        self.link = Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.milk = Product.objects.create(supplier=self.supplier, name="Milk", price=2, stock_level=20, unit="l")
+        self.eggs = Product.objects.create(supplier=self.supplier, name="Eggs", price=3, stock_level=20, unit="box")
+        self.client.force_authenticate(user=self.user_consumer)
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_then_empty_delta(self):
+        full = self.sync()
+        self.assertTrue(full['full'])
+        self.assertFalse(full['more'])
+        self.assertEqual({p['name'] for p in full['changed']}, {"Milk", "Eggs"})
+
+        delta = self.sync(full['token'])
+
+        self.assertFalse(delta['full'])
+        self.assertEqual((delta['changed'], delta['removed'], delta['removed_suppliers']), ([], [], []))
+
+    def test_updates_and_archival_are_sent(self):
+        token = self.sync()['token']
+        self.milk.price = 5
+        self.milk.save()
+        self.eggs.is_archived = True
+        self.eggs.save()
+
+        delta = self.sync(token)
+
+        self.assertEqual([(p['id'], p['price']) for p in delta['changed']], [(self.milk.id, "5.00")])
+        self.assertEqual(delta['removed'], [self.eggs.id])
+
+    def test_stock_below_minimum_from_order_removes_product(self):
+        self.eggs.min_order_qty = 5
+        self.eggs.save()
+        token = self.sync()['token']
+
+        self.client.post(reverse('order-list'), {
+            "supplier": self.supplier.id, "items": [{"product_id": self.eggs.id, "quantity": 18}]
+        }, format='json')
+
+        self.assertEqual(self.sync(token)['removed'], [self.eggs.id])
+
+    def test_link_removal_and_restore(self):
+        token = self.sync()['token']
+        self.link.status = LinkStatus.BLOCKED
+        self.link.save()
+
+        delta = self.sync(token)
+        self.assertEqual(delta['removed_suppliers'], [self.supplier.id])
+        self.assertEqual(delta['changed'], [])
+
+        self.link.status = LinkStatus.ACCEPTED
+        self.link.save()
+
+        delta = self.sync(delta['token'])
+        self.assertEqual({p['name'] for p in delta['changed']}, {"Milk", "Eggs"})
+
+    def test_large_syncs_are_paged(self):
+        Product.objects.bulk_create([
+            Product(supplier=self.supplier, name=f"Item {i}", price=1, stock_level=5, unit="pcs") for i in range(3)
+        ])
+        names = []
+        with mock.patch('products.sync.PAGE_SIZE', 2):
+            page = self.sync()
+            names += [p['name'] for p in page['changed']]
+            while page['more']:
+                page = self.sync(page['token'])
+                names += [p['name'] for p in page['changed']]
+
+        self.assertEqual(len(names), 5)
+        self.assertEqual(len(set(names)), 5)
+
+    def test_bad_token_is_rejected(self):
+        response = self.client.get(self.url, {'since': 'garbage'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,20 +1,72 @@
 from rest_framework import viewsets, permissions, exceptions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import F
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from users.models import UserRole
 from .models import Product
+from .filters import ProductFilterBackend, get_sort_ordering
+from .search import search_products
+from .sync import ProductChanges
 from .serializers import ProductSerializer
-from companies.models import Link, LinkStatus
+from companies.models import Supplier
+from companies.services import accepted_supplier_ids
+from scp_project.conditional import ConditionalGetMixin
+from scp_project.eager import EagerLoadingMixin
+from scp_project.profiling import SerializerTimingMixin
+from stock.services import shard_stock
 
-class ProductViewSet(viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(parameters=[
+        OpenApiParameter('q', str, description="Search name and description; results come best match first."),
+    ])
+)
+class ProductViewSet(ConditionalGetMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    filter_backends = [ProductFilterBackend]
+    ordering = ('-id',)
 
     """
         - Suppliers: See ONLY their own products.
         - Consumers: See ONLY products from Suppliers they are linked with.
     """
+    def get_etag_parts(self):
+        # Products shown depend only on the catalogs of the visible suppliers
+        user = self.request.user
+        if user.supplier:
+            supplier_ids = [user.supplier.id]
+        elif user.consumer:
+            supplier_ids = accepted_supplier_ids(user.consumer)
+        else:
+            return None
+        return list(
+            Supplier.objects.filter(id__in=supplier_ids).order_by('id').values_list('id', 'catalog_version')
+        )
+
+    def get_search_text(self):
+        if self.action not in ('list', 'facets'):
+            return ''
+        return self.request.query_params.get('q', '').strip()
+
+    def get_ordering(self):
+        ordering = get_sort_ordering(self.request)
+        if ordering:
+            return ordering
+        if self.get_search_text():
+            return ('-search_rank', '-id')
+        return self.ordering
+
     def get_queryset(self):
+        queryset = self.get_visible_queryset()
+        text = self.get_search_text()
+        if text:
+            queryset = search_products(queryset, text)
+        return queryset
+
+    def get_visible_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Product.objects.none()
 
@@ -24,15 +76,10 @@ class ProductViewSet(viewsets.ModelViewSet):
             return base_qs.filter(supplier=user.supplier)
 
         if user.consumer:
-            # Find all suppliers where we have an ACCEPTED link
-            linked_supplier_ids = Link.objects.filter(
-                consumer=user.consumer,
-                status=LinkStatus.ACCEPTED
-            ).values_list('supplier_id', flat=True)
-
-            # Return products from those suppliers only and only available ones
+            # Return products from suppliers we have an ACCEPTED link with
+            # (cached) and only available ones
             return base_qs.filter(
-                supplier_id__in=linked_supplier_ids,
+                supplier_id__in=accepted_supplier_ids(user.consumer),
                 is_available=True,
                 stock_level__gte=F('min_order_qty')
             )
@@ -42,6 +89,27 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         return Product.objects.none()
 
+    @extend_schema(
+        summary="Catalog facet counts",
+        description="Product counts per supplier, unit and price bucket for the current search and filters. "
+                    "Each dimension ignores its own filter.",
+        parameters=[OpenApiParameter('q', str, description="Same search as the list.")],
+    )
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        return Response(ProductFilterBackend().get_facets(request, self.get_queryset()))
+
+    @extend_schema(
+        summary="Product changes since a sync token",
+        description="Delta sync for offline clients. Call without `since` once for a full copy, then pass the "
+                    "returned `token` as `since`. Keep calling while `more` is true. Apply `changed` as "
+                    "upserts, delete the `removed` IDs and every product of the `removed_suppliers`.",
+        parameters=[OpenApiParameter('since', str, description="Token from the previous response.")],
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        return Response(ProductChanges(self, request).get(request.query_params.get('since')))
+
     def perform_create(self, serializer):
         user = self.request.user
 
@@ -57,6 +125,13 @@ class ProductViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.role not in [UserRole.OWNER, UserRole.MANAGER]:
             raise exceptions.PermissionDenied("Sales Representatives cannot edit the Catalog.")
+        product = serializer.instance
+        if product.stock_shards:
+            # Stock of a sharded product lives in its shards and ledger too
+            with transaction.atomic():
+                shard_stock(product, product.stock_shards, serializer.validated_data.get('stock_level'))
+                serializer.save()
+            return
         serializer.save()
 
     def perform_destroy(self, instance):
@@ -65,4 +140,4 @@ class ProductViewSet(viewsets.ModelViewSet):
             raise exceptions.PermissionDenied("Sales Representatives cannot delete Products.")
         instance.is_archived = True
         instance.is_available = False
-        instance.save()
+        instance.save(update_fields=['is_archived', 'is_available', 'updated_at'])
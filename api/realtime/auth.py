@@ -0,0 +1,40 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+@database_sync_to_async
+def _authenticate(raw_token):
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with the same SimpleJWT access tokens
+    as the REST API. Browsers cannot set headers on a WebSocket, so the token
+    may also be passed as ?token=<access>.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope['user'] = AnonymousUser()
+        raw_token = None
+
+        headers = dict(scope.get('headers', []))
+        header = headers.get(b'authorization', b'').decode()
+        if header.startswith('Bearer '):
+            raw_token = header[len('Bearer '):]
+        else:
+            query = parse_qs(scope.get('query_string', b'').decode())
+            raw_token = query.get('token', [None])[0]
+
+        if raw_token:
+            scope['user'] = await _authenticate(raw_token)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,28 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .push import groups_for
+
+
+class EventConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/events/ - server push of chat messages, notifications and order updates.
+    Every frame is {"type": "<event>", "data": {...}}.
+    """
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.joined = groups_for(user)
+        for group in self.joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def push_event(self, event):
+        await self.send_json({'type': event['event'], 'data': event['data']})
@@ -0,0 +1,17 @@
+from orders.models import Order
+from outbox.services import subscribe
+from .push import push, consumer_group, supplier_group
+
+
+@subscribe('order.created')
+@subscribe('order.updated')
+def push_order_status(payload):
+    # Both sides of the order see status changes live
+    order = Order.objects.filter(id=payload['order_id']).values('id', 'status', 'consumer_id', 'supplier_id').first()
+    if order is None:
+        return
+    data = {'id': order['id'], 'status': payload.get('status', order['status'])}
+    push([
+        (consumer_group(order['consumer_id']), 'order.status', data),
+        (supplier_group(order['supplier_id']), 'order.status', data),
+    ])
@@ -0,0 +1,42 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def user_group(user_id):
+    return f"user.{user_id}"
+
+
+def consumer_group(consumer_id):
+    return f"consumer.{consumer_id}"
+
+
+def supplier_group(supplier_id):
+    return f"supplier.{supplier_id}"
+
+
+def groups_for(user):
+    """
+    Groups a connected user listens to: their own and their company's.
+    """
+    groups = [user_group(user.id)]
+    if user.consumer_id:
+        groups.append(consumer_group(user.consumer_id))
+    if user.supplier_id:
+        groups.append(supplier_group(user.supplier_id))
+    return groups
+
+
+def push(messages):
+    """
+    Send events to WebSocket groups. `messages` is a list of
+    (group, event type, JSON-able data). All sends share one event loop hop.
+    """
+    layer = get_channel_layer()
+    if layer is None or not messages:
+        return
+
+    async def send_all():
+        for group, event, data in messages:
+            await layer.group_send(group, {'type': 'push.event', 'event': event, 'data': data})
+
+    async_to_sync(send_all)()
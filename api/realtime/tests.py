@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from companies.models import Supplier, Consumer
+from notifications.models import NotificationType
+from notifications.services import notify
+from orders.models import Order, OrderStatus
+from outbox.services import dispatch_batch
+from realtime.push import push, user_group, supplier_group
+from scp_project.asgi import application
+from users.models import UserRole
+
+User = get_user_model()
+
+
+class WebSocketPushTests(TransactionTestCase):
+    # channels closes the DB connection after each sync call, which a
+    # TestCase transaction would not survive
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Push Co", address="1 A St")
+        self.sales = User.objects.create_user("sales@push.com", "pass", role=UserRole.SALES_REP, supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Push Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@push.com", "pass", role=UserRole.CONSUMER, consumer=self.consumer)
+
+    async def connect(self, user):
+        token = await sync_to_async(AccessToken.for_user)(user)
+        communicator = WebsocketCommunicator(application, f"/ws/events/?token={token}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_anonymous_connection_is_rejected(self):
+        communicator = WebsocketCommunicator(application, "/ws/events/?token=garbage")
+        connected, code = await communicator.connect()
+
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_company_group_receives_pushes(self):
+        communicator = await self.connect(self.sales)
+
+        await sync_to_async(push)([(supplier_group(self.supplier.id), 'chat.message', {'text': 'hi'})])
+
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'chat.message', 'data': {'text': 'hi'}})
+        await communicator.disconnect()
+
+    async def test_other_users_do_not_receive_pushes(self):
+        communicator = await self.connect(self.buyer)
+
+        await sync_to_async(push)([(user_group(self.sales.id), 'notification', {'title': 'secret'})])
+
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_notifications_are_pushed_to_recipient(self):
+        communicator = await self.connect(self.buyer)
+
+        await sync_to_async(notify)([self.buyer.id], type=NotificationType.SYSTEM, title="Welcome", message="..")
+        await sync_to_async(dispatch_batch)()  # pushed by the outbox
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['type'], 'notification')
+        self.assertEqual(frame['data']['title'], "Welcome")
+        await communicator.disconnect()
+
+    async def test_order_status_is_pushed_to_both_sides(self):
+        supplier_ws = await self.connect(self.sales)
+        consumer_ws = await self.connect(self.buyer)
+
+        def ship():
+            order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=10)
+            order.status = OrderStatus.SHIPPED
+            order.save()
+            dispatch_batch()
+            return order
+        order = await sync_to_async(ship)()
+
+        for ws in (supplier_ws, consumer_ws):
+            statuses = []
+            while not await ws.receive_nothing(timeout=0.2):
+                frame = await ws.receive_json_from()
+                if frame['type'] == 'order.status':
+                    statuses.append(frame['data'])
+            self.assertIn({'id': order.id, 'status': OrderStatus.SHIPPED}, statuses)
+            await ws.disconnect()
@@ -0,0 +1,113 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class EagerPlan(NamedTuple):
+    select: tuple  # select_related paths
+    prefetch: tuple  # (lookup, related model, EagerPlan for its queryset)
+
+
+EMPTY_PLAN = EagerPlan((), ())
+
+
+def _single_relations(model, source):
+    """
+    Follow a dotted serializer source through forward (or reverse one to
+    one) relations: 'supplier.company_name' -> ('supplier', Supplier).
+    Stops at the first attribute that is not such a relation.
+    """
+    path = []
+    for attr in source.split('.'):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        # get_field() also accepts 'supplier_id', which needs no join
+        if field.name != attr or not (field.many_to_one or field.one_to_one):
+            break
+        path.append(attr)
+        model = field.related_model
+    return '__'.join(path), model
+
+
+def _plan(serializer, model):
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            try:
+                relation = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if not relation.is_relation:
+                continue
+            child = getattr(field, 'child', None)
+            sub = _plan(child, relation.related_model) if child is not None else EMPTY_PLAN
+            prefetch.append((field.source, relation.related_model, sub))
+            continue
+
+        path, related = _single_relations(model, field.source)
+        if not path:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            # A nested object: join it, and whatever it reads in turn
+            if path != field.source.replace('.', '__'):
+                continue
+            sub = _plan(field, related)
+            select += [path, *(f'{path}__{lookup}' for lookup in sub.select)]
+            prefetch += [(f'{path}__{lookup}', m, s) for lookup, m, s in sub.prefetch]
+        elif isinstance(field, serializers.RelatedField):
+            # The related object's pk is already on the row
+            if field.use_pk_only_optimization() and path == field.source:
+                continue
+            select.append(path)
+        else:
+            select.append(path)
+    return EagerPlan(tuple(dict.fromkeys(select)), tuple(prefetch))
+
+
+@lru_cache(maxsize=None)
+def eager_plan(serializer_class):
+    """
+    What a serializer reads through relations, worked out once per class.
+    """
+    model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+    if model is None:
+        return EMPTY_PLAN
+    return _plan(serializer_class(), model)
+
+
+def apply_plan(queryset, plan):
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*(
+            Prefetch(lookup, queryset=apply_plan(model._default_manager.all(), sub))
+            for lookup, model, sub in plan.prefetch
+        ))
+    return queryset
+
+
+def eager_load(queryset, serializer_class):
+    return apply_plan(queryset, eager_plan(serializer_class))
+
+
+class EagerLoadingMixin:
+    """
+    Loads what the serializer reads through relations together with the
+    rows, so a page costs the same few queries whatever its size.
+
+    Relations behind dotted sources and nested serializers are joined
+    (select_related); nested lists and many related fields are prefetched,
+    each with its own plan. Values computed in SerializerMethodFields are
+    not seen: load those in get_queryset.
+    """
+
+    def filter_queryset(self, queryset):
+        return eager_load(super().filter_queryset(queryset), self.get_serializer_class())
@@ -0,0 +1,367 @@
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.models import Min
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .profiling import RequestStats, install_query_timer, request_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# psycopg_pool.get_stats() key -> (metric, type, help, scale)
+POOL_STATS = {
+    'pool_max': ('scp_db_pool_max_connections', 'gauge', "Most connections the pool may open.", 1),
+    'pool_size': ('scp_db_pool_connections', 'gauge', "Connections open, in use or idle.", 1),
+    'pool_available': ('scp_db_pool_idle_connections', 'gauge', "Connections idle in the pool.", 1),
+    'requests_waiting': ('scp_db_pool_waiting_requests', 'gauge', "Requests waiting for a connection.", 1),
+    'requests_num': ('scp_db_pool_requests_total', 'counter', "Connections handed out.", 1),
+    'requests_wait_ms': ('scp_db_pool_wait_seconds_total', 'counter', "Time spent waiting for a connection.", 1000),
+    'requests_errors': ('scp_db_pool_errors_total', 'counter', "Requests that got no connection in time.", 1),
+    'connections_lost': ('scp_db_pool_lost_connections_total', 'counter', "Connections found broken.", 1),
+}
+
+ARCHIVE = 'archive.json'
+
+
+class Registry:
+    """
+    Counters and histograms of this process since it started. Histograms
+    keep one count per bucket (not cumulative) plus +Inf, then the sum.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)  # (view, method, status) -> n
+        self.latency = {}  # (view, method) -> [per bucket..., +Inf, sum]
+        self.queries = {}  # (view, method) -> [per bucket..., +Inf, sum]
+        self.cache = defaultdict(int)  # 'hits' / 'misses' -> n
+        self.changes = 0
+        self.flush_lock = threading.Lock()
+        self.flushed = None
+        self.flusher = None  # pid of the process running the flush thread
+
+    def observe(self, view, method, status, seconds, stats):
+        with self.lock:
+            self.changes += 1
+            self.requests[view, method, status] += 1
+            _observe(self.latency, (view, method), LATENCY_BUCKETS, seconds)
+            _observe(self.queries, (view, method), QUERY_BUCKETS, stats.queries)
+            self.cache['hits'] += stats.cache_hits
+            self.cache['misses'] += stats.cache_misses
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': [[*labels, n] for labels, n in self.requests.items()],
+                'latency': [[*labels, *counts] for labels, counts in self.latency.items()],
+                'queries': [[*labels, *counts] for labels, counts in self.queries.items()],
+                'cache': dict(self.cache),
+            }
+
+    def process_snapshot(self):
+        return {**self.snapshot(), 'pid': os.getpid(), 'pool': pool_stats()}
+
+    def flush(self, directory, force=False):
+        """
+        Write this process's snapshot to `directory` if anything changed
+        since the last write, or anyway when forced.
+        """
+        with self.flush_lock:
+            changes = self.changes
+            if changes == self.flushed and not force:
+                return
+            try:
+                _write(Path(directory) / process_file(), self.process_snapshot())
+            except OSError:
+                return  # metrics never fail a request; the next flush retries
+            self.flushed = changes
+
+    def watch(self, directory):
+        """
+        Flush to `directory` every METRICS['FLUSH_SECONDS'] from a daemon
+        thread, started once per process (threads do not survive a fork).
+        """
+        with self.flush_lock:
+            if self.flusher == os.getpid():
+                return
+            self.flusher = os.getpid()
+        interval = settings.METRICS['FLUSH_SECONDS']
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush(directory)
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+
+def _observe(histograms, labels, buckets, value):
+    counts = histograms.get(labels)
+    if counts is None:
+        counts = histograms[labels] = [0] * (len(buckets) + 2)
+    counts[bisect_left(buckets, value)] += 1
+    counts[-1] += value
+
+
+def _write(path, data):
+    # Readers see the old or the new file, never half of one
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+registry = Registry()
+_started = int(time.time())
+
+
+def process_file():
+    # The start time keeps a reused pid from taking over an archived file
+    return f'{os.getpid()}-{_started}.json'
+
+
+def pool_stats():
+    pool = connections['default'].pool if settings.DATABASES['default'].get('OPTIONS', {}).get('pool') else None
+    return pool.get_stats() if pool is not None else {}
+
+
+def archive(directory, pid):
+    """
+    Fold the files of a dead worker into the archive, so its counts
+    outlive it and the directory does not grow with every restart. Run by
+    the gunicorn master only (child_exit), so there is a single writer.
+    """
+    directory = Path(directory)
+    data = _read(directory / ARCHIVE) or {'merged': []}
+    files = [path for path in directory.glob(f'{pid}-*.json') if path.name not in data['merged']]
+    if not files:
+        return
+    # Readers skip files named in 'merged', so nothing counts twice while
+    # the file still exists; names of deleted files are dropped later
+    snapshots = [data] + [snapshot for snapshot in map(_read, files) if snapshot]
+    merged = _merge(snapshots)
+    merged['merged'] = [name for name in data['merged'] if (directory / name).exists()] + [p.name for p in files]
+    _write(directory / ARCHIVE, merged)
+    for path in files:
+        path.unlink(missing_ok=True)
+
+
+def collect():
+    """
+    (merged counters of every process, [pool stats per live process]).
+    """
+    directory = settings.METRICS['DIR']
+    if not directory:
+        own = registry.process_snapshot()
+        return _merge([own]), [own]
+
+    # Only files are added up, this worker's written just now: every file
+    # only moves forward, so whichever worker answers, no total goes down
+    registry.flush(directory, force=True)
+    directory = Path(directory)
+    # Worker files first, then the archive: a file archived in between is
+    # either read and then skipped, or gone and already in the archive
+    files = {path.name: _read(path) for path in directory.glob('*-*.json')}
+    archived = _read(directory / ARCHIVE) or {'merged': []}
+    live = [snapshot for name, snapshot in files.items() if snapshot and name not in archived['merged']]
+    return _merge([archived] + live), live
+
+
+def _merge(snapshots):
+    requests = defaultdict(int)
+    latency = {}
+    queries = {}
+    hits = misses = 0
+    for snapshot in snapshots:
+        for *labels, n in snapshot.get('requests', ()):
+            requests[tuple(labels)] += n
+        for name, merged in (('latency', latency), ('queries', queries)):
+            for view, method, *counts in snapshot.get(name, ()):
+                total = merged.setdefault((view, method), [0] * len(counts))
+                for i, count in enumerate(counts):
+                    total[i] += count
+        hits += snapshot.get('cache', {}).get('hits', 0)
+        misses += snapshot.get('cache', {}).get('misses', 0)
+    return {
+        'requests': [[*labels, n] for labels, n in requests.items()],
+        'latency': [[*labels, *counts] for labels, counts in latency.items()],
+        'queries': [[*labels, *counts] for labels, counts in queries.items()],
+        'cache': {'hits': hits, 'misses': misses},
+    }
+
+
+def domain_gauges():
+    """
+    Backlogs worth an alert, cached for METRICS['GAUGE_TTL'] seconds
+    since some are COUNTs over large tables.
+    """
+    from notifications.models import Notification
+    from orders.models import Order, OrderStatus
+    from outbox.models import OutboxEvent, OutboxStatus
+    from support.models import Complaint, ComplaintStatus
+
+    def compute():
+        pending = OutboxEvent.objects.filter(status=OutboxStatus.PENDING)
+        oldest = pending.aggregate(oldest=Min('available_at'))['oldest']
+        return {
+            'scp_orders_pending': Order.objects.filter(status=OrderStatus.PENDING, is_active=True).count(),
+            'scp_complaints_open': Complaint.objects.filter(
+                status__in=[ComplaintStatus.OPEN, ComplaintStatus.IN_PROGRESS], is_active=True).count(),
+            'scp_notifications_unread': Notification.objects.filter(is_read=False).count(),
+            'scp_outbox_backlog': pending.count(),
+            'scp_outbox_dead': OutboxEvent.objects.filter(status=OutboxStatus.DEAD).count(),
+            'scp_outbox_oldest_pending_seconds': max((timezone.now() - oldest).total_seconds(), 0) if oldest else 0,
+        }
+    return cache.get_or_set('metrics:domain', compute, settings.METRICS['GAUGE_TTL'])
+
+
+DOMAIN_HELP = {
+    'scp_orders_pending': "Active orders waiting for the supplier.",
+    'scp_complaints_open': "Active complaints open or in progress.",
+    'scp_notifications_unread': "Notifications not read yet.",
+    'scp_outbox_backlog': "Outbox events waiting for the dispatcher.",
+    'scp_outbox_dead': "Outbox events that ran out of attempts.",
+    'scp_outbox_oldest_pending_seconds': "Age of the oldest waiting outbox event.",
+}
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _header(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def _histogram(lines, name, help_text, buckets, rows):
+    _header(lines, name, 'histogram', help_text)
+    for view, method, *counts in sorted(rows):
+        cumulative = 0
+        for bound, count in zip((*buckets, '+Inf'), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(view=view, method=method, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(view=view, method=method)} {counts[-1]}')
+        lines.append(f'{name}_count{_labels(view=view, method=method)} {cumulative}')
+
+
+def render():
+    """
+    Everything in the Prometheus text format.
+    """
+    merged, processes = collect()
+    lines = []
+    _header(lines, 'scp_http_requests_total', 'counter', "Requests handled, by view, method and status.")
+    for view, method, status, n in sorted(merged['requests']):
+        lines.append(f'scp_http_requests_total{_labels(view=view, method=method, status=status)} {n}')
+    _histogram(lines, 'scp_http_request_duration_seconds', "Time to build the response.",
+               LATENCY_BUCKETS, merged['latency'])
+    _histogram(lines, 'scp_http_request_db_queries', "Database queries run per request.",
+               QUERY_BUCKETS, merged['queries'])
+
+    hits, misses = merged['cache']['hits'], merged['cache']['misses']
+    _header(lines, 'scp_cache_hits_total', 'counter', "Link graph cache reads answered from the cache.")
+    lines.append(f'scp_cache_hits_total {hits}')
+    _header(lines, 'scp_cache_misses_total', 'counter', "Link graph cache reads that went to the database.")
+    lines.append(f'scp_cache_misses_total {misses}')
+    _header(lines, 'scp_cache_hit_ratio', 'gauge', "Share of link graph cache reads that hit, since start.")
+    lines.append(f'scp_cache_hit_ratio {hits / (hits + misses) if hits + misses else 0.0}')
+
+    for name, value in domain_gauges().items():
+        _header(lines, name, 'gauge', DOMAIN_HELP[name])
+        lines.append(f'{name} {value}')
+
+    for key, (name, kind, help_text, scale) in POOL_STATS.items():
+        samples = [(p['pid'], p['pool'][key]) for p in processes if key in p.get('pool', {})]
+        if samples:
+            _header(lines, name, kind, help_text + " Per worker process.")
+            lines += [f'{name}{_labels(pid=pid)} {value / scale if scale != 1 else value}' for pid, value in samples]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS['TOKEN']
+    if not token and settings.PRODUCTION:
+        # Not served to anyone who asks: set METRICS_TOKEN to scrape
+        return HttpResponse(status=404)
+    if token:
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        # Bytes: compare_digest() raises on str with non-ASCII characters
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            return HttpResponse(status=401)
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    Counts every request for /metrics: by URL name (the DRF router names,
+    such as `product-list`), method and status, with its latency and query
+    count, and the link graph cache reads it made. Goes first in MIDDLEWARE.
+
+    Under a pre-fork server each worker writes its numbers to
+    METRICS['DIR'] every METRICS['FLUSH_SECONDS'] and the worker answering a
+    scrape adds them all up; gunicorn.conf.py sets the directory and
+    archives the files of workers that exit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS['ENABLED']:
+            raise MiddlewareNotUsed
+        self.directory = settings.METRICS['DIR']
+        install_query_timer()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, seconds, stats):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, seconds, stats)
+        if self.directory:
+            registry.watch(self.directory)
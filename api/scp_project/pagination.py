@@ -0,0 +1,166 @@
+import base64
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db.models import BooleanField, Expression, F, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowCompare(Expression):
+    """
+    SQL row comparison: (a, b) < (x, y).
+    Unlike an OR of per-column comparisons, PostgreSQL turns this into a
+    single range condition on a composite (a, b) index.
+    """
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, fields, op, values):
+        super().__init__()
+        self.lhs = [F(name) for name in fields]
+        self.rhs = [Value(value) for value in values]
+        self.op = op
+
+    def get_source_expressions(self):
+        return self.lhs + self.rhs
+
+    def set_source_expressions(self, exprs):
+        self.lhs, self.rhs = exprs[:len(self.lhs)], exprs[len(self.lhs):]
+
+    def as_sql(self, compiler, connection):
+        lhs = [compiler.compile(expr) for expr in self.lhs]
+        rhs = [compiler.compile(expr) for expr in self.rhs]
+        sql = '(%s) %s (%s)' % (
+            ', '.join(sql for sql, _ in lhs),
+            self.op,
+            ', '.join(sql for sql, _ in rhs),
+        )
+        return sql, tuple(param for _, params in lhs + rhs for param in params)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination for every list endpoint.
+
+    Rows are ordered by the view's `ordering` or `get_ordering()` (default
+    newest first on (created_at, id)). The opaque `cursor` holds the sort key of the last row
+    of the previous page, so each page is an index range scan no matter how
+    deep the client goes. All ordering fields must share one direction and
+    the last one must be unique (use `id`).
+
+    Clients can ask for `?page_size=` up to `max_page_size`.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return tuple(getattr(view, 'ordering', None) or self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, queryset, fields):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            model_fields = [self._get_field(queryset, name) for name in fields]
+            return [field.to_python(value) for field, value in zip(model_fields, values)]
+        except Exception:
+            raise NotFound('Invalid cursor.')
+
+    def _get_field(self, queryset, name):
+        # Annotations (e.g. a search rank) can be sort keys too
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(view)
+        fields = [name.lstrip('-') for name in ordering]
+        descending = ordering[0].startswith('-')
+        self.page_size_value = self.get_page_size(request)
+
+        queryset = queryset.order_by(*ordering)
+        position = self.decode_cursor(queryset, fields)
+        if position is not None:
+            queryset = queryset.filter(RowCompare(fields, '<' if descending else '>', position))
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        self.next_position = None
+        if self.has_next:
+            last = self.page[-1]
+            self.next_position = [self._to_json(getattr(last, name)) for name in fields]
+        return self.page
+
+    def _to_json(self, value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor taken from the `next` link of the previous page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results per page (max {self.max_page_size}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,288 @@
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import random
+import re
+from contextvars import ContextVar
+from pathlib import Path
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+logger = logging.getLogger('scp.requests')
+
+
+class RequestStats:
+    """
+    What one request spent, filled in by the hooks below.
+    """
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        # None: not measured (SerializerTimingMixin only times requests
+        # ProfilingMiddleware times)
+        self.serializer_time = None
+        self.serializing = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# Stats of the current request, in whatever thread works on it:
+# sync_to_async copies the context, so the object is shared, not copied.
+# Set by MetricsMiddleware for every request (scp_project.metrics).
+request_stats = ContextVar('request_stats', default=None)
+
+
+def record_cache_lookup(hit):
+    """
+    Count a cache read for the current request, if stats are collected for it.
+    """
+    stats = request_stats.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def _time_query(execute, sql, params, many, context):
+    stats = request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += perf_counter() - started
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    # First in the list: execute_wrapper() blocks push and pop at the end
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+def install_query_timer():
+    """
+    Time queries on every connection; idempotent.
+    """
+    connection_created.connect(_install_query_timer, dispatch_uid='request_stats')
+    for connection in connections.all(initialized_only=True):
+        _install_query_timer(None, connection)
+
+
+@functools.cache
+def _timed_serializer(serializer_class):
+    """
+    A subclass of `serializer_class` whose to_representation() counts as
+    serializer time, including the queries it runs. Same name, so the
+    schema does not change.
+    """
+    def to_representation(self, instance):
+        stats = request_stats.get()
+        if stats is None or stats.serializer_time is None or stats.serializing:
+            # Nested serializers count as part of the outermost one
+            return super(timed, self).to_representation(instance)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return super(timed, self).to_representation(instance)
+        finally:
+            stats.serializer_time += perf_counter() - started
+            stats.serializing = False
+
+    timed = type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        '__qualname__': serializer_class.__qualname__,
+        'to_representation': to_representation,
+    })
+    return timed
+
+
+class SerializerTimingMixin:
+    # Reports the time the view's serializers take in the Server-Timing
+    # header and log line of requests ProfilingMiddleware times. Other
+    # requests get the view's serializer unchanged. A comment, not a
+    # docstring: drf-spectacular would show it on views without their own.
+
+    def get_serializer(self, *args, **kwargs):
+        stats = request_stats.get()
+        if stats is None or stats.serializer_time is None:
+            return super().get_serializer(*args, **kwargs)
+        kwargs.setdefault('context', self.get_serializer_context())
+        return _timed_serializer(self.get_serializer_class())(*args, **kwargs)
+
+
+def start_profiler():
+    """
+    A cProfile profiler running in this thread, or None if another one is.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def server_timing(wall, stats):
+    return (
+        f'app;dur={wall * 1000:.1f}, '
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'serializer;dur={stats.serializer_time * 1000:.1f}, '
+        f'cache;desc="{stats.cache_hits} hits {stats.cache_misses} misses"'
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Times a request and everything it spends on the database, serializers
+    (views with SerializerTimingMixin) and the cache, for:
+
+    - a share of requests (PROFILING['SAMPLE_RATE']),
+    - any request sent with `X-Profile: <PROFILING['TOKEN']>`,
+    - every request when QUERY_COUNT_HEADER is on (load tests).
+
+    A timed request gets `Server-Timing` and `X-DB-Queries` headers and one
+    JSON line on the `scp.requests` logger. A share of them
+    (PROFILING['PROFILE_RATE']) also runs under cProfile, and the profile is
+    written to PROFILING['DIR'] when the request took longer than
+    PROFILING['SLOW_MS'], or always for X-Profile requests. Read it with
+    `python -m pstats` or snakeviz.
+
+    Under ASGI the code of async views (the chat long-poll) is timed but not
+    profiled. Removes itself when nothing would be timed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.PROFILING
+        self.sample_rate = 1.0 if settings.QUERY_COUNT_HEADER else config['SAMPLE_RATE']
+        self.token = config['TOKEN']
+        if not self.sample_rate and not self.token:
+            raise MiddlewareNotUsed
+        self.profile_rate = config['PROFILE_RATE']
+        self.slow = config['SLOW_MS'] / 1000
+        self.directory = Path(config['DIR'])
+        install_query_timer()
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def requested(self, request):
+        sent = request.headers.get('X-Profile')
+        # Bytes: compare_digest() raises on str with non-ASCII characters
+        return bool(self.token and sent and hmac.compare_digest(sent.encode(), self.token.encode()))
+
+    def stats(self):
+        """
+        (stats, context token): the request's stats if MetricsMiddleware
+        already collects them, else new ones (token to reset).
+        """
+        stats = request_stats.get()
+        if stats is not None:
+            return stats, None
+        stats = RequestStats()
+        return stats, request_stats.set(stats)
+
+    def timed(self, request):
+        """
+        (timed, profiled) for this request.
+        """
+        if self.requested(request):
+            return True, True
+        if random.random() >= self.sample_rate:
+            return False, False
+        return True, random.random() < self.profile_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timed, profiled = self.timed(request)
+        if not timed:
+            return self.get_response(request)
+
+        profiler = start_profiler() if profiled else None
+        stats, token = self.stats()
+        stats.serializer_time = 0.0
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            wall = perf_counter() - started
+            if token is not None:
+                request_stats.reset(token)
+            if profiler is not None:
+                profiler.disable()
+        dump = self.dump(profiler, request, wall)
+        return self.finish(request, response, stats, wall, dump)
+
+    async def __acall__(self, request):
+        timed, profiled = self.timed(request)
+        if not timed:
+            return await self.get_response(request)
+
+        # Sync middleware and views of this request all run in one thread
+        # (thread-sensitive sync_to_async), so profile that thread. Code on
+        # the event loop, such as the chat long-poll, is not profiled.
+        profiler = await sync_to_async(start_profiler)() if profiled else None
+        stats, token = self.stats()
+        stats.serializer_time = 0.0
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            wall = perf_counter() - started
+            if token is not None:
+                request_stats.reset(token)
+            if profiler is not None:
+                await sync_to_async(profiler.disable)()
+        dump = await sync_to_async(self.dump)(profiler, request, wall)
+        return self.finish(request, response, stats, wall, dump)
+
+    def finish(self, request, response, stats, wall, dump):
+        response['Server-Timing'] = server_timing(wall, stats)
+        response['X-DB-Queries'] = str(stats.queries)
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 1),
+            'db_ms': round(stats.db_time * 1000, 1),
+            'queries': stats.queries,
+            'serializer_ms': round(stats.serializer_time * 1000, 1),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'profile': str(dump) if dump else None,
+        }))
+        return response
+
+    def dump(self, profiler, request, wall):
+        """
+        Write the profile of a slow or X-Profile request; returns its path.
+        """
+        if profiler is None or (wall < self.slow and not self.requested(request)):
+            return None
+        slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-') or 'root'
+        path = self.directory / f"{timezone.now():%Y%m%d-%H%M%S-%f}-{request.method}-{slug}-{wall * 1000:.0f}ms.prof"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as exc:
+            logger.warning("Could not write profile %s: %s", path, exc)
+            return None
+        return path
@@ -19,11 +19,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
+# DJANGO_ENV=production switches on the production profile: no debug,
+# pooled database connections. Everything else defaults to development.
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-ei*sdl*s7$wf+n7uewye@br2w3v0s=jh^%l)d2hjof51h^_n)y'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-ei*sdl*s7$wf+n7uewye@br2w3v0s=jh^%l)d2hjof51h^_n)y'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '0' if PRODUCTION else '1') == '1'
 
 ALLOWED_HOSTS = ['*']
 
@@ -31,12 +39,19 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # Makes runserver serve the ASGI app (HTTP + WebSocket)
     'products.apps.ProductsConfig',
     'users.apps.UsersConfig',
     'companies.apps.CompaniesConfig',
     'orders.apps.OrdersConfig',
     'support.apps.SupportConfig',
     'notifications.apps.NotificationsConfig',
+    'outbox.apps.OutboxConfig',
+    'exports.apps.ExportsConfig',
+    'idempotency.apps.IdempotencyConfig',
+    'stock.apps.StockConfig',
+    'realtime.apps.RealtimeConfig',
+    'channels',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -47,9 +62,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
+    'scp_project.metrics.MetricsMiddleware',
+    'scp_project.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -60,6 +78,30 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request timing (scp_project.profiling): a Server-Timing header, a JSON line
+# on the scp.requests logger and, for slow requests, a cProfile dump
+PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),  # share of requests timed
+    'TOKEN': os.environ.get('PROFILING_TOKEN', ''),  # `X-Profile: <token>` times and profiles one request
+    'PROFILE_RATE': float(os.environ.get('PROFILING_PROFILE_RATE', '0.1')),  # share of timed requests profiled
+    'SLOW_MS': int(os.environ.get('PROFILING_SLOW_MS', '500')),  # keep profiles of requests slower than this
+    'DIR': os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'),
+}
+# Time every request, with its query count in an X-DB-Queries header (load tests)
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', '0') == '1'
+
+# Prometheus metrics at /metrics (scp_project.metrics). Under gunicorn every
+# worker writes its counts to METRICS_DIR (set in gunicorn.conf.py) and the
+# worker answering a scrape adds them up; without it, this process only.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', '1') == '1',
+    'DIR': os.environ.get('METRICS_DIR', ''),
+    'FLUSH_SECONDS': 5,  # how stale other workers' counts may be
+    'GAUGE_TTL': 30,  # seconds the domain gauges (COUNT queries) are cached
+    # Scrapes must send it as a bearer token. Production serves no /metrics without one.
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
 ROOT_URLCONF = 'scp_project.urls'
 
 TEMPLATES = [
@@ -78,6 +120,35 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'scp_project.wsgi.application'
+ASGI_APPLICATION = 'scp_project.asgi.application'
+
+# WebSocket push. The in-memory layer only reaches clients of this process;
+# set REDIS_URL to share groups between workers and nodes.
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# Shared cache. The local-memory fallback is per process, so invalidations
+# only reach other workers once REDIS_URL is set.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
 
 
 # Database
@@ -90,10 +161,33 @@ DATABASES = {
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
-        'PORT': '5432',
+        'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
 
+# Connection pooling (psycopg 3 pool). Each server worker process keeps up to
+# DB_POOL_MAX_SIZE connections open instead of connecting on every request;
+# with health checks on, a connection is checked before it is handed out, so
+# one dropped by PostgreSQL or a restart is replaced rather than failing the
+# request.
+# Size the pool so workers * max_size stays under max_connections.
+if os.environ.get('DB_POOL', '1' if PRODUCTION else '0') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_idle': 300,
+        },
+    }
+else:
+    # Without a pool, one connection per request: under ASGI (runserver with
+    # daphne, uvicorn) every sync view runs in a new thread, and persistent
+    # connections would pile up one per thread until they expire
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+# Verify pooled / persistent connections before reuse
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -132,6 +226,12 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Product images are served by Django itself unless a web server in front
+# takes over /media/
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', '1') == '1'
+# Export files (exports app). Never under MEDIA_ROOT: only the download view,
+# which checks who asks, may read them.
+EXPORTS_ROOT = Path(os.environ.get('EXPORTS_ROOT', BASE_DIR / 'export_files'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -148,6 +248,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'scp_project.pagination.KeysetPagination',
 }
 
 from datetime import timedelta
@@ -155,4 +256,62 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'scp.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Wake-ups for long-polling chat clients.
+# InProcessBroker only reaches waiters in the same process; use
+# support.pubsub.PostgresBroker (LISTEN/NOTIFY) when running several workers.
+PUBSUB = {
+    'BACKEND': os.environ.get('PUBSUB_BACKEND', 'support.pubsub.InProcessBroker'),
+}
+CHAT_LONG_POLL_MAX_TIMEOUT = 25  # seconds
+
+# Transactional outbox, drained by `python manage.py run_dispatcher`
+OUTBOX = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 8,
+    'BACKOFF_SECONDS': 5,
+    'MAX_BACKOFF_SECONDS': 3600,
+    'RETENTION_DAYS': 7,
+}
+
+# How long a POST's Idempotency-Key replays the stored response
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Export jobs (exports app), run by `manage.py run_exports`
+EXPORTS = {
+    'CHUNK_SIZE': 5000,  # rows per database fetch and file write
+    'PROGRESS_INTERVAL_SECONDS': 2,
+    'STALE_SECONDS': 300,  # a RUNNING job without progress for this long is retried
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_SECONDS': 30,  # before the first retry, doubled after every failure
+    'MAX_BACKOFF_SECONDS': 3600,
+    'RETENTION_DAYS': 7,
+}
+
+# Sharded stock counters for hot products (stock app)
+STOCK = {
+    'DEFAULT_SHARDS': 8,
+    'FOLD_BATCH_SIZE': 10000,  # ledger entries folded into stock_level per statement
+    'RETENTION_DAYS': 30,  # folded entries of finished orders are kept this long
+}
+
+# Accepted supplier/consumer IDs per company (companies.services), dropped
+# whenever a Link changes; the timeout only bounds staleness after a missed
+# invalidation.
+LINK_GRAPH_CACHE_TIMEOUT = 300  # seconds
+
+# Delta sync windows (products.sync) reach this far behind the last sync, to
+# catch rows written before it but committed after it.
+SYNC_OVERLAP_SECONDS = 30
@@ -0,0 +1,66 @@
+import csv
+import io
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+# Bytes of CSV collected before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+
+def csv_chunks(header, rows):
+    """
+    Encode rows as CSV and yield them in chunks of about CHUNK_SIZE bytes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _async_chunks(chunks):
+    # Pull one chunk at a time on the thread the view ran on, which owns the
+    # database cursor
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (chunk := await next_chunk(chunks, done)) is not done:
+        yield chunk
+
+
+def streaming_csv_response(request, filename, header, rows, gzip=False):
+    """
+    Stream `rows` as a CSV download without building it in memory.
+
+    `rows` should be a lazy iterable, e.g. `queryset.values_list().iterator()`,
+    so the database is read in chunks while the file is sent. ASGI servers
+    get an async iterator; Django would buffer a sync one into a list.
+    """
+    chunks = csv_chunks(header, rows)
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+    django_request = getattr(request, '_request', request)
+    if isinstance(django_request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type='application/gzip' if gzip else 'text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
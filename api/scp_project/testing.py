@@ -0,0 +1,138 @@
+import traceback
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def _rows(data):
+    return data['results'] if isinstance(data, dict) and 'results' in data else data
+
+
+def _app_stack():
+    """
+    The frames of our own code that led to a query, innermost last.
+    """
+    root = str(Path(settings.BASE_DIR))
+    return [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename
+        and frame.filename not in (__file__, str(Path(root) / 'manage.py'))
+    ]
+
+
+class QueryLog:
+    """
+    Records every statement run on the default connection while active,
+    with the stack of application code that ran it:
+
+        with QueryLog() as log:
+            self.client.get(url)
+        print(log.report())
+
+    Statements are kept as sent, placeholders and all, so the same query
+    run for every row shows up as one repeated statement.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append((sql, _app_stack()))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def duplicates(self):
+        """
+        [(sql, times run, stack of its first run)] for statements run more than once.
+        """
+        counts = Counter(sql for sql, _ in self.statements)
+        first = {}
+        for sql, stack in self.statements:
+            first.setdefault(sql, stack)
+        return [(sql, count, first[sql]) for sql, count in counts.most_common() if count > 1]
+
+    def report(self):
+        lines = [f"{len(self)} queries:"]
+        lines += [f"  {sql}" for sql, _ in self.statements]
+        for sql, count, stack in self.duplicates():
+            lines.append(f"\nRun {count} times: {sql}")
+            lines += [f"  {line.rstrip()}" for line in traceback.format_list(stack)]
+        return "\n".join(lines)
+
+
+class QueryCountMixin:
+    """
+    Assertions for APITestCase: a request must stay within its query
+    budget, and a list must cost the same number of queries for one row
+    as for many. Failures list the statements run, and where each
+    repeated one came from.
+    """
+
+    def get_with_queries(self, url, user):
+        self.client.force_authenticate(user=user)
+        with QueryLog() as log:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, log
+
+    def request_with_queries(self, method, url, user=None, data=None):
+        """
+        Send a request the way a client would, with a bearer token so the
+        user lookup is counted too, and return (response, QueryLog).
+        Streamed bodies are read inside the log.
+        """
+        self.client.force_authenticate(user=None)
+        if user is not None:
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        else:
+            self.client.credentials()
+        send = getattr(self.client, method.lower())
+        with QueryLog() as log:
+            if method == 'GET':
+                response = send(url, data)
+            else:
+                response = send(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.client.credentials()
+        return response, log
+
+    def assertQueryBudget(self, method, url, budget, user=None, data=None):
+        """
+        `method` `url` as `user` succeeds in at most `budget` queries.
+        """
+        response, log = self.request_with_queries(method, url, user, data)
+        self.assertLess(response.status_code, 400, f"{method} {url}: {getattr(response, 'data', '')}")
+        if len(log) > budget:
+            self.fail(f"{method} {url}: {len(log)} queries, budget {budget}\n{log.report()}")
+        return response, log
+
+    def assertQueriesDoNotGrow(self, url, user, add_rows):
+        """
+        GET `url` as `user`, call `add_rows()`, GET again: more rows, same queries.
+        """
+        self.get_with_queries(url, user)  # warm the link graph cache
+        before, before_log = self.get_with_queries(url, user)
+        add_rows()
+        after, after_log = self.get_with_queries(url, user)
+
+        self.assertGreater(len(_rows(after.data)), len(_rows(before.data)), "add_rows() added no visible rows")
+        self.assertEqual(
+            len(before_log), len(after_log),
+            f"{url}: {len(before_log)} queries for {len(_rows(before.data))} rows, "
+            f"{len(after_log)} for {len(_rows(after.data))}\n{after_log.report()}"
+        )
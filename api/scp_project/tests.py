@@ -0,0 +1,530 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from exports.models import ExportJob, ExportKind, ExportStatus
+from notifications.models import Notification
+from orders.models import Order, OrderItem
+from outbox.models import OutboxEvent
+from products.models import Product
+from support.models import Complaint, ChatThread, ChatMessage
+from users.models import UserRole
+from .metrics import Registry, archive
+from .profiling import RequestStats, _timed_serializer
+from .testing import QueryCountMixin, QueryLog
+
+User = get_user_model()
+
+# Most queries a request may run, per (URL name, method), with the
+# fixture below and a cold cache. Every /api/ endpoint must have one.
+# Raise a budget only with a reason; the failure lists what ran.
+BUDGETS = {
+    ('register', 'POST'): 8,
+    ('token_obtain_pair', 'POST'): 1,
+    ('token_refresh', 'POST'): 1,
+    ('me', 'GET'): 2,
+    ('delete-account', 'DELETE'): 5,
+    ('staff-list', 'GET'): 3,
+    ('staff-list', 'POST'): 4,
+    ('staff-detail', 'GET'): 3,
+    ('staff-detail', 'PUT'): 5,
+    ('staff-detail', 'PATCH'): 4,
+    ('staff-detail', 'DELETE'): 4,
+    ('link-list', 'GET'): 3,
+    ('link-list', 'POST'): 5,
+    ('link-detail', 'GET'): 3,
+    ('link-detail', 'PUT'): 4,
+    ('link-detail', 'PATCH'): 4,
+    ('link-detail', 'DELETE'): 4,
+    ('supplier-list', 'GET'): 2,
+    ('product-list', 'GET'): 5,
+    ('product-list', 'POST'): 4,
+    ('product-changes', 'GET'): 6,
+    ('product-facets', 'GET'): 4,
+    ('product-detail', 'GET'): 5,
+    ('product-detail', 'PUT'): 5,
+    ('product-detail', 'PATCH'): 5,
+    ('product-detail', 'DELETE'): 5,
+    ('order-list', 'GET'): 7,
+    ('order-list', 'POST'): 16,
+    ('order-detail', 'GET'): 7,
+    ('order-detail', 'PUT'): 9,
+    ('order-detail', 'PATCH'): 9,
+    ('order-detail', 'DELETE'): 10,
+    ('complaint-list', 'GET'): 3,
+    ('complaint-list', 'POST'): 7,
+    ('complaint-export-csv', 'GET'): 3,
+    ('complaint-detail', 'GET'): 3,
+    ('complaint-detail', 'PUT'): 7,
+    ('complaint-detail', 'PATCH'): 7,
+    ('complaint-detail', 'DELETE'): 7,
+    ('complaint-assign', 'POST'): 7,
+    ('complaint-escalate', 'POST'): 7,
+    ('chat-thread-list', 'GET'): 4,
+    ('chat-thread-list', 'POST'): 5,
+    ('chat-thread-detail', 'GET'): 4,
+    ('chat-thread-detail', 'PUT'): 5,
+    ('chat-thread-detail', 'PATCH'): 5,
+    ('chat-thread-detail', 'DELETE'): 5,
+    ('chat-thread-escalate', 'POST'): 5,
+    ('chat-messages', 'GET'): 3,
+    ('chat-messages', 'POST'): 9,
+    ('chat-messages-poll', 'GET'): 5,
+    ('chat-messages-mark-read', 'POST'): 8,
+    ('notification-list', 'GET'): 2,
+    ('notification-mark-all-read', 'POST'): 2,
+    ('notification-detail', 'GET'): 2,
+    ('notification-mark-read', 'POST'): 3,
+    ('export-job-list', 'GET'): 2,
+    ('export-job-list', 'POST'): 3,
+    ('export-job-detail', 'GET'): 2,
+    ('export-job-download', 'GET'): 2,
+}
+
+# GETs whose rows grow with the data
+LISTS = (
+    'staff-list', 'link-list', 'supplier-list', 'product-list', 'product-changes', 'order-list',
+    'complaint-list', 'complaint-export-csv', 'chat-thread-list', 'chat-messages', 'chat-messages-poll',
+    'notification-list', 'export-job-list',
+)
+
+# Schema and API browser pages, not part of the API
+UNBUDGETED = {'api-root', 'schema', 'swagger-ui'}
+
+
+def _routes(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield route, pattern.name, pattern.callback
+
+
+def routed_endpoints():
+    """
+    {(URL name, METHOD)} for everything served under /api/.
+    """
+    endpoints = set()
+    for route, name, callback in _routes(get_resolver().url_patterns):
+        if not route.startswith('api/') or name in UNBUDGETED:
+            continue
+        if getattr(callback, 'actions', None):  # a ViewSet
+            methods = callback.actions
+        elif hasattr(callback, 'cls'):  # an APIView
+            methods = [m for m in callback.cls.http_method_names if hasattr(callback.cls, m)]
+        else:  # plain function views here answer GET only
+            methods = ['get']
+        # HEAD and OPTIONS come with every view and cost no more than GET
+        endpoints.update((name, method.upper()) for method in methods if method not in ('head', 'options'))
+    return endpoints
+
+
+class QueryBudgetTests(QueryCountMixin, APITestCase):
+    """
+    Every endpoint, called once as a client would, within its budget;
+    and no list endpoint costing more queries as the data grows.
+    """
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.supplier = Supplier.objects.create(company_name="Budget Farm", address="1 A St")
+        self.owner = User.objects.create_user("owner@budget.com", "pass", role=UserRole.OWNER, supplier=self.supplier)
+        self.manager = User.objects.create_user("manager@budget.com", "pass", role=UserRole.MANAGER,
+                                                supplier=self.supplier)
+        self.sales = User.objects.create_user("sales@budget.com", "pass", role=UserRole.SALES_REP,
+                                              supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Budget Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@budget.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        self.link = Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        # Linked but no chat yet, and not linked at all
+        self.partner = Supplier.objects.create(company_name="Partner Farm", address="3 C St")
+        Link.objects.create(supplier=self.partner, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.stranger = Supplier.objects.create(company_name="Stranger Farm", address="4 D St")
+
+        self.since = timezone.now() - timedelta(minutes=1)
+        self.add_rows(self.consumer, self.buyer)
+        self.product = Product.objects.filter(supplier=self.supplier).first()
+        self.order = Order.objects.filter(consumer=self.consumer).first()
+        self.complaint = Complaint.objects.first()
+        self.thread = ChatThread.objects.get()
+        self.notification = Notification.objects.filter(recipient=self.buyer).first()
+        self.export = ExportJob.objects.filter(requested_by=self.owner).first()
+
+    def add_rows(self, consumer, buyer):
+        """
+        Two more of everything each list endpoint shows, for `consumer`.
+        """
+        products = [
+            Product.objects.create(supplier=self.supplier, name=f"Budget {name}", price=2, stock_level=100, unit="kg")
+            for name in ("Apple", "Pear")
+        ]
+        thread, _ = ChatThread.objects.get_or_create(consumer=consumer, supplier=self.supplier)
+        for n in range(2):
+            order = Order.objects.create(consumer=consumer, supplier=self.supplier, total_amount=4)
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price_at_time_of_order=2)
+            Complaint.objects.create(order=order, created_by=buyer, subject=f"Late {n}", description="Late")
+            ChatMessage.objects.create(thread=thread, sender=buyer, text=f"Hello {n}")
+            ChatMessage.objects.create(thread=thread, sender=self.sales, text=f"Hi {n}")
+            Notification.objects.create(recipient=buyer, title="Order placed",
+                                        message=f"Order {order.id} placed")
+            job = ExportJob.objects.create(requested_by=self.owner, kind=ExportKind.ORDERS, status=ExportStatus.DONE)
+            job.file.save(f"orders-{job.id}.csv", ContentFile(b"id\n1\n"))
+            User.objects.create_user(f"rep{User.objects.count()}@budget.com", "pass", role=UserRole.SALES_REP,
+                                     supplier=self.supplier)
+
+    def requests(self):
+        """
+        {(URL name, METHOD): (user, URL args, data)}: one successful call per endpoint.
+        """
+        product = {"name": "Budget Plum", "description": "", "price": "3.00", "unit": "kg", "stock_level": 10}
+        thread = [self.thread.id]
+        return {
+            ('register', 'POST'): (None, [], {"email": "new@budget.com", "password": "pass", "role": "CONSUMER",
+                                              "company_name": "New Buyer", "company_address": "5 E St"}),
+            ('token_obtain_pair', 'POST'): (None, [], {"email": self.buyer.email, "password": "pass"}),
+            ('token_refresh', 'POST'): (None, [], {"refresh": str(RefreshToken.for_user(self.buyer))}),
+            ('me', 'GET'): (self.buyer, [], None),
+            ('delete-account', 'DELETE'): (self.buyer, [], None),
+            ('staff-list', 'GET'): (self.owner, [], None),
+            ('staff-list', 'POST'): (self.owner, [], {"email": "rep@budget.com", "password": "pass",
+                                                      "role": UserRole.SALES_REP}),
+            ('staff-detail', 'GET'): (self.owner, [self.sales.id], None),
+            ('staff-detail', 'PUT'): (self.owner, [self.sales.id], {"email": self.sales.email, "password": "pass",
+                                                                    "role": UserRole.SALES_REP}),
+            ('staff-detail', 'PATCH'): (self.owner, [self.sales.id], {"first_name": "Sam"}),
+            ('staff-detail', 'DELETE'): (self.owner, [self.sales.id], None),
+            ('link-list', 'GET'): (self.buyer, [], None),
+            ('link-list', 'POST'): (self.buyer, [], {"supplier": self.stranger.id}),
+            ('link-detail', 'GET'): (self.owner, [self.link.id], None),
+            ('link-detail', 'PUT'): (self.owner, [self.link.id], {"status": LinkStatus.BLOCKED}),
+            ('link-detail', 'PATCH'): (self.owner, [self.link.id], {"status": LinkStatus.BLOCKED}),
+            ('link-detail', 'DELETE'): (self.owner, [self.link.id], None),
+            ('supplier-list', 'GET'): (self.buyer, [], None),
+            ('product-list', 'GET'): (self.buyer, [], None),
+            ('product-list', 'POST'): (self.owner, [], product),
+            ('product-changes', 'GET'): (self.buyer, [], None),
+            ('product-facets', 'GET'): (self.buyer, [], None),
+            ('product-detail', 'GET'): (self.buyer, [self.product.id], None),
+            ('product-detail', 'PUT'): (self.owner, [self.product.id], product),
+            ('product-detail', 'PATCH'): (self.owner, [self.product.id], {"price": "3.00"}),
+            ('product-detail', 'DELETE'): (self.owner, [self.product.id], None),
+            ('order-list', 'GET'): (self.buyer, [], None),
+            ('order-list', 'POST'): (self.buyer, [], {"supplier": self.supplier.id, "items": [
+                {"product_id": product.id, "quantity": 1} for product in Product.objects.filter(supplier=self.supplier)
+            ]}),
+            ('order-detail', 'GET'): (self.buyer, [self.order.id], None),
+            ('order-detail', 'PUT'): (self.owner, [self.order.id], {"status": "CONFIRMED"}),
+            ('order-detail', 'PATCH'): (self.owner, [self.order.id], {"status": "CONFIRMED"}),
+            ('order-detail', 'DELETE'): (self.owner, [self.order.id], None),
+            ('complaint-list', 'GET'): (self.owner, [], None),
+            ('complaint-list', 'POST'): (self.buyer, [], {"order": self.order.id, "subject": "Bruised",
+                                                          "description": "Half the box"}),
+            ('complaint-export-csv', 'GET'): (self.owner, [], None),
+            ('complaint-detail', 'GET'): (self.owner, [self.complaint.id], None),
+            ('complaint-detail', 'PUT'): (self.owner, [self.complaint.id], {"status": "RESOLVED",
+                                                                            "escalation_level": "MANAGER"}),
+            ('complaint-detail', 'PATCH'): (self.owner, [self.complaint.id], {"status": "RESOLVED"}),
+            ('complaint-detail', 'DELETE'): (self.owner, [self.complaint.id], None),
+            ('complaint-assign', 'POST'): (self.sales, [self.complaint.id], None),
+            ('complaint-escalate', 'POST'): (self.owner, [self.complaint.id], None),
+            ('chat-thread-list', 'GET'): (self.buyer, [], None),
+            ('chat-thread-list', 'POST'): (self.buyer, [], {"supplier": self.partner.id}),
+            ('chat-thread-detail', 'GET'): (self.buyer, thread, None),
+            ('chat-thread-detail', 'PUT'): (self.buyer, thread, {}),
+            ('chat-thread-detail', 'PATCH'): (self.buyer, thread, {}),
+            ('chat-thread-detail', 'DELETE'): (self.buyer, thread, None),
+            ('chat-thread-escalate', 'POST'): (self.owner, thread, None),
+            ('chat-messages', 'GET'): (self.buyer, thread, None),
+            ('chat-messages', 'POST'): (self.buyer, thread, {"text": "Any news?"}),
+            ('chat-messages-poll', 'GET'): (self.buyer, thread, {"since": self.since.isoformat(), "timeout": 0}),
+            ('chat-messages-mark-read', 'POST'): (self.buyer, thread, None),
+            ('notification-list', 'GET'): (self.buyer, [], None),
+            ('notification-mark-all-read', 'POST'): (self.buyer, [], None),
+            ('notification-detail', 'GET'): (self.buyer, [self.notification.id], None),
+            ('notification-mark-read', 'POST'): (self.buyer, [self.notification.id], None),
+            ('export-job-list', 'GET'): (self.owner, [], None),
+            ('export-job-list', 'POST'): (self.owner, [], {"kind": ExportKind.PRODUCTS}),
+            ('export-job-detail', 'GET'): (self.owner, [self.export.id], None),
+            ('export-job-download', 'GET'): (self.owner, [self.export.id], None),
+        }
+
+    @contextmanager
+    def fresh(self):
+        # Each call starts from the same data and a cold cache, so its
+        # count does not depend on what ran before it
+        cache.clear()
+        savepoint = transaction.savepoint()
+        try:
+            yield
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(routed_endpoints() - set(BUDGETS), set(), "Add these to BUDGETS")
+        self.assertEqual(set(BUDGETS) - routed_endpoints(), set(), "No longer routed, drop from BUDGETS")
+        self.assertEqual(set(self.requests()), set(BUDGETS))
+
+    def test_endpoints_stay_within_budget(self):
+        for (name, method), (user, args, data) in self.requests().items():
+            with self.subTest(endpoint=name, method=method), self.fresh():
+                self.assertQueryBudget(method, reverse(name, args=args), BUDGETS[name, method], user, data)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        requests = self.requests()
+
+        def count(name):
+            user, args, data = requests[name, 'GET']
+            with self.fresh():
+                return len(self.request_with_queries('GET', reverse(name, args=args), user, data)[1])
+
+        before = {name: count(name) for name in LISTS}
+        self.add_rows(self.consumer, self.buyer)
+        for name in LISTS:
+            with self.subTest(endpoint=name):
+                self.assertEqual(count(name), before[name], f"{name} costs more queries with more rows")
+
+
+class MediaTests(APITestCase):
+    def test_served_with_debug_off(self):
+        self.assertFalse(settings.DEBUG)
+        path = Path(settings.MEDIA_ROOT) / 'media-test.txt'
+        path.write_text("picture")
+        self.addCleanup(path.unlink)
+
+        response = self.client.get(f"{settings.MEDIA_URL}media-test.txt")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b"picture")
+
+    def test_exports_are_not_media(self):
+        """Test that export files cannot be fetched past the download view"""
+        self.assertFalse(Path(settings.EXPORTS_ROOT).resolve().is_relative_to(Path(settings.MEDIA_ROOT).resolve()))
+
+
+class ProfilingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Header Farm", address="1 A St")
+        self.consumer = Consumer.objects.create(company_name="Header Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@header.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        Product.objects.create(supplier=self.supplier, name="Beans", unit="kg", price=2, stock_level=5)
+        self.thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.buyer)}"}
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        cache.clear()
+
+    def profiling(self, **overrides):
+        config = {'SAMPLE_RATE': 0, 'TOKEN': 'sesame', 'PROFILE_RATE': 0, 'SLOW_MS': 60_000, 'DIR': self.dir}
+        return override_settings(PROFILING={**config, **overrides})
+
+    def dumps(self):
+        return os.listdir(self.dir)
+
+    def test_off_by_default(self):
+        response = self.client.get(reverse('notification-list'), headers=self.headers)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-DB-Queries', response)
+
+    def test_times_and_profiles_requests_sent_with_the_token(self):
+        url = reverse('product-list')
+        with self.profiling():
+            response = self.client.get(url, headers={**self.headers, 'X-Profile': 'wrong'})
+            self.assertNotIn('Server-Timing', response)
+            response = self.client.get(url, headers={**self.headers, 'X-Profile': 'sésame'})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Server-Timing', response)
+
+            cache.clear()
+            with self.assertLogs('scp.requests') as logs, QueryLog() as log:
+                response = self.client.get(url, headers={**self.headers, 'X-Profile': 'sesame'})
+            self.assertEqual(response['X-DB-Queries'], str(len(log)))
+            timing = response['Server-Timing']
+            for metric in ('app;dur=', 'db;dur=', f'desc="{len(log)} queries"', 'serializer;dur=',
+                           'cache;desc="1 hits 1 misses"'):  # cold cache, then warm
+                self.assertIn(metric, timing)
+
+            line = json.loads(logs.records[0].getMessage())
+            self.assertEqual(line['view'], 'product-list')
+            self.assertEqual(line['status'], 200)
+            self.assertEqual(line['queries'], len(log))
+            self.assertEqual((line['cache_hits'], line['cache_misses']), (1, 1))
+            self.assertGreater(line['serializer_ms'], 0)
+            self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')  # not patched
+            self.assertEqual(self.dumps(), [os.path.basename(line['profile'])])
+            pstats.Stats(line['profile'])  # readable
+
+            with self.assertLogs('scp.requests') as logs:
+                self.client.get(url, headers={**self.headers, 'X-Profile': 'sesame'})
+            line = json.loads(logs.records[0].getMessage())
+            self.assertEqual((line['cache_hits'], line['cache_misses']), (2, 0))
+
+    async def test_profiles_sync_views_under_asgi(self):
+        with self.profiling(), self.assertLogs('scp.requests') as logs:
+            response = await self.async_client.get(reverse('notification-list'),
+                                                   headers={**self.headers, 'X-Profile': 'sesame'})
+        self.assertIn('Server-Timing', response)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertGreater(line['queries'], 0)
+        profiled = pstats.Stats(line['profile']).stats
+        self.assertTrue(any(filename.endswith(os.path.join('notifications', 'views.py'))
+                            for filename, _, _ in profiled))
+
+    def test_keeps_profiles_of_slow_sampled_requests_only(self):
+        url = reverse('notification-list')
+        with self.profiling(SAMPLE_RATE=1, PROFILE_RATE=1, SLOW_MS=60_000), self.assertLogs('scp.requests'):
+            response = self.client.get(url, headers=self.headers)
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(self.dumps(), [])
+
+        self.client = self.client_class()  # middleware reads its settings once
+        with self.profiling(SAMPLE_RATE=1, PROFILE_RATE=1, SLOW_MS=0), self.assertLogs('scp.requests'):
+            self.client.get(url, headers=self.headers)
+        self.assertEqual(len(self.dumps()), 1)
+
+    @override_settings(QUERY_COUNT_HEADER=True)
+    def test_reports_queries_of_sync_and_async_views(self):
+        with self.assertLogs('scp.requests'):
+            with QueryLog() as log:
+                response = self.client.get(reverse('notification-list'), headers=self.headers)
+            self.assertEqual(response['X-DB-Queries'], str(len(log)))
+
+            # The long-poll view queries from worker threads
+            response = self.client.get(reverse('chat-messages-poll', args=[self.thread.id]), {'timeout': 0},
+                                       headers=self.headers)
+        self.assertGreaterEqual(int(response['X-DB-Queries']), 2)
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Metric Farm", address="1 A St")
+        self.consumer = Consumer.objects.create(company_name="Metric Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@metrics.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        Product.objects.create(supplier=self.supplier, name="Beans", unit="kg", price=2, stock_level=5)
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.buyer)}"}
+        cache.clear()
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def delta(self, before, after, name):
+        return after.get(name, 0) - before.get(name, 0)
+
+    def test_counts_requests_by_url_name(self):
+        before = self.scrape()
+        _timed_serializer.cache_clear()
+        with QueryLog() as log:
+            for _ in range(2):
+                self.client.get(reverse('product-list'), headers=self.headers)
+        self.client.get('/api/nowhere/')
+        after = self.scrape()
+
+        labels = 'view="product-list",method="GET"'
+        self.assertEqual(self.delta(before, after, f'scp_http_requests_total{{{labels},status="200"}}'), 2)
+        self.assertEqual(self.delta(before, after, f'scp_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'), 2)
+        self.assertEqual(self.delta(before, after, f'scp_http_request_db_queries_sum{{{labels}}}'), len(log))
+        self.assertEqual(self.delta(before, after, 'scp_http_requests_total{view="unmatched",method="GET",status="404"}'), 1)
+        # Cold cache: one miss, then hits
+        self.assertEqual(self.delta(before, after, 'scp_cache_misses_total'), 1)
+        self.assertEqual(self.delta(before, after, 'scp_cache_hits_total'), 3)
+        # Metrics alone do not time serializers
+        self.assertEqual(_timed_serializer.cache_info().currsize, 0)
+
+    def test_domain_gauges(self):
+        before = self.scrape()
+        order = Order.objects.create(consumer=self.consumer, supplier=self.supplier)
+        Complaint.objects.create(order=order, created_by=self.buyer, subject="Late", description="Late again")
+        Notification.objects.create(recipient=self.buyer, title="Hi", message="Hello")
+        OutboxEvent.objects.create(topic='test', handler='test.handler',
+                                   available_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.delta(before, self.scrape(), 'scp_orders_pending'), 0)  # cached
+        cache.clear()
+        after = self.scrape()
+
+        for name in ('scp_orders_pending', 'scp_complaints_open', 'scp_notifications_unread'):
+            self.assertEqual(self.delta(before, after, name), 1, name)
+        # Creating the rows above queues events of its own
+        self.assertEqual(after['scp_outbox_backlog'], OutboxEvent.objects.filter(status='PENDING').count())
+        self.assertGreaterEqual(after['scp_outbox_oldest_pending_seconds'], 300)
+
+    def test_adds_up_worker_processes(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        worker = Registry()
+        stats = RequestStats()
+        stats.queries, stats.cache_hits = 3, 2
+        for _ in range(5):
+            worker.observe('order-list', 'GET', 200, 0.02, stats)
+        snapshot = {**worker.snapshot(), 'pid': 4242, 'pool': {'pool_size': 4, 'requests_wait_ms': 1500}}
+        (directory / '4242-1.json').write_text(json.dumps(snapshot))
+
+        before = self.scrape()
+        with override_settings(METRICS={**settings.METRICS, 'DIR': str(directory)}):
+            live = self.scrape()
+            archive(directory, 4242)
+            archived = self.scrape()
+
+        labels = 'view="order-list",method="GET"'
+        sample = f'scp_http_requests_total{{{labels},status="200"}}'
+        self.assertEqual(self.delta(before, live, sample), 5)
+        self.assertEqual(self.delta(before, live, f'scp_http_request_db_queries_bucket{{{labels},le="5"}}'), 5)
+        self.assertEqual(self.delta(before, live, f'scp_http_request_db_queries_bucket{{{labels},le="2"}}'), 0)
+        self.assertAlmostEqual(self.delta(before, live, f'scp_http_request_duration_seconds_sum{{{labels}}}'), 0.1)
+        self.assertEqual(live['scp_db_pool_connections{pid="4242"}'], 4)
+        self.assertEqual(live['scp_db_pool_wait_seconds_total{pid="4242"}'], 1.5)
+
+        # The dead worker's counts stay, its pool goes
+        self.assertFalse((directory / '4242-1.json').exists())
+        self.assertEqual(self.delta(before, archived, sample), 5)
+        self.assertEqual(self.delta(before, archived, 'scp_cache_hits_total'), 10)
+        self.assertNotIn('scp_db_pool_connections{pid="4242"}', archived)
+
+    @override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scrape-me'})
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrapé'}).status_code, 401)
+        self.scrape(Authorization='Bearer scrape-me')
+
+    @override_settings(PRODUCTION=True)
+    def test_production_needs_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scrape-me'}):
+            self.scrape(Authorization='Bearer scrape-me')
@@ -14,12 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
+from django.views.static import serve
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
@@ -30,8 +34,14 @@ urlpatterns = [
     path('api/orders/', include('orders.urls')),
     path('api/support/', include('support.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('api/exports/', include('exports.urls')),
+    path('metrics', metrics_view, name='metrics'),
 
 ]   
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+if settings.DEBUG or settings.SERVE_MEDIA:
+    # Not static(), which adds nothing when DEBUG is off
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.*)$', serve,
+                {'document_root': settings.MEDIA_ROOT}),
+    ]
\ No newline at end of file
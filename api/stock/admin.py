@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import StockReservation, StockShard
+
+
+@admin.register(StockShard)
+class StockShardAdmin(admin.ModelAdmin):
+    list_display = ('product', 'shard', 'available')
+    # Changing counters by hand breaks the ledger invariant; use shard_stock
+    readonly_fields = ('product', 'shard', 'available')
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'order', 'shard', 'quantity', 'folded', 'created_at')
+    list_filter = ('folded',)
+    readonly_fields = ('product', 'order', 'shard', 'quantity', 'folded', 'created_at')
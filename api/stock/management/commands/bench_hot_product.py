@@ -0,0 +1,74 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from companies.models import Consumer, Supplier
+from orders.services import place_order
+from products.models import Product
+from stock.services import fold_reservations, shard_stock
+
+
+class Command(BaseCommand):
+    help = "Orders per second for one hot product, with and without sharded stock (data is deleted afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+        parser.add_argument('--shards', type=int, nargs='+', default=[0, 16])
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--hold-ms', type=float, default=0,
+                            help="Keep each order's transaction open this much longer, like a slow "
+                                 "commit (synchronous replica) or a busy server would")
+
+    def handle(self, *args, **options):
+        supplier = Supplier.objects.create(company_name="Hot Bench Supplier", address="-")
+        # One buyer per worker, as in real traffic
+        consumers = Consumer.objects.bulk_create([
+            Consumer(company_name=f"Hot Bench Consumer {i}", address="-") for i in range(max(options['workers']))
+        ])
+        product = Product.objects.create(supplier=supplier, name="Hot Bench", price=10, unit="pcs",
+                                         stock_level=10 ** 9)
+        try:
+            self.stdout.write(f"{'shards':>6} {'workers':>8} {'orders/s':>9}")
+            for shards in options['shards']:
+                shard_stock(product, shards)
+                for workers in options['workers']:
+                    rate = self.measure(consumers, supplier, product, workers, options['seconds'],
+                                        options['hold_ms'] / 1000)
+                    self.stdout.write(f"{shards:>6} {workers:>8} {rate:>9.0f}")
+                while fold_reservations():
+                    pass
+        finally:
+            # Orders and ledger entries go with the companies
+            Consumer.objects.filter(id__in=[c.id for c in consumers]).delete()
+            supplier.delete()
+
+    def measure(self, consumers, supplier, product, workers, seconds, hold):
+        items = [{'product_id': product.id, 'quantity': 1}]
+        barrier = threading.Barrier(workers + 1)
+        counts = []
+
+        def work(consumer):
+            done = 0
+            try:
+                barrier.wait()
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    with transaction.atomic():
+                        place_order(consumer, supplier, items)
+                        if hold:
+                            with connection.cursor() as cursor:
+                                cursor.execute("SELECT pg_sleep(%s)", [hold])
+                    done += 1
+            finally:
+                counts.append(done)
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(consumer,)) for consumer in consumers[:workers]]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+        return sum(counts) / seconds
@@ -0,0 +1,45 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from stock.services import fold_reservations, purge_folded
+
+PURGE_INTERVAL = 3600  # seconds
+
+
+class Command(BaseCommand):
+    help = "Fold the stock reservation ledger of sharded products into Product.stock_level"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help="Seconds to wait when there is nothing to fold")
+        parser.add_argument('--once', action='store_true',
+                            help="Fold what is in the ledger right now and exit")
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        last_purge = None
+        while self.running:
+            close_old_connections()
+            folded = fold_reservations(options['batch_size'])
+            total += folded
+            if folded:
+                continue
+            if options['once']:
+                break
+            if last_purge is None or time.monotonic() - last_purge > PURGE_INTERVAL:
+                purge_folded()
+                last_purge = time.monotonic()
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciler stopped after folding {total} entries."))
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Product
+from stock.services import shard_stock
+
+
+class Command(BaseCommand):
+    help = "Split a hot product's stock over several counters, or turn that off with --shards 0"
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', type=int, nargs='+')
+        parser.add_argument('--shards', type=int, default=settings.STOCK['DEFAULT_SHARDS'])
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError("--shards must be between 0 and 256.")
+        for product_id in options['product_ids']:
+            try:
+                product = Product.objects.get(pk=product_id)
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {product_id} does not exist.")
+            shard_stock(product, options['shards'])
+            self.stdout.write(f"{product.name}: {product.stock_level} in {product.stock_shards} shards")
@@ -0,0 +1,44 @@
+from django.db import models
+
+
+class StockShard(models.Model):
+    """
+    One slice of a hot product's orderable stock. An order takes its
+    quantity from a single unlocked shard, so orders for the same product
+    run side by side instead of waiting for each other.
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    available = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stock_shard_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}/{self.shard}: {self.available}"
+
+
+class StockReservation(models.Model):
+    """
+    Append-only ledger of what orders took from the shards (positive
+    quantity) or gave back to them (negative). The reconciler folds
+    entries into Product.stock_level, so for a sharded product:
+
+        sum(shards.available) == stock_level - sum(unfolded quantities)
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='+')
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField()
+    folded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product'], condition=models.Q(folded=False), name='stock_reservation_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity:+} of {self.product_id} for order {self.order_id}"
@@ -0,0 +1,290 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+
+from companies.services import bump_catalog_version
+from orders.models import ORDER_TRANSITIONS, Order, OrderItem
+from products.models import Product
+from .models import StockReservation, StockShard
+
+# Transaction-level advisory lock held by whoever folds the ledger
+FOLD_LOCK = 0x5CF0_57C0
+
+
+def _setting(name):
+    return settings.STOCK[name]
+
+
+def take_from_shards(product, quantity):
+    """
+    Take `quantity` of a sharded product and return [(shard, quantity)].
+    Must run inside the order's transaction.
+
+    The fast path is one UPDATE on a single shard picked, from a random
+    starting point, among those not locked by another transaction that
+    still hold enough (FOR UPDATE SKIP LOCKED), so it never waits. Only
+    when no such shard exists are all shards locked in shard order and
+    the quantity taken from several of them.
+    """
+    shards = StockShard._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {shards} SET available = available - %s
+            WHERE id = (
+                SELECT id FROM {shards}
+                WHERE product_id = %s AND available >= %s
+                ORDER BY (shard + %s) %% %s
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING shard
+            """,
+            [quantity, product.id, quantity, random.randrange(product.stock_shards), product.stock_shards]
+        )
+        row = cursor.fetchone()
+    if row is not None:
+        return [(row[0], quantity)]
+
+    locked = list(
+        StockShard.objects.select_for_update().filter(product=product).order_by('shard')
+        .values_list('shard', 'available')
+    )
+    available = sum(max(count, 0) for _, count in locked)
+    if available < quantity:
+        raise serializers.ValidationError(f"Insufficient stock for {product.name}. Available: {available}")
+
+    taken = []
+    remaining = quantity
+    for shard, count in sorted(locked, key=lambda pair: -pair[1]):
+        part = min(count, remaining)
+        taken.append((shard, part))
+        remaining -= part
+        if not remaining:
+            break
+    _add_to_shards(product.id, [(shard, -part) for shard, part in taken])
+    return taken
+
+
+def _add_to_shards(product_id, changes):
+    """
+    Add [(shard, quantity)] to a product's shards in one UPDATE.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {StockShard._meta.db_table} AS s
+            SET available = s.available + d.qty
+            FROM unnest(%s::smallint[], %s::integer[]) AS d(shard, qty)
+            WHERE s.product_id = %s AND s.shard = d.shard
+            """,
+            [[shard for shard, _ in changes], [qty for _, qty in changes], product_id]
+        )
+
+
+def record_reservations(order, taken):
+    """
+    Write the ledger entries for what place_order took: {product_id: [(shard, quantity)]}.
+    """
+    StockReservation.objects.bulk_create([
+        StockReservation(product_id=product_id, order=order, shard=shard, quantity=quantity)
+        for product_id, parts in taken.items()
+        for shard, quantity in parts
+    ])
+
+
+def release_reservations(order):
+    """
+    Give back everything a declined or canceled order took from shards.
+    Two queries whatever the number of lines:
+    1. Append the negative ledger entries, computed from the order's own
+    2. Add the quantities back to the same shards (modulo the current
+       shard count, in case the product was re-sharded since)
+    A product that is no longer sharded gets its stock back when the
+    entries are folded. Must run in the transaction that changes the
+    order's status, after its products were locked.
+    """
+    ledger = StockReservation._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {ledger} (product_id, order_id, shard, quantity, folded, created_at)
+            SELECT product_id, order_id, shard, -SUM(quantity), false, %s
+            FROM {ledger}
+            WHERE order_id = %s
+            GROUP BY product_id, order_id, shard
+            HAVING SUM(quantity) > 0
+            RETURNING product_id, shard, quantity
+            """,
+            [timezone.now(), order.pk]
+        )
+        released = cursor.fetchall()
+        if released:
+            _credit_shards(cursor, released)
+    return len(released)
+
+
+def return_to_shards(order, product_ids):
+    """
+    Give back what a declined or canceled order took from products that
+    were sharded after it was placed, so the stock did not come from the
+    shards. Adding it to stock_level would leave it unorderable until the
+    next re-shard; instead it goes to one shard per product, with negative
+    ledger entries like release_reservations writes, and folding moves it
+    into stock_level. Same transaction and locks as release_reservations.
+    """
+    returned = (
+        OrderItem.objects.filter(order=order, product_id__in=product_ids)
+        .values('product_id', 'product__stock_shards')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'product__stock_shards', 'total')
+    )
+    entries = StockReservation.objects.bulk_create([
+        StockReservation(product_id=product_id, order=order, shard=order.pk % shards, quantity=-total)
+        for product_id, shards, total in returned
+    ])
+    with connection.cursor() as cursor:
+        _credit_shards(cursor, [(entry.product_id, entry.shard, entry.quantity) for entry in entries])
+    return len(entries)
+
+
+def _credit_shards(cursor, entries):
+    """
+    Apply negative ledger entries [(product_id, shard, quantity)] to the
+    shards, modulo the current shard count in case the product was
+    re-sharded since.
+    """
+    cursor.execute(
+        f"""
+        UPDATE {StockShard._meta.db_table} AS s
+        SET available = s.available - d.qty
+        FROM unnest(%s::bigint[], %s::smallint[], %s::integer[]) AS d(product_id, shard, qty)
+        JOIN {Product._meta.db_table} AS p ON p.id = d.product_id AND p.stock_shards > 0
+        WHERE s.product_id = d.product_id AND s.shard = d.shard %% p.stock_shards
+        """,
+        [list(column) for column in zip(*entries)]
+    )
+
+
+def _fold(cursor, product_id=None, limit=None):
+    """
+    Mark unfolded entries as folded and subtract them from stock_level.
+    Returns (entries folded, supplier ids of the changed products).
+    """
+    ledger = StockReservation._meta.db_table
+    where = "NOT folded"
+    params = []
+    if product_id is not None:
+        where += " AND product_id = %s"
+        params.append(product_id)
+    if limit is not None:
+        where += f" AND id IN (SELECT id FROM {ledger} WHERE NOT folded ORDER BY id LIMIT %s)"
+        params.append(limit)
+    cursor.execute(
+        f"""
+        WITH folded AS (
+            UPDATE {ledger} SET folded = true WHERE {where} RETURNING product_id, quantity
+        ), totals AS (
+            SELECT product_id, SUM(quantity) AS qty, COUNT(*) AS entries FROM folded GROUP BY product_id
+        )
+        UPDATE {Product._meta.db_table} AS p
+        SET stock_level = p.stock_level - t.qty, updated_at = %s
+        FROM totals AS t
+        WHERE p.id = t.product_id
+        RETURNING p.supplier_id, t.entries
+        """,
+        [*params, timezone.now()]
+    )
+    rows = cursor.fetchall()
+    return sum(entries for _, entries in rows), {supplier_id for supplier_id, _ in rows}
+
+
+def fold_reservations(batch_size=None):
+    """
+    Fold up to `batch_size` ledger entries into Product.stock_level in one
+    statement and return how many were folded. Orders keep taking from the
+    shards meanwhile: folding locks product rows and old ledger entries
+    only. Returns 0 without waiting when another process is folding.
+    """
+    batch_size = batch_size or _setting('FOLD_BATCH_SIZE')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [FOLD_LOCK])
+        if not cursor.fetchone()[0]:
+            return 0
+        folded, supplier_ids = _fold(cursor, limit=batch_size)
+        if supplier_ids:
+            # Catalog stock changed
+            bump_catalog_version(*supplier_ids)
+    return folded
+
+
+def shard_stock(product, shards, stock_level=None):
+    """
+    Split a product's stock over `shards` counters (0 turns sharding off),
+    optionally setting a new stock level first. Also the way to change the
+    stock of a sharded product by hand.
+
+    Takes the fold lock, then the product and all its shards, so no order
+    is half way through; folds the product's ledger and spreads the stock
+    level evenly over the new shards. Updates `product` in place.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [FOLD_LOCK])
+        list(Product.objects.select_for_update().filter(pk=product.pk).values_list('id'))
+        list(StockShard.objects.select_for_update().filter(product=product).values_list('id'))
+        _fold(cursor, product_id=product.pk)
+        if stock_level is None:
+            stock_level = Product.objects.values_list('stock_level', flat=True).get(pk=product.pk)
+
+        StockShard.objects.filter(product=product).delete()
+        if shards:
+            share, extra = divmod(max(stock_level, 0), shards)
+            StockShard.objects.bulk_create([
+                StockShard(product=product, shard=shard, available=share + (shard < extra))
+                for shard in range(shards)
+            ])
+        Product.objects.filter(pk=product.pk).update(
+            stock_level=stock_level, stock_shards=shards, updated_at=timezone.now()
+        )
+        bump_catalog_version(product.supplier_id)
+
+    product.stock_level = stock_level
+    product.stock_shards = shards
+    return product
+
+
+def _restockable_statuses():
+    """
+    Statuses from which an order can still be declined or canceled.
+    """
+    from orders.services import RESTOCKED_STATUSES
+
+    reachable = set(RESTOCKED_STATUSES)
+    changed = True
+    while changed:
+        changed = False
+        for status, targets in ORDER_TRANSITIONS.items():
+            if status not in reachable and targets & reachable:
+                reachable.add(status)
+                changed = True
+    return reachable - set(RESTOCKED_STATUSES)
+
+
+def purge_folded(older_than=None):
+    """
+    Delete folded entries of orders that can no longer give stock back,
+    after STOCK['RETENTION_DAYS'].
+    """
+    older_than = older_than or timedelta(days=_setting('RETENTION_DAYS'))
+    deleted, _ = StockReservation.objects.filter(
+        folded=True,
+        created_at__lt=timezone.now() - older_than,
+    ).exclude(
+        order__in=Order.objects.filter(status__in=_restockable_statuses())
+    ).delete()
+    return deleted
@@ -0,0 +1,189 @@
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from orders.models import OrderStatus
+from orders.services import place_order, transition_order
+from products.models import Product
+from users.models import UserRole
+from stock.models import StockReservation, StockShard
+from stock.services import fold_reservations, purge_folded, shard_stock
+
+User = get_user_model()
+
+
+def shard_levels(product):
+    return list(StockShard.objects.filter(product=product).order_by('shard').values_list('available', flat=True))
+
+
+class ShardedStockTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Hot Farm", address="1 A St")
+        self.owner = User.objects.create_user("owner@hot.com", "pass", role=UserRole.OWNER, supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Hot Buyer", address="2 B St")
+        self.buyer = User.objects.create_user("buyer@hot.com", "pass", role=UserRole.CONSUMER,
+                                              consumer=self.consumer)
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.mango = Product.objects.create(supplier=self.supplier, name="Mango", price=2, stock_level=10, unit="kg")
+        self.lime = Product.objects.create(supplier=self.supplier, name="Lime", price=1, stock_level=10, unit="kg")
+        shard_stock(self.mango, 4)
+
+    def order(self, *lines):
+        self.client.force_authenticate(user=self.buyer)
+        return self.client.post(reverse('order-list'), {
+            "supplier": self.supplier.id,
+            "items": [{"product_id": product.id, "quantity": quantity} for product, quantity in lines],
+        }, format='json')
+
+    def catalog_version(self):
+        return Supplier.objects.values_list('catalog_version', flat=True).get(id=self.supplier.id)
+
+    def test_order_takes_from_one_shard_until_folded(self):
+        self.assertEqual(shard_levels(self.mango), [3, 3, 2, 2])
+        version = self.catalog_version()
+
+        response = self.order((self.mango, 2))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sum(shard_levels(self.mango)), 8)
+        reservation = StockReservation.objects.get()
+        self.assertEqual((reservation.quantity, reservation.folded), (2, False))
+        self.mango.refresh_from_db()
+        self.assertEqual(self.mango.stock_level, 10)
+        self.assertEqual(self.catalog_version(), version)
+
+        self.assertEqual(fold_reservations(), 1)
+        self.mango.refresh_from_db()
+        self.assertEqual(self.mango.stock_level, 8)
+        self.assertNotEqual(self.catalog_version(), version)
+        self.assertEqual(fold_reservations(), 0)
+
+    def test_large_order_spans_shards_and_shortage_is_refused(self):
+        self.assertEqual(self.order((self.mango, 7)).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sum(shard_levels(self.mango)), 3)
+        self.assertEqual(StockReservation.objects.count(), 3)
+
+        response = self.order((self.lime, 1), (self.mango, 4))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Available: 3", str(response.data))
+        self.lime.refresh_from_db()
+        self.assertEqual(self.lime.stock_level, 10)
+        self.assertEqual(StockReservation.objects.count(), 3)
+
+    def test_mixed_order_locks_only_unsharded_products(self):
+        version = self.catalog_version()
+
+        self.order((self.lime, 3), (self.mango, 1), (self.mango, 1))
+
+        self.lime.refresh_from_db()
+        self.assertEqual(self.lime.stock_level, 7)
+        self.assertEqual(sum(shard_levels(self.mango)), 8)
+        self.assertNotEqual(self.catalog_version(), version)
+
+    def test_decline_gives_stock_back_to_the_same_shards(self):
+        order = place_order(self.consumer, self.supplier, [{"product_id": self.mango.id, "quantity": 7},
+                                                           {"product_id": self.lime.id, "quantity": 2}])
+        fold_reservations()
+
+        transition_order(order, OrderStatus.DECLINED)
+
+        self.assertEqual(shard_levels(self.mango), [3, 3, 2, 2])
+        self.assertEqual(sum(StockReservation.objects.values_list('quantity', flat=True)), 0)
+        fold_reservations()
+        self.mango.refresh_from_db()
+        self.lime.refresh_from_db()
+        self.assertEqual((self.mango.stock_level, self.lime.stock_level), (10, 10))
+
+    def test_cancel_after_sharding_gives_stock_to_the_shards(self):
+        order = place_order(self.consumer, self.supplier, [{"product_id": self.lime.id, "quantity": 3}])
+        shard_stock(self.lime, 2)
+        self.assertEqual(shard_levels(self.lime), [4, 3])
+
+        transition_order(order, OrderStatus.CANCELED)
+
+        self.assertEqual(sum(shard_levels(self.lime)), 10)
+        fold_reservations()
+        self.lime.refresh_from_db()
+        self.assertEqual(self.lime.stock_level, 10)
+        self.assertEqual(self.order((self.lime, 10)).status_code, status.HTTP_201_CREATED)
+
+    def test_supplier_sets_stock_and_sharding_can_be_turned_off(self):
+        self.order((self.mango, 4))
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.patch(reverse('product-detail', args=[self.mango.id]), {"stock_level": 20})
+
+        self.assertEqual(response.data['stock_level'], 20)
+        self.assertEqual(shard_levels(self.mango), [5, 5, 5, 5])
+        self.assertFalse(StockReservation.objects.filter(folded=False).exists())
+
+        self.order((self.mango, 5))
+        self.client.force_authenticate(user=self.owner)
+        self.client.patch(reverse('product-detail', args=[self.mango.id]), {"name": "Mango (ripe)"})
+        shard_stock(self.mango, 0)
+
+        self.mango.refresh_from_db()
+        self.assertEqual((self.mango.name, self.mango.stock_level, self.mango.stock_shards), ("Mango (ripe)", 15, 0))
+        self.assertEqual(shard_levels(self.mango), [])
+        self.order((self.mango, 15))
+        self.mango.refresh_from_db()
+        self.assertEqual(self.mango.stock_level, 0)
+
+    def test_purge_keeps_entries_of_orders_that_can_still_be_canceled(self):
+        pending = place_order(self.consumer, self.supplier, [{"product_id": self.mango.id, "quantity": 1}])
+        delivered = place_order(self.consumer, self.supplier, [{"product_id": self.mango.id, "quantity": 1}])
+        for new_status in (OrderStatus.CONFIRMED, OrderStatus.SHIPPED, OrderStatus.DELIVERED):
+            transition_order(delivered, new_status)
+        fold_reservations()
+
+        self.assertEqual(purge_folded(), 0)
+        StockReservation.objects.update(created_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(purge_folded(), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('order', flat=True)), [pending.id])
+
+
+class ShardedStockConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Rush Farm", address="1 A St")
+        self.consumer = Consumer.objects.create(company_name="Rush Buyer", address="2 B St")
+        self.mango = Product.objects.create(supplier=self.supplier, name="Mango", price=2, stock_level=10, unit="kg")
+        shard_stock(self.mango, 4)
+
+    def test_hot_product_is_never_oversold(self):
+        barrier = threading.Barrier(12)
+        placed = []
+
+        def buy():
+            try:
+                barrier.wait()
+                for _ in range(2):
+                    try:
+                        place_order(self.consumer, self.supplier, [{"product_id": self.mango.id, "quantity": 1}])
+                        placed.append(1)
+                    except ValidationError:
+                        pass
+                    fold_reservations()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        fold_reservations()
+        self.mango.refresh_from_db()
+        self.assertEqual(len(placed), 10)
+        self.assertEqual(shard_levels(self.mango), [0, 0, 0, 0])
+        self.assertEqual(self.mango.stock_level, 0)
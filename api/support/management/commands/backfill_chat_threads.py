@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+from support.models import ChatThread, ChatMessage
+from support.services import PREVIEW_LENGTH
+
+
+def _unread_count(from_supplier):
+    return Coalesce(
+        Subquery(
+            ChatMessage.objects.filter(
+                thread=OuterRef('pk'),
+                is_read=False,
+                sender__supplier__isnull=not from_supplier,
+            ).order_by().values('thread').annotate(c=Count('id')).values('c'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized last message and unread counters on every chat thread"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last = ChatMessage.objects.filter(thread=OuterRef('pk')).order_by('-created_at', '-id')
+
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(
+                ChatThread.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # One set-based UPDATE per batch keeps each transaction short
+            with transaction.atomic():
+                updated += ChatThread.objects.filter(id__in=ids).update(
+                    last_message_id=Subquery(last.values('id')[:1]),
+                    last_message_at=Subquery(last.values('created_at')[:1]),
+                    last_message_preview=Coalesce(Substr(Subquery(last.values('text')[:1]), 1, PREVIEW_LENGTH), Value('')),
+                    consumer_unread_count=_unread_count(from_supplier=True),
+                    supplier_unread_count=_unread_count(from_supplier=False),
+                )
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} chat threads."))
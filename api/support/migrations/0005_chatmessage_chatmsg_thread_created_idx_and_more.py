@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_link_link_consumer_created_idx_and_more'),
+        ('orders', '0004_order_order_consumer_created_idx_and_more'),
+        ('support', '0004_chatthread_is_active_complaint_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['thread', 'created_at', 'id'], name='chatmsg_thread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['consumer', 'updated_at', 'id'], name='chat_consumer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['supplier', 'updated_at', 'id'], name='chat_supplier_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='complaint_creator_created_idx'),
+        ),
+    ]
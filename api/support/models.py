@@ -50,6 +50,11 @@ class Complaint(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='complaint_creator_created_idx'),
+        ]
+
     def __str__(self):
         return f"Complaint #{self.id} on Order #{self.order.id}"
 
@@ -66,9 +71,27 @@ class ChatThread(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized from ChatMessage so the thread list needs no per-thread queries.
+    # Maintained by support.services; rebuild with `manage.py backfill_chat_threads`.
+    last_message = models.ForeignKey(
+        'ChatMessage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    consumer_unread_count = models.PositiveIntegerField(default=0)  # Supplier messages the consumer has not read
+    supplier_unread_count = models.PositiveIntegerField(default=0)  # Consumer messages the supplier has not read
+
     class Meta:
         unique_together = ('consumer', 'supplier')  # One thread per pair
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['consumer', 'updated_at', 'id'], name='chat_consumer_updated_idx'),
+            models.Index(fields=['supplier', 'updated_at', 'id'], name='chat_supplier_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Chat: {self.consumer} <-> {self.supplier}"
@@ -86,6 +109,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['thread', 'created_at', 'id'], name='chatmsg_thread_created_idx'),
+        ]
 
     def __str__(self):
         return f"Msg from {self.sender.email} at {self.created_at}"
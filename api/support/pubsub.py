@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    One waiting client. Created before the client checks the database so a
+    message committed in between still wakes it up.
+    """
+
+    def __init__(self, broker, key):
+        self.broker = broker
+        self.key = key
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        # publish() runs in whatever thread saved the message
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout):
+        """
+        Park until a publish on our key or `timeout` seconds. Costs no thread
+        and no DB connection while waiting. Returns True if woken up.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Wakes waiters living in this process only. Enough for a single ASGI
+    worker and for tests.
+    """
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    async def subscribe(self, key):
+        subscription = Subscription(self, str(key))
+        with self._lock:
+            self._subscribers[subscription.key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            waiters = self._subscribers.get(subscription.key)
+            if waiters is not None:
+                waiters.discard(subscription)
+                if not waiters:
+                    del self._subscribers[subscription.key]
+
+    def publish(self, key):
+        self._wake(str(key))
+
+    def _wake(self, key):
+        with self._lock:
+            waiters = list(self._subscribers.get(key, ()))
+        for subscription in waiters:
+            subscription.notify()
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Fans wake-ups out to every worker process through PostgreSQL
+    LISTEN/NOTIFY. Each event loop keeps one listening connection.
+    """
+
+    def __init__(self, channel='scp_pubsub', **options):
+        super().__init__()
+        self.channel = channel
+        self._listeners = {}
+
+    def publish(self, key):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, str(key)])
+
+    async def subscribe(self, key):
+        loop = asyncio.get_running_loop()
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            ready = loop.create_future()
+            self._listeners[loop] = loop.create_task(self._listen(ready))
+            await ready
+        return await super().subscribe(key)
+
+    async def _listen(self, ready):
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+
+        db = settings.DATABASES['default']
+        conninfo = make_conninfo(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db.get('PORT') or None,
+        )
+        try:
+            conn = await psycopg.AsyncConnection.connect(conninfo, autocommit=True)
+        except Exception as exc:
+            ready.set_exception(exc)
+            return
+        async with conn:
+            await conn.execute(f'LISTEN "{self.channel}"')
+            ready.set_result(None)
+            async for notify in conn.notifies():
+                self._wake(notify.payload)
+
+
+_broker = None
+
+
+def get_broker():
+    """
+    The process-wide broker configured by settings.PUBSUB.
+    """
+    global _broker
+    if _broker is None:
+        config = dict(settings.PUBSUB)
+        _broker = import_string(config.pop('BACKEND'))(**config.pop('OPTIONS', {}))
+    return _broker
@@ -17,7 +17,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
 
     def validate_order(self, value):
         user = self.context['request'].user
-        if user.consumer and value.consumer != user.consumer:
+        if user.consumer_id and value.consumer_id != user.consumer_id:
             raise serializers.ValidationError("You can only file complaints for your own orders.")
         return value
 
@@ -40,23 +40,28 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 class ChatThreadSerializer(serializers.ModelSerializer):
     consumer_name = serializers.CharField(source='consumer.company_name', read_only=True)
     supplier_name = serializers.CharField(source='supplier.company_name', read_only=True)
-    last_message = serializers.SerializerMethodField()
+    last_message = ChatMessageSerializer(read_only=True)
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatThread
         fields = [
             'id', 'consumer', 'consumer_name', 'supplier', 'supplier_name',
-            'updated_at', 'last_message', 'escalation_level'
+            'updated_at', 'last_message', 'last_message_at', 'last_message_preview',
+            'unread_count', 'escalation_level'
         ]
-        read_only_fields = ['escalation_level']
+        read_only_fields = ['escalation_level', 'last_message_at', 'last_message_preview']
         extra_kwargs = {
             'consumer': {'required': False},
             'supplier': {'required': False}
         }
         validators = []
 
-    def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
-            return ChatMessageSerializer(last_msg).data
-        return None
\ No newline at end of file
+    def get_unread_count(self, obj):
+        """
+        Unread messages for the side of the requesting user.
+        """
+        request = self.context.get('request')
+        if request and request.user.consumer:
+            return obj.consumer_unread_count
+        return obj.supplier_unread_count
\ No newline at end of file
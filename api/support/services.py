@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Complaint, ChatThread, ChatMessage
+
+PREVIEW_LENGTH = 100
+
+
+def visible_complaints(user):
+    """
+    Active complaints a user may see.
+    """
+    base_qs = Complaint.objects.filter(is_active=True)
+    # Consumers see their own complaints
+    if user.consumer:
+        return base_qs.filter(created_by=user)
+    # Suppliers see complaints linked to their orders
+    elif user.supplier:
+        return base_qs.filter(order__supplier=user.supplier)
+    return Complaint.objects.none()
+
+
+def record_message(thread, message, from_consumer):
+    """
+    Store a new message on its thread's denormalized fields in one UPDATE:
+    last message pointer, preview and the other side's unread counter.
+    Must run in the transaction that inserted the message.
+    """
+    unread_field = 'supplier_unread_count' if from_consumer else 'consumer_unread_count'
+    ChatThread.objects.filter(id=thread.id).update(
+        last_message=message,
+        last_message_at=message.created_at,
+        last_message_preview=message.text[:PREVIEW_LENGTH],
+        updated_at=timezone.now(),
+        **{unread_field: F(unread_field) + 1}
+    )
+
+
+def mark_thread_read(thread, reader_is_consumer):
+    """
+    Mark every message from the other side as read and reset the reader's counter.
+    The thread row is locked first so a message sent concurrently is either
+    included in both the flags and the counter reset, or in neither.
+    """
+    with transaction.atomic():
+        ChatThread.objects.select_for_update().get(id=thread.id)
+        if reader_is_consumer:
+            # Consumer reads Supplier messages
+            ChatMessage.objects.filter(
+                thread=thread,
+                sender__supplier__isnull=False,  # Sent by supplier
+                is_read=False
+            ).update(is_read=True)
+            ChatThread.objects.filter(id=thread.id).update(consumer_unread_count=0)
+        else:
+            # Supplier reads Consumer messages
+            ChatMessage.objects.filter(
+                thread=thread,
+                sender__consumer__isnull=False,  # Sent by consumer
+                is_read=False
+            ).update(is_read=True)
+            ChatThread.objects.filter(id=thread.id).update(supplier_unread_count=0)
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from outbox.services import publish
+from .models import Complaint, ChatMessage
+
+
+@receiver(post_save, sender=Complaint)
+def publish_complaint_events(sender, instance, created, **kwargs):
+    if created:
+        publish('complaint.created', {'complaint_id': instance.id})
+    else:
+        publish('complaint.updated', {
+            'complaint_id': instance.id,
+            'status': instance.status,
+            'escalation_level': instance.escalation_level,
+        })
+
+
+@receiver(post_save, sender=ChatMessage)
+def publish_chat_events(sender, instance, created, **kwargs):
+    if created:
+        publish('chat.message_created', {'message_id': instance.id, 'thread_id': instance.thread_id})
@@ -2,17 +2,33 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.core.files.uploadedfile import SimpleUploadedFile
+import asyncio
+import csv
+import gzip
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from companies.models import Supplier, Consumer, Link, LinkStatus
 from products.models import Product
 from orders.models import Order
 from support.models import Complaint, ComplaintStatus, EscalationLevel, ChatThread, ChatMessage
+from support.pubsub import get_broker
+from support.services import record_message
+from scp_project.pagination import KeysetPagination
+from scp_project.testing import QueryCountMixin
 from users.models import UserRole
 
 User = get_user_model()
 
 
-class SupportTests(APITestCase):
+class SupportTests(QueryCountMixin, APITestCase):
     def setUp(self):
         self.complaint_list_url = reverse('complaint-list')
         self.chat_list_url = reverse('chat-thread-list')
@@ -114,6 +130,51 @@ class SupportTests(APITestCase):
         self.assertEqual(response['Content-Type'], 'text/csv')
         self.assertContains(response, "A")
 
+    def export_rows(self, params=None):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(reverse('complaint-export-csv'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            body = gzip.decompress(body)
+        return list(csv.reader(StringIO(body.decode())))[1:]
+
+    def test_export_query_count_is_flat(self):
+        """Test that the export reads orders and users in the same query as complaints"""
+        def export_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                rows = self.export_rows()
+            return len(ctx.captured_queries), rows
+
+        Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject="A", description="..")
+        one, rows = export_queries()
+        self.assertEqual(len(rows), 1)
+
+        for i in range(5):
+            Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject=f"B{i}", description="..")
+        many, rows = export_queries()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(one, many)
+        self.assertEqual(rows[0][2:4], [str(self.order.id), "A"])
+        self.assertEqual(rows[0][6], self.user_consumer.email)
+
+    def test_export_filters_and_gzip(self):
+        old = Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject="Old", description="..")
+        Complaint.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=30))
+        Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject="Open", description="..")
+        Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject="Done", description="..",
+                                 status=ComplaintStatus.RESOLVED)
+        today = timezone.localdate().isoformat()
+
+        subjects = lambda rows: sorted(row[3] for row in rows)
+        self.assertEqual(subjects(self.export_rows({'status': 'resolved'})), ["Done"])
+        self.assertEqual(subjects(self.export_rows({'created_after': today})), ["Done", "Open"])
+        self.assertEqual(subjects(self.export_rows({'created_before': today, 'status': 'OPEN'})), ["Old", "Open"])
+        self.assertEqual(subjects(self.export_rows({'created_after': today, 'gzip': 'true'})), ["Done", "Open"])
+
+        response = self.client.get(reverse('complaint-export-csv'), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_complaint_soft_delete(self):
         """Test that deleting a complaint archives it"""
         complaint = Complaint.objects.create(
@@ -229,7 +290,7 @@ class SupportTests(APITestCase):
 
         self.client.force_authenticate(user=self.user_consumer)
         response = self.client.get(self.chat_list_url)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
         thread.is_active = False
         thread.save()
@@ -237,7 +298,7 @@ class SupportTests(APITestCase):
         response = self.client.get(self.chat_list_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_blocked_consumer_cannot_see_chat_or_send_message(self):
         """
@@ -248,14 +309,14 @@ class SupportTests(APITestCase):
 
         self.client.force_authenticate(user=self.user_consumer)
         response = self.client.get(self.chat_list_url)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
         link.status = LinkStatus.BLOCKED
         link.save()
 
         response = self.client.get(self.chat_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)  # Should be hidden
+        self.assertEqual(len(response.data['results']), 0)  # Should be hidden
 
         url = reverse('chat-messages', args=[thread.id])
         data = {"text": "Please unblock me"}
@@ -267,13 +328,13 @@ class SupportTests(APITestCase):
         link.status = LinkStatus.ACCEPTED
         link.save()
         response = self.client.get(self.chat_list_url)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
         link.is_active = False
         link.save()
 
         response = self.client.get(self.chat_list_url)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_intruder_cannot_access_other_chat_thread(self):
         """Test that Consumer A cannot read messages from Consumer B's thread"""
@@ -285,7 +346,7 @@ class SupportTests(APITestCase):
         url = reverse('chat-messages', args=[other_thread.id])
         response = self.client.get(url)
 
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_consumer_cannot_escalate_chat(self):
         """Test that Consumers cannot trigger chat escalation"""
@@ -301,3 +362,193 @@ class SupportTests(APITestCase):
         thread.refresh_from_db()
         # Should stay at SALES_REP
         self.assertEqual(thread.escalation_level, EscalationLevel.SALES_REP)
+
+    def test_sending_message_updates_thread_summary(self):
+        """Test that the thread keeps its last message and unread counter up to date"""
+        thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+
+        self.client.force_authenticate(user=self.user_consumer)
+        url = reverse('chat-messages', args=[thread.id])
+        self.client.post(url, {"text": "First"})
+        response = self.client.post(url, {"text": "Second"})
+
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message_id, response.data['id'])
+        self.assertEqual(thread.last_message_preview, "Second")
+        self.assertEqual(thread.supplier_unread_count, 2)
+        self.assertEqual(thread.consumer_unread_count, 0)
+
+        # Supplier sees the counter, then reads the thread
+        self.client.force_authenticate(user=self.sales)
+        response = self.client.get(self.chat_list_url)
+        self.assertEqual(response.data['results'][0]['unread_count'], 2)
+        self.assertEqual(response.data['results'][0]['last_message']['text'], "Second")
+
+        self.client.post(reverse('chat-messages-mark-read', args=[thread.id]))
+        thread.refresh_from_db()
+        self.assertEqual(thread.supplier_unread_count, 0)
+
+    def test_outsider_cannot_mark_thread_read(self):
+        thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        msg = ChatMessage.objects.create(thread=thread, sender=self.sales, text="Hi")
+
+        self.client.force_authenticate(user=self.other_consumer)
+        response = self.client.post(reverse('chat-messages-mark-read', args=[thread.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        msg.refresh_from_db()
+        self.assertFalse(msg.is_read)
+
+    def test_thread_list_query_count_is_flat(self):
+        """Test that listing threads does not query per thread"""
+        def list_queries():
+            self.client.force_authenticate(user=self.owner)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.chat_list_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries), len(response.data['results'])
+
+        thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        record_message(thread, ChatMessage.objects.create(thread=thread, sender=self.user_consumer, text="a"), True)
+        one_thread, count = list_queries()
+        self.assertEqual(count, 1)
+
+        for i in range(3):
+            org = Consumer.objects.create(company_name=f"Buyer {i}", address="..")
+            buyer = User.objects.create_user(f"buyer{i}@test.com", "pass", role=UserRole.CONSUMER, consumer=org)
+            Link.objects.create(supplier=self.supplier, consumer=org, status=LinkStatus.ACCEPTED)
+            t = ChatThread.objects.create(consumer=org, supplier=self.supplier)
+            record_message(t, ChatMessage.objects.create(thread=t, sender=buyer, text="b"), True)
+
+        many_threads, count = list_queries()
+        self.assertEqual(count, 4)
+        self.assertEqual(one_thread, many_threads)
+
+    def test_complaint_and_message_lists_queries_do_not_grow(self):
+        Complaint.objects.create(order=self.order, created_by=self.user_consumer, subject="Late", description="..")
+        thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        ChatMessage.objects.create(thread=thread, sender=self.user_consumer, text="Hi")
+
+        def add_complaints():
+            for i in range(3):
+                author = User.objects.create_user(f"colleague{i}@test.com", "pass", role=UserRole.CONSUMER,
+                                                  consumer=self.consumer)
+                Complaint.objects.create(order=self.order, created_by=author, subject="Broken", description="..")
+
+        def add_messages():
+            for sender in (self.owner, self.sales, self.user_consumer):
+                ChatMessage.objects.create(thread=thread, sender=sender, text="More")
+
+        self.assertQueriesDoNotGrow(self.complaint_list_url, self.owner, add_complaints)
+        self.assertQueriesDoNotGrow(reverse('chat-messages', args=[thread.id]), self.user_consumer, add_messages)
+
+    def test_backfill_chat_threads_command(self):
+        """Test rebuilding the denormalized thread fields from existing messages"""
+        thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        ChatMessage.objects.create(thread=thread, sender=self.user_consumer, text="Old")
+        ChatMessage.objects.create(thread=thread, sender=self.sales, text="From supplier")
+        last = ChatMessage.objects.create(thread=thread, sender=self.user_consumer, text="Newest " * 30)
+        empty = ChatThread.objects.create(consumer=self.other_consumer_org, supplier=self.supplier)
+
+        call_command('backfill_chat_threads', stdout=StringIO())
+
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message_id, last.id)
+        self.assertEqual(thread.last_message_preview, last.text[:100])
+        self.assertEqual(thread.supplier_unread_count, 2)
+        self.assertEqual(thread.consumer_unread_count, 1)
+        empty.refresh_from_db()
+        self.assertIsNone(empty.last_message_id)
+        self.assertEqual(empty.last_message_preview, "")
+
+
+class ChatLongPollTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(company_name="Poll Inc", address="1 A St")
+        self.sales = User.objects.create_user("sales@poll.com", "pass", role=UserRole.SALES_REP, supplier=self.supplier)
+        self.consumer = Consumer.objects.create(company_name="Poll Buyer", address="2 B St")
+        self.user_consumer = User.objects.create_user("con@poll.com", "pass", role=UserRole.CONSUMER,
+                                                      consumer=self.consumer)
+        self.outsider = User.objects.create_user("out@poll.com", "pass", role=UserRole.CONSUMER,
+                                                 consumer=Consumer.objects.create(company_name="X", address="."))
+        Link.objects.create(supplier=self.supplier, consumer=self.consumer, status=LinkStatus.ACCEPTED)
+        self.thread = ChatThread.objects.create(consumer=self.consumer, supplier=self.supplier)
+        self.url = reverse('chat-messages-poll', args=[self.thread.id])
+
+    def auth(self, user):
+        return {'Authorization': f"Bearer {AccessToken.for_user(user)}"}
+
+    def test_returns_pending_messages_immediately(self):
+        since = timezone.now()
+        ChatMessage.objects.create(thread=self.thread, sender=self.sales, text="Already here")
+
+        response = self.client.get(self.url, {'since': since.isoformat(), 'timeout': 5}, headers=self.auth(self.user_consumer))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['text'] for m in response.json()['results']], ["Already here"])
+
+    def test_times_out_with_empty_list(self):
+        response = self.client.get(self.url, {'timeout': 0.05}, headers=self.auth(self.user_consumer))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_returns_at_most_one_page(self):
+        ChatMessage.objects.bulk_create([
+            ChatMessage(thread=self.thread, sender=self.sales, text=f"#{i}")
+            for i in range(KeysetPagination.max_page_size + 5)
+        ])
+        since = (timezone.now() - timedelta(days=365)).isoformat()
+
+        data = self.client.get(self.url, {'since': since, 'timeout': 0}, headers=self.auth(self.user_consumer)).json()
+
+        self.assertEqual(len(data['results']), KeysetPagination.max_page_size)
+        self.assertTrue(data['has_more'])
+
+    def test_since_without_zone_is_utc(self):
+        message = ChatMessage.objects.create(thread=self.thread, sender=self.sales, text="Hi")
+        # created_at is in UTC
+        before = (message.created_at - timedelta(seconds=1)).replace(tzinfo=None)
+        after = (message.created_at + timedelta(seconds=1)).replace(tzinfo=None)
+
+        for since, expected in ((before, ["Hi"]), (after, [])):
+            data = self.client.get(self.url, {'since': since.isoformat(), 'timeout': 0},
+                                   headers=self.auth(self.user_consumer)).json()
+            self.assertEqual([m['text'] for m in data['results']], expected)
+            self.assertFalse(data['has_more'])
+
+    def test_impossible_since_is_a_bad_request(self):
+        response = self.client.get(self.url, {'since': '2024-13-45T00:00:00', 'timeout': 0},
+                                   headers=self.auth(self.user_consumer))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.json())
+
+    def test_requires_participant(self):
+        response = self.client.get(self.url, {'timeout': 0})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.get(self.url, {'timeout': 0}, headers=self.auth(self.outsider))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sending_message_publishes_after_commit(self):
+        broker = mock.Mock()
+        self.client.force_authenticate(user=self.sales)
+        with mock.patch('support.views.get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('chat-messages', args=[self.thread.id]), {"text": "Ping"})
+
+        broker.publish.assert_called_once_with(self.thread.id)
+
+    async def test_parked_poll_wakes_on_new_message(self):
+        since = timezone.now()
+        headers = await sync_to_async(self.auth)(self.user_consumer)
+        poll = asyncio.ensure_future(self.async_client.get(self.url, {'since': since.isoformat(), 'timeout': 10}, headers=headers))
+
+        await asyncio.sleep(0.2)
+        self.assertFalse(poll.done())
+        await sync_to_async(ChatMessage.objects.create)(thread=self.thread, sender=self.sales, text="Wake up")
+        get_broker().publish(self.thread.id)
+
+        response = await asyncio.wait_for(poll, 5)
+        self.assertEqual([m['text'] for m in response.json()['results']], ["Wake up"])
@@ -1,21 +1,39 @@
-import csv
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, permissions, exceptions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from companies.models import Link, LinkStatus
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from companies.services import accepted_consumer_ids, accepted_supplier_ids, is_linked
+from exports.filters import filter_export
+from idempotency.mixins import IdempotentCreateMixin
+from realtime.push import push, consumer_group, supplier_group
+from scp_project.eager import EagerLoadingMixin
+from scp_project.pagination import KeysetPagination
+from scp_project.profiling import SerializerTimingMixin
+from scp_project.streaming import streaming_csv_response
 from .models import Complaint, EscalationLevel, ChatMessage, ChatThread, ComplaintStatus
 from .serializers import ComplaintSerializer, ComplaintUpdateSerializer, ChatThreadSerializer, ChatMessageSerializer
+from .pubsub import get_broker
+from .services import record_message, mark_thread_read, visible_complaints
 
 # Create your views here.
 
+# Rows fetched per round trip by the complaint export
+EXPORT_CHUNK_SIZE = 2000
+
+
 @extend_schema_view(
     create=extend_schema(summary="File a Complaint"),
     list=extend_schema(summary="List Complaints"),
     partial_update=extend_schema(summary="Resolve or Dismiss Complaint")
 )
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(IdempotentCreateMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Complaint.objects.none()
 
@@ -25,23 +43,21 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         return ComplaintSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        base_qs = Complaint.objects.filter(is_active=True)
-        # Consumers see their own complaints
-        if user.consumer:
-            return base_qs.filter(created_by=user)
-        # Suppliers see complaints linked to their orders
-        elif user.supplier:
-            return base_qs.filter(order__supplier=user.supplier)
-        return Complaint.objects.none()
+        return visible_complaints(self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         if not self.request.user.consumer:
             raise exceptions.PermissionDenied("Only Consumers can file complaints.")
         serializer.save(created_by=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
     @extend_schema(summary="Assign Complaint to Self")
     @action(detail=True, methods=['post'], url_path='assign')
+    @transaction.atomic
     def assign(self, request, pk=None):
         complaint = self.get_object()
 
@@ -56,6 +72,7 @@ class ComplaintViewSet(viewsets.ModelViewSet):
 
     @extend_schema(summary="Escalate Complaint", request=None)
     @action(detail=True, methods=['post'], url_path='escalate')
+    @transaction.atomic
     def escalate(self, request, pk=None):
         """
         Move the complaint to the next level.
@@ -76,36 +93,44 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         complaint.save()
         return Response({"status": "Escalated", "level": complaint.escalation_level})
 
-    @extend_schema(summary="Export Complaints to CSV")
+    def get_export_queryset(self, request):
+        """
+        Visible complaints narrowed by ?status=, ?created_after= and ?created_before=.
+        """
+        return filter_export(
+            self.filter_queryset(self.get_queryset()), request.query_params, statuses=ComplaintStatus.values
+        )
+
+    @extend_schema(
+        summary="Export Complaints to CSV",
+        parameters=[
+            OpenApiParameter('status', str, description="Comma separated statuses, e.g. `OPEN,IN_PROGRESS`."),
+            OpenApiParameter('created_after', str, description="Earliest creation date, inclusive."),
+            OpenApiParameter('created_before', str, description="Latest creation date, inclusive."),
+            OpenApiParameter('gzip', bool, description="Send a gzip-compressed file."),
+        ],
+    )
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
         """
         Download a CSV file of all visible complaints.
-        """
-        complaints = self.filter_queryset(self.get_queryset())
-
-        # Create the Response object with CSV header
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="complaints_log.csv"'
-
-        writer = csv.writer(response)
-        # Header Rows
-        writer.writerow(['ID', 'Date', 'Order ID', 'Subject', 'Status', 'Escalation Level', 'Created By'])
-
-        # Data Rows
-        for c in complaints:
-            writer.writerow([
-                c.id,
-                c.created_at.strftime("%Y-%m-%d %H:%M"),
-                c.order.id,
-                c.subject,
-                c.status,
-                c.escalation_level,
-                c.created_by.email
-            ])
-
-        return response
 
+        The file is streamed while the rows are read in chunks, so even a
+        supplier's full history is exported in constant memory.
+        """
+        rows = self.get_export_queryset(request).order_by('id').values_list(
+            'id', 'created_at', 'order_id', 'subject', 'status', 'escalation_level', 'created_by__email'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        gzip = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        return streaming_csv_response(
+            request,
+            'complaints_log.csv',
+            ['ID', 'Date', 'Order ID', 'Subject', 'Status', 'Escalation Level', 'Created By'],
+            ((id, created_at.strftime("%Y-%m-%d %H:%M"), *rest) for id, created_at, *rest in rows),
+            gzip=gzip,
+        )
+
+    @transaction.atomic
     def perform_destroy(self, instance):
         instance.is_active = False
         instance.save()
@@ -116,22 +141,19 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(summary="Get Chat Details"),
     create=extend_schema(summary="Start a New Chat Thread")
 )
-class ChatThreadViewSet(viewsets.ModelViewSet):
+class ChatThreadViewSet(IdempotentCreateMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ChatThreadSerializer
     queryset = ChatThread.objects.none()
+    ordering = ('-updated_at', '-id')
 
     def get_queryset(self):
         user = self.request.user
         base_qs = ChatThread.objects.filter(is_active=True)
         if user.consumer:
-            return base_qs.filter(consumer=user.consumer, supplier__links__consumer=user.consumer,
-                supplier__links__status=LinkStatus.ACCEPTED,
-                supplier__links__is_active=True)
+            return base_qs.filter(consumer=user.consumer, supplier_id__in=accepted_supplier_ids(user.consumer))
         elif user.supplier:
-            return base_qs.filter(supplier=user.supplier, consumer__links__supplier=user.supplier,
-                consumer__links__status=LinkStatus.ACCEPTED,
-                consumer__links__is_active=True)
+            return base_qs.filter(supplier=user.supplier, consumer_id__in=accepted_consumer_ids(user.supplier))
         return ChatThread.objects.none()
 
     def perform_create(self, serializer):
@@ -150,20 +172,14 @@ class ChatThreadViewSet(viewsets.ModelViewSet):
             supplier = user.supplier
 
         # Check for Link
-        has_link = Link.objects.filter(
-            consumer=consumer,
-            supplier=supplier,
-            status=LinkStatus.ACCEPTED
-        ).exists()
-
-        if not has_link:
+        if consumer is None or supplier is None or not is_linked(consumer, supplier):
             raise exceptions.PermissionDenied("You must have an ACCEPTED link to chat.")
 
         serializer.save(consumer=consumer, supplier=supplier)
 
     def perform_destroy(self, instance):
         instance.is_active = False
-        instance.save()
+        instance.save(update_fields=['is_active', 'updated_at'])
 
     @extend_schema(summary="Escalate Chat to Manager")
     @action(detail=True, methods=['post'])
@@ -175,7 +191,8 @@ class ChatThreadViewSet(viewsets.ModelViewSet):
 
         if thread.escalation_level == EscalationLevel.SALES_REP:
             thread.escalation_level = EscalationLevel.MANAGER
-            thread.save()
+            # Only touch our own columns: the message counters are updated concurrently
+            thread.save(update_fields=['escalation_level', 'updated_at'])
             return Response({"status": "Escalated to Manager"})
 
         return Response({"detail": "Already escalated"}, status=status.HTTP_400_BAD_REQUEST)
@@ -184,9 +201,10 @@ class ChatThreadViewSet(viewsets.ModelViewSet):
     list=extend_schema(summary="List Messages in Thread"),
     create=extend_schema(summary="Send Message")
 )
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(IdempotentCreateMixin, EagerLoadingMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ChatMessageSerializer
+    ordering = ('created_at', 'id')  # Oldest first, like a conversation
 
     def get_queryset(self):
         """
@@ -220,23 +238,26 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 
         # Verify participation
         user = self.request.user
-        if (user.consumer and thread.consumer != user.consumer) or (user.supplier and thread.supplier != user.supplier):
+        if ((user.consumer_id and thread.consumer_id != user.consumer_id)
+                or (user.supplier_id and thread.supplier_id != user.supplier_id)):
             raise exceptions.PermissionDenied("You are not part of this chat.")
 
-        has_valid_link = Link.objects.filter(
-            consumer=thread.consumer,
-            supplier=thread.supplier,
-            status=LinkStatus.ACCEPTED,
-            is_active=True
-        ).exists()
-
-        if not has_valid_link:
+        if not is_linked(thread.consumer_id, thread.supplier_id):
             raise exceptions.PermissionDenied("Cannot send message: Link is blocked or removed.")
 
-        serializer.save(sender=user, thread=thread)
+        with transaction.atomic():
+            message = serializer.save(sender=user, thread=thread)
+
+            # Update thread timestamp, last message and unread counter
+            record_message(thread, message, from_consumer=bool(user.consumer))
 
-        # Update thread timestamp
-        thread.save()
+            # Wake up long-polling clients and push to WebSocket clients once the message is visible
+            transaction.on_commit(lambda: get_broker().publish(thread.id))
+            data = ChatMessageSerializer(message).data
+            transaction.on_commit(lambda: push([
+                (consumer_group(thread.consumer_id), 'chat.message', data),
+                (supplier_group(thread.supplier_id), 'chat.message', data),
+            ]))
 
     def perform_destroy(self, instance):
         instance.is_active = False
@@ -248,18 +269,94 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         """
         Marks all messages in this thread sent by the OTHER party as read.
         """
-        if request.user.consumer:
-            # Consumer reads Supplier messages
-            ChatMessage.objects.filter(
-                thread_id=thread_pk,
-                sender__supplier__isnull=False,  # Sent by supplier
-                is_read=False
-            ).update(is_read=True)
-        elif request.user.supplier:
-            # Supplier reads Consumer messages
-            ChatMessage.objects.filter(
-                thread_id=thread_pk,
-                sender__consumer__isnull=False,  # Sent by consumer
-                is_read=False
-            ).update(is_read=True)
+        user = request.user
+        if user.consumer:
+            thread = ChatThread.objects.filter(id=thread_pk, consumer=user.consumer).first()
+        elif user.supplier:
+            thread = ChatThread.objects.filter(id=thread_pk, supplier=user.supplier).first()
+        else:
+            thread = None
+        if thread is None:
+            raise exceptions.NotFound("Thread not found.")
+
+        mark_thread_read(thread, reader_is_consumer=bool(user.consumer))
         return Response({"status": "Messages marked as read"})
+
+
+def _poll_thread(user, thread_pk):
+    # Same visibility rule as the thread list: participant with an ACCEPTED link
+    if user.consumer:
+        qs = ChatThread.objects.filter(consumer=user.consumer)
+    elif user.supplier:
+        qs = ChatThread.objects.filter(supplier=user.supplier)
+    else:
+        return None
+    thread = qs.filter(id=thread_pk, is_active=True).first()
+    if thread is None or not is_linked(thread.consumer_id, thread.supplier_id):
+        return None
+    return thread
+
+
+def _poll_messages(request, thread, since):
+    """
+    (oldest messages after `since`, up to one page; whether more follow).
+    """
+    limit = KeysetPagination.max_page_size
+    messages = list(
+        ChatMessage.objects.filter(thread=thread, created_at__gt=since).select_related('sender')
+        .order_by('created_at', 'id')[:limit + 1]
+    )
+    return ChatMessageSerializer(messages[:limit], many=True, context={'request': request}).data, len(messages) > limit
+
+
+async def chat_messages_poll(request, thread_pk):
+    """
+    Long-poll for new messages in a thread.
+    GET /api/support/chats/{id}/messages/poll/?since=2025-11-22T10:00:00Z&timeout=25
+
+    Answers at once if there are messages newer than `since`, otherwise parks
+    until one is sent or `timeout` seconds pass (then returns an empty list).
+    Under ASGI a parked request holds no thread and no DB connection.
+
+    At most one page (KeysetPagination.max_page_size) of the oldest new
+    messages is returned; `has_more` says to poll again at once with the
+    last one's `created_at` as `since`. A `since` without a zone means UTC.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed as exc:
+        return JsonResponse({'detail': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+    thread = await sync_to_async(_poll_thread)(auth[0], thread_pk)
+    if thread is None:
+        return JsonResponse({'detail': 'Thread not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        since = parse_datetime(request.GET.get('since', '')) or timezone.now()
+    except ValueError:
+        # Well formed but no such date, such as month 13
+        return JsonResponse({'since': ['Not a valid date and time.']}, status=status.HTTP_400_BAD_REQUEST)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    try:
+        timeout = float(request.GET.get('timeout', settings.CHAT_LONG_POLL_MAX_TIMEOUT))
+    except ValueError:
+        timeout = settings.CHAT_LONG_POLL_MAX_TIMEOUT
+    timeout = max(0, min(timeout, settings.CHAT_LONG_POLL_MAX_TIMEOUT))
+
+    # Subscribe before looking, so a message sent in between still wakes us
+    subscription = await get_broker().subscribe(thread.id)
+    try:
+        messages, has_more = await sync_to_async(_poll_messages)(request, thread, since)
+        if not messages and await subscription.wait(timeout):
+            messages, has_more = await sync_to_async(_poll_messages)(request, thread, since)
+    finally:
+        subscription.close()
+
+    return JsonResponse({'results': messages, 'has_more': has_more})
@@ -0,0 +1,339 @@
+import http.client
+import json
+import random
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from companies.models import Link, LinkStatus
+from orders.models import Order, OrderItem
+from products.models import Product
+from stock.services import shard_stock
+from support.models import ChatThread
+from .seed_scale import GOODS
+
+# Default share of each scenario in the mix
+MIX = {'browse': 40, 'search': 20, 'order': 15, 'chat': 15, 'notifications': 10}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def summarize(samples, errors, seconds):
+    latencies = sorted(latency for latency, _ in samples)
+    queries = [count for _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / seconds, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'queries': round(sum(queries) / len(queries), 1) if queries else None,
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in MIX or not weight.isdigit():
+            raise ValueError(f"Use name=weight with names from {', '.join(MIX)}: {part}")
+        mix[name] = int(weight)
+    return mix
+
+
+class Recorder:
+    """
+    Latency and X-DB-Queries of every request per endpoint, once measuring
+    has started. Shared by all virtual users.
+    """
+
+    def __init__(self):
+        self.measuring = threading.Event()
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def add(self, label, status, latency, queries):
+        if not self.measuring.is_set():
+            return
+        with self.lock:
+            if 200 <= status < 300:
+                self.samples[label].append((latency, queries))
+            else:
+                self.errors[label][status] += 1
+
+
+class VirtualUser:
+    """
+    One consumer on one keep-alive connection, running scenarios back to
+    back until told to stop.
+    """
+
+    def __init__(self, base, email, password, world, recorder, seed):
+        self.base = base
+        self.email = email
+        self.password = password
+        self.world = world
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.conn = None
+        self.token = None
+        self.chat_since = timezone.now().isoformat()
+
+    def connect(self):
+        cls = http.client.HTTPSConnection if self.base.scheme == 'https' else http.client.HTTPConnection
+        self.conn = cls(self.base.hostname, self.base.port, timeout=30)
+
+    def login(self):
+        status, data, _, _ = self.send('POST', '/api/auth/login/', {'email': self.email, 'password': self.password})
+        if status != 200:
+            raise CommandError(f"Login as {self.email} failed with {status}")
+        self.token = data['access']
+
+    def send(self, method, path, body=None, headers=None):
+        """
+        (status, decoded JSON or None, seconds, X-DB-Queries or None); status 0 on a network error.
+        """
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        if self.conn is None:
+            self.connect()
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return 0, None, time.perf_counter() - started, None
+        latency = time.perf_counter() - started
+        queries = response.getheader('X-DB-Queries')
+        try:
+            data = json.loads(payload) if payload else None
+        except ValueError:
+            data = None
+        return response.status, data, latency, int(queries) if queries is not None else None
+
+    def call(self, label, method, path, body=None, headers=None):
+        status, data, latency, queries = self.send(method, path, body, headers)
+        if status == 401:
+            # Access token expired on a long run
+            self.token = None
+            self.login()
+            status, data, latency, queries = self.send(method, path, body, headers)
+        self.recorder.add(label, status, latency, queries)
+        return data if 200 <= status < 300 else None
+
+    def run(self, stop):
+        scenarios = list(self.world['mix'])
+        weights = [self.world['mix'][name] for name in scenarios]
+        while not stop.is_set():
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+    # Scenarios
+
+    def browse(self):
+        data = self.call('GET /api/products/', 'GET', f"/api/products/?supplier={self.world['supplier']}")
+        for _ in range(self.rng.randint(0, 2)):
+            if not data or not data.get('next'):
+                break
+            page = urlsplit(data['next'])
+            data = self.call('GET /api/products/ next page', 'GET', f"{page.path}?{page.query}")
+        if data and data.get('results'):
+            product = self.rng.choice(data['results'])
+            self.call('GET /api/products/{id}/', 'GET', f"/api/products/{product['id']}/")
+
+    def search(self):
+        query = urlencode({'q': self.rng.choice(GOODS)})
+        self.call('GET /api/products/?q=', 'GET', f"/api/products/?{query}")
+        if self.rng.random() < 0.3:
+            self.call('GET /api/products/facets/?q=', 'GET', f"/api/products/facets/?{query}")
+
+    def order(self):
+        product, minimum = self.rng.choice(self.world['hot'])
+        items = [{'product_id': product, 'quantity': minimum}]
+        if self.rng.random() < 0.5:
+            product, minimum = self.rng.choice(self.world['products'])
+            items.append({'product_id': product, 'quantity': minimum * self.rng.randint(1, 3)})
+        self.call('POST /api/orders/', 'POST', '/api/orders/',
+                  {'supplier': self.world['supplier'], 'items': items},
+                  {'Idempotency-Key': str(uuid.UUID(int=self.rng.getrandbits(128)))})
+        if self.rng.random() < 0.5:
+            self.call('GET /api/orders/', 'GET', '/api/orders/')
+
+    def chat(self):
+        thread = self.world['threads'][self.email]
+        if self.rng.random() < 0.1:
+            self.call('POST /api/support/chats/{id}/messages/', 'POST', f"/api/support/chats/{thread}/messages/",
+                      {'text': "Is the order on its way?"})
+        query = urlencode({'since': self.chat_since, 'timeout': 0})
+        data = self.call('GET /api/support/chats/{id}/messages/poll/', 'GET',
+                         f"/api/support/chats/{thread}/messages/poll/?{query}")
+        if data and data['results']:
+            self.chat_since = data['results'][-1]['created_at']
+
+    def notifications(self):
+        self.call('GET /api/notifications/', 'GET', '/api/notifications/')
+        if self.rng.random() < 0.2:
+            self.call('POST /api/notifications/mark_all_read/', 'POST', '/api/notifications/mark_all_read/')
+
+
+class Command(BaseCommand):
+    help = ("Mixed HTTP load test against a running server and a seeded database (seed_scale): catalog browsing "
+            "and search, orders on a few hot products, chat polling and notifications. Prints and saves "
+            "req/s, latency percentiles and queries per request for each endpoint")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--users', type=int, default=16, help="Virtual users, each a different consumer")
+        parser.add_argument('--duration', type=float, default=60.0)
+        parser.add_argument('--warmup', type=float, default=10.0)
+        parser.add_argument('--mix', type=parse_mix, default=MIX,
+                            help="Scenario weights, e.g. browse=40,search=20,order=15,chat=15,notifications=10")
+        parser.add_argument('--hot-skus', type=int, default=3, help="Products every order takes from")
+        parser.add_argument('--hot-shards', type=int, default=0, help="Split the hot products' stock (shard_stock)")
+        parser.add_argument('--email-suffix', default='@scale.test', help="Which consumers to log in as")
+        parser.add_argument('--password', default='scalepass')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="JSON results file (default: bench/results/load-<time>.json)")
+        parser.add_argument('--compare', help="Earlier JSON results to compare with")
+
+    def handle(self, *args, **options):
+        world, emails = self.prepare(options)
+        base = urlsplit(options['base_url'])
+        recorder = Recorder()
+        users = [VirtualUser(base, email, options['password'], world, recorder, f"{options['seed']}:{n}")
+                 for n, email in enumerate(emails)]
+        for user in users:
+            user.login()
+        connection.close()  # the server's pool needs it more during the run
+
+        self.stdout.write(f"{len(users)} users on supplier {world['supplier']}, "
+                          f"hot products {[product for product, _ in world['hot']]}")
+        stop = threading.Event()
+        threads = [threading.Thread(target=user.run, args=(stop,)) for user in users]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['warmup'])
+        recorder.measuring.set()
+        started = time.perf_counter()
+        time.sleep(options['duration'])
+        recorder.measuring.clear()
+        seconds = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        result = self.result(options, world, recorder, seconds)
+        self.report(result)
+        output = Path(options['output'] or settings.BASE_DIR / 'bench' / 'results' /
+                      f"load-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(result, indent=2) + "\n")
+        self.stdout.write(f"Saved {output}")
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), result)
+
+    def prepare(self, options):
+        """
+        Pick the supplier most of the seeded consumers buy from, its first
+        products as the hot ones (stock topped up, so orders measure
+        contention rather than running out) and a chat thread per consumer.
+        """
+        links = Link.objects.filter(status=LinkStatus.ACCEPTED, is_active=True,
+                                    consumer__staff__email__endswith=options['email_suffix'])
+        top = links.values('supplier').annotate(consumers=Count('consumer')).order_by('-consumers').first()
+        if top is None:
+            raise CommandError(f"No consumer users ending in {options['email_suffix']}: run seed_scale first.")
+        supplier = top['supplier']
+        consumers = list(
+            links.filter(supplier=supplier).order_by('consumer')
+            .values_list('consumer', 'consumer__staff__email')[:options['users']]
+        )
+        products = Product.objects.filter(supplier=supplier, is_archived=False, is_available=True).order_by('id')
+        hot = list(products[:options['hot_skus']])
+        if len(hot) < options['hot_skus']:
+            raise CommandError(f"Supplier {supplier} has only {len(hot)} products.")
+        for product in hot:
+            shard_stock(product, options['hot_shards'], stock_level=10 ** 9)
+        threads = {
+            email: ChatThread.objects.get_or_create(consumer_id=consumer, supplier_id=supplier)[0].id
+            for consumer, email in consumers
+        }
+        return {
+            'supplier': supplier,
+            # (id, min_order_qty)
+            'hot': [(product.id, product.min_order_qty) for product in hot],
+            'products': list(products.filter(stock_level__gte=100).values_list('id', 'min_order_qty')[:1000])
+                        or [(product.id, product.min_order_qty) for product in hot],
+            'threads': threads,
+            'mix': options['mix'],
+        }, [email for _, email in consumers]
+
+    def result(self, options, world, recorder, seconds):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=settings.BASE_DIR).stdout.strip() or None
+        except OSError:
+            commit = None
+        with connection.cursor() as cursor:
+            # Planner estimates: exact counts of the big tables take too long
+            cursor.execute("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)",
+                           [[model._meta.db_table for model in (Product, Order, OrderItem)]])
+            rows = dict(cursor.fetchall())
+        everything = [sample for samples in recorder.samples.values() for sample in samples]
+        return {
+            'started_at': timezone.now().isoformat(),
+            'commit': commit,
+            'base_url': options['base_url'],
+            'options': {name: options[name] for name in ('users', 'duration', 'mix', 'hot_skus', 'hot_shards')},
+            'data': rows,
+            'total': summarize(everything, sum(sum(e.values()) for e in recorder.errors.values()), seconds),
+            'endpoints': {
+                label: {**summarize(recorder.samples[label], sum(recorder.errors[label].values()), seconds),
+                        'error_statuses': dict(recorder.errors[label])}
+                for label in sorted(set(recorder.samples) | set(recorder.errors))
+            },
+        }
+
+    def report(self, result):
+        self.stdout.write(f"{'endpoint':<48} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>8} {'errors':>7}")
+        for label, row in [*result['endpoints'].items(), ('total', result['total'])]:
+            queries = '-' if row['queries'] is None else row['queries']
+            self.stdout.write(f"{label:<48} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                              f"{row['p99_ms']:>8.1f} {queries:>8} {row['errors']:>7}")
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nAgainst {before.get('commit')} ({before.get('started_at')}):")
+        self.stdout.write(f"{'endpoint':<48} {'req/s':>16} {'p95 ms':>16} {'queries':>12}")
+        rows = {**{label: None for label in before['endpoints']}, **after['endpoints']}
+        for label in rows:
+            old = before['endpoints'].get(label)
+            new = after['endpoints'].get(label)
+            if old is None or new is None:
+                self.stdout.write(f"{label:<48} {'only in ' + ('new' if old is None else 'old') + ' run':>16}")
+                continue
+            self.stdout.write(f"{label:<48} {old['rps']:>7.1f} -> {new['rps']:<6.1f} "
+                              f"{old['p95_ms']:>7.1f} -> {new['p95_ms']:<6.1f} "
+                              f"{old['queries'] or '-':>4} -> {new['queries'] or '-':<4}")
+        old, new = before['total'], after['total']
+        self.stdout.write(f"{'total':<48} {old['rps']:>7.1f} -> {new['rps']:<6.1f} "
+                          f"{old['p95_ms']:>7.1f} -> {new['p95_ms']:<6.1f}")
@@ -0,0 +1,385 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from bisect import bisect
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from companies.models import Consumer, DeliveryMethod, Link, LinkStatus, Supplier
+from orders.models import Order, OrderDeliveryMethod, OrderItem, OrderStatus
+from products.models import Product
+from users.models import UserRole
+
+User = get_user_model()
+
+ADJECTIVES = ["Fresh", "Organic", "Golden", "Green", "Red", "Sweet", "Wild", "Local", "Premium", "Farm",
+              "Smoked", "Dried", "Ripe", "Young", "Mountain", "River", "Valley", "Sunny", "Royal", "Classic"]
+GOODS = ["Apples", "Pears", "Tomatoes", "Cucumbers", "Potatoes", "Onions", "Carrots", "Cabbage", "Milk",
+         "Cheese", "Yogurt", "Butter", "Eggs", "Chicken", "Beef", "Lamb", "Trout", "Honey", "Flour", "Rice",
+         "Buckwheat", "Walnuts", "Apricots", "Melons", "Grapes", "Lemons", "Bread", "Tea", "Coffee", "Juice"]
+COMPANIES = ["Farm", "Foods", "Trading", "Market", "Wholesale", "Produce", "Dairy", "Group", "Supply", "Co"]
+VENUES = ["Hotel", "Cafe", "Restaurant", "Canteen", "Bakery", "Bistro", "Grill", "Store", "Kitchen", "Bar"]
+CITIES = ["Astana", "Almaty", "Shymkent", "Karaganda", "Aktobe", "Taraz", "Pavlodar", "Oskemen", "Semey", "Atyrau"]
+FIRST_NAMES = ["Aigerim", "Dana", "Aruzhan", "Madina", "Alibek", "Nursultan", "Daniyar", "Timur", "Asel", "Yerlan"]
+LAST_NAMES = ["Abenov", "Bekova", "Sadykov", "Nurlanova", "Akhmetov", "Ospanova", "Zhakupov", "Ibraeva"]
+UNITS = ["kg", "pcs", "box", "l", "pack"]
+
+# Set by the command before the worker processes fork
+_plan = None
+
+
+def count(value):
+    """
+    '20M' -> 20000000, '5k' -> 5000, '300' -> 300.
+    """
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(value[-1:].lower(), 1)
+    try:
+        return int(float(value[:-1] if scale > 1 else value) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a count: {value}")
+
+
+def _split(total, weights):
+    """
+    Share `total` out in proportion to `weights`, as whole numbers.
+    """
+    scale = total / sum(weights)
+    shares = [int(weight * scale) for weight in weights]
+    for i in range(total - sum(shares)):
+        shares[i % len(shares)] += 1
+    return shares
+
+
+def _pick(cum_weights, rng):
+    return bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def _price(product_index):
+    """
+    Price in cents, a function of the product's place in the run, so
+    order lines need no lookup.
+    """
+    return 50 + product_index * 2654435761 % 20000
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _copy(model, columns, lines):
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN") as copy:
+            copy.write(''.join(lines))
+
+
+class Plan:
+    """
+    Everything the batches share: sizes, first ids, how products are
+    spread over suppliers and which suppliers each consumer buys from.
+    Drawn from its own seed, so it is the same in every process.
+    """
+
+    def __init__(self, options, now):
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.now = now
+        self.days = options['days']
+        self.suppliers = options['suppliers']
+        self.consumers = options['consumers']
+        self.products = options['products']
+        self.orders = options['orders']
+        self.extra_items = options['items_per_order'] - 1
+        self.password = make_password(options['password'])
+        rng = random.Random(f"{self.seed}:plan")
+
+        # A few suppliers are big and popular, most are small
+        popularity = [1 / (i + 1) ** 0.8 for i in range(self.suppliers)]
+        supplier_weights = list(accumulate(popularity))
+        self.supplier_products = _split(self.products, popularity) if self.suppliers else []
+        self.product_offsets = list(accumulate(self.supplier_products, initial=0))
+
+        # Each consumer links to a handful of suppliers, mostly popular
+        # ones; its orders go to the accepted links that have products
+        self.links = []
+        self.buys_from = []
+        activity = []
+        extra_links = options['links_per_consumer'] - 1
+        for _ in range(self.consumers):
+            wanted = min(1 + int(rng.expovariate(1 / extra_links)) if extra_links > 0 else 1,
+                         max(1, self.suppliers // 2))
+            chosen = {}
+            while self.suppliers and len(chosen) < wanted:
+                supplier = _pick(supplier_weights, rng)
+                roll = rng.random()
+                chosen.setdefault(supplier, LinkStatus.ACCEPTED if roll < 0.88 else
+                                  LinkStatus.PENDING if roll < 0.96 else LinkStatus.BLOCKED)
+            self.links.append(sorted(chosen.items()))
+            sellers = [s for s, status in chosen.items() if status == LinkStatus.ACCEPTED and self.supplier_products[s]]
+            self.buys_from.append((sellers, list(accumulate(popularity[s] for s in sellers))))
+            activity.append(rng.lognormvariate(0, 1) if sellers else 0)
+        self.consumer_weights = list(accumulate(activity))
+
+    def reserve_ids(self):
+        self.first_supplier = _reserve(Supplier, self.suppliers)
+        self.first_consumer = _reserve(Consumer, self.consumers)
+        self.first_product = _reserve(Product, self.products)
+        self.first_order = _reserve(Order, self.orders)
+
+    def batches(self, rows):
+        return range((rows + self.batch_size - 1) // self.batch_size)
+
+    def span(self, batch, rows):
+        start = batch * self.batch_size
+        return start, min(rows, start + self.batch_size)
+
+    def created_at(self, rng, days_before=0):
+        return self.now - timedelta(days=days_before + self.days * rng.random())
+
+
+def _reserve(model, rows):
+    """
+    Take `rows` ids from the table's sequence and return the first.
+    """
+    if not rows:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+            [model._meta.db_table, model._meta.db_table, rows]
+        )
+        return cursor.fetchone()[0] - rows + 1
+
+
+def copy_suppliers(batch):
+    p = _plan
+    rng = random.Random(f"{p.seed}:suppliers:{batch}")
+    start, end = p.span(batch, p.suppliers)
+    lines = []
+    for i in range(start, end):
+        created = p.created_at(rng, days_before=p.days).isoformat()
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(GOODS)} {rng.choice(COMPANIES)} {i + 1}"
+        options = rng.choice(DeliveryMethod.values)
+        lines.append(f"{p.first_supplier + i}\t{name}\t{rng.randint(1, 200)} Abay St, {rng.choice(CITIES)}\t"
+                     f"{options}\t{rng.randint(1, 5)}\tt\t{created}\t{_uuid(rng)}\t{_uuid(rng)}\t{created}\n")
+    _copy(Supplier, ['id', 'company_name', 'address', 'delivery_options', 'lead_time', 'is_active',
+                     'created_at', 'catalog_version', 'order_version', 'updated_at'], lines)
+    return len(lines)
+
+
+def copy_consumers(batch):
+    p = _plan
+    rng = random.Random(f"{p.seed}:consumers:{batch}")
+    start, end = p.span(batch, p.consumers)
+    lines = []
+    for i in range(start, end):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(VENUES)} {i + 1}"
+        lines.append(f"{p.first_consumer + i}\t{name}\t{rng.randint(1, 200)} Kabanbay St, {rng.choice(CITIES)}\t"
+                     f"t\t{p.created_at(rng, days_before=p.days).isoformat()}\t{_uuid(rng)}\n")
+    _copy(Consumer, ['id', 'company_name', 'address', 'is_active', 'created_at', 'order_version'], lines)
+    return len(lines)
+
+
+def copy_users(batch):
+    """
+    Batch n holds the staff of the suppliers in batch n and the buyers of
+    the consumers in batch n: an owner, a manager and a sales rep per
+    supplier, one user per consumer.
+    """
+    p = _plan
+    rng = random.Random(f"{p.seed}:users:{batch}")
+    people = []
+    start, end = p.span(batch, p.suppliers)
+    for i in range(start, end):
+        supplier_id = p.first_supplier + i
+        for role, login in ((UserRole.OWNER, 'owner'), (UserRole.MANAGER, 'manager'), (UserRole.SALES_REP, 'sales')):
+            people.append((f"{login}{supplier_id}@scale.test", role, supplier_id, '\\N'))
+    start, end = p.span(batch, p.consumers)
+    for i in range(start, end):
+        consumer_id = p.first_consumer + i
+        people.append((f"buyer{consumer_id}@scale.test", UserRole.CONSUMER, '\\N', consumer_id))
+
+    lines = [
+        f"{p.password}\t\\N\tf\t{rng.choice(FIRST_NAMES)}\t{rng.choice(LAST_NAMES)}\tf\tt\t"
+        f"{p.created_at(rng, days_before=p.days).isoformat()}\t{email}\t{role}\t{supplier_id}\t{consumer_id}\n"
+        for email, role, supplier_id, consumer_id in people
+    ]
+    _copy(User, ['password', 'last_login', 'is_superuser', 'first_name', 'last_name', 'is_staff', 'is_active',
+                 'date_joined', 'email', 'role', 'supplier_id', 'consumer_id'], lines)
+    return len(lines)
+
+
+def copy_links(batch):
+    p = _plan
+    rng = random.Random(f"{p.seed}:links:{batch}")
+    start, end = p.span(batch, p.consumers)
+    lines = []
+    for i in range(start, end):
+        for supplier, status in p.links[i]:
+            created = p.created_at(rng, days_before=p.days).isoformat()
+            lines.append(f"{p.first_supplier + supplier}\t{p.first_consumer + i}\t{status}\tt\t{created}\t{created}\n")
+    _copy(Link, ['supplier_id', 'consumer_id', 'status', 'is_active', 'created_at', 'updated_at'], lines)
+    return len(lines)
+
+
+def copy_products(batch):
+    p = _plan
+    rng = random.Random(f"{p.seed}:products:{batch}")
+    start, end = p.span(batch, p.products)
+    supplier = bisect(p.product_offsets, start) - 1
+    lines = []
+    for i in range(start, end):
+        while i >= p.product_offsets[supplier + 1]:
+            supplier += 1
+        goods = rng.choice(GOODS)
+        price = _price(i)
+        discount = _money(price * 9 // 10) if rng.random() < 0.1 else '\\N'
+        stock = 0 if rng.random() < 0.03 else rng.randint(1, 2000)
+        minimum = 1 if rng.random() < 0.8 else rng.choice((5, 10, 20))
+        lines.append(
+            f"{p.first_product + i}\t{p.first_supplier + supplier}\t{rng.choice(ADJECTIVES)} {goods} {i + 1}\t"
+            f"{goods} from {rng.choice(CITIES)}\t{_money(price)}\t{discount}\t{rng.choice(UNITS)}\t{stock}\t"
+            f"{minimum}\t0\t{'t' if rng.random() < 0.97 else 'f'}\t{'t' if rng.random() < 0.02 else 'f'}\t\\N\t"
+            f"{p.created_at(rng).isoformat()}\n"
+        )
+    _copy(Product, ['id', 'supplier_id', 'name', 'description', 'price', 'discount_price', 'unit', 'stock_level',
+                    'min_order_qty', 'stock_shards', 'is_available', 'is_archived', 'image', 'updated_at'], lines)
+    return len(lines)
+
+
+def _status(rng, age):
+    roll = rng.random()
+    if age < 2:
+        return (OrderStatus.PENDING if roll < 0.5 else OrderStatus.CONFIRMED if roll < 0.8 else
+                OrderStatus.SHIPPED if roll < 0.95 else OrderStatus.DECLINED)
+    if age < 7:
+        return (OrderStatus.CONFIRMED if roll < 0.2 else OrderStatus.SHIPPED if roll < 0.6 else
+                OrderStatus.DELIVERED if roll < 0.95 else OrderStatus.CANCELED)
+    return OrderStatus.DELIVERED if roll < 0.92 else OrderStatus.CANCELED if roll < 0.97 else OrderStatus.DECLINED
+
+
+def copy_orders(batch):
+    """
+    Orders with their lines. Active consumers order much more than the
+    rest, mostly from their bigger suppliers and those suppliers' first
+    products; there are more orders lately than a year ago.
+    """
+    p = _plan
+    rng = random.Random(f"{p.seed}:orders:{batch}")
+    start, end = p.span(batch, p.orders)
+    orders, items = [], []
+    for i in range(start, end):
+        consumer = _pick(p.consumer_weights, rng)
+        sellers, weights = p.buys_from[consumer]
+        supplier = sellers[_pick(weights, rng)]
+        offset, available = p.product_offsets[supplier], p.supplier_products[supplier]
+
+        wanted = 1 + int(rng.expovariate(1 / p.extra_items)) if p.extra_items > 0 else 1
+        picked = set()
+        while len(picked) < min(wanted, available, 20):
+            picked.add(offset + int(available * rng.random() ** 3))
+        order_id = p.first_order + i
+        total = 0
+        for product in sorted(picked):
+            quantity = 1 + int(rng.expovariate(0.25))
+            price = _price(product)
+            total += quantity * price
+            items.append(f"{order_id}\t{p.first_product + product}\t{quantity}\t{_money(price)}\n")
+
+        age = p.days * (1 - rng.random() ** 0.5)
+        created = p.now - timedelta(days=age)
+        updated = min(p.now, created + timedelta(hours=48 * rng.random()))
+        delivery = OrderDeliveryMethod.DELIVERY if rng.random() < 0.7 else OrderDeliveryMethod.PICKUP
+        orders.append(f"{order_id}\t{p.first_consumer + consumer}\t{p.first_supplier + supplier}\t"
+                      f"{_status(rng, age)}\t{delivery}\t{_money(total)}\tt\t{created.isoformat()}\t"
+                      f"{updated.isoformat()}\n")
+    _copy(Order, ['id', 'consumer_id', 'supplier_id', 'status', 'delivery_method', 'total_amount', 'is_active',
+                  'created_at', 'updated_at'], orders)
+    _copy(OrderItem, ['order_id', 'product_id', 'quantity', 'price_at_time_of_order'], items)
+    return len(orders)
+
+
+def run_batch(task):
+    copy, batch = task
+    with transaction.atomic():
+        return copy(batch)
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with deterministic fake suppliers, consumers, users, links, products and orders "
+            "at production scale, streamed through COPY")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=count, default=10)
+        parser.add_argument('--consumers', type=count, default=100)
+        parser.add_argument('--products', type=count, default=1000, help="In total, e.g. 5M")
+        parser.add_argument('--orders', type=count, default=5000, help="In total, e.g. 20M")
+        parser.add_argument('--links-per-consumer', type=float, default=5.0, help="On average")
+        parser.add_argument('--items-per-order', type=float, default=3.0, help="On average")
+        parser.add_argument('--days', type=int, default=365, help="How far back orders go")
+        parser.add_argument('--seed', type=int, default=1, help="The same seed gives the same data")
+        parser.add_argument('--password', default='scalepass', help="For every generated user")
+        parser.add_argument('--batch-size', type=count, default=50000, help="Rows per COPY and transaction")
+        parser.add_argument('--jobs', type=int, default=min(8, os.cpu_count() or 1),
+                            help="Worker processes, each with its own connection")
+
+    def handle(self, *args, **options):
+        global _plan
+
+        if options['products'] and not options['suppliers']:
+            raise CommandError("Products need at least one supplier.")
+        started = time.monotonic()
+        _plan = plan = Plan(options, timezone.now())
+        if plan.orders and not (plan.consumer_weights and plan.consumer_weights[-1]):
+            raise CommandError("Orders need a consumer with an accepted link to a supplier that has products.")
+        plan.reserve_ids()
+
+        # Each step references rows of the steps before it
+        steps = [
+            [(copy_suppliers, plan.suppliers), (copy_consumers, plan.consumers)],
+            [(copy_users, max(plan.suppliers, plan.consumers)), (copy_links, plan.consumers),
+             (copy_products, plan.products)],
+            [(copy_orders, plan.orders)],
+        ]
+        pool = None
+        if options['jobs'] > 1:
+            # Workers open their own connections
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(options['jobs'])
+        try:
+            for step in steps:
+                for copy, rows in step:
+                    self.run(copy, plan.batches(rows), pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _plan = None
+
+        with connection.cursor() as cursor:
+            for model in (Supplier, Consumer, User, Link, Product, Order, OrderItem):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.monotonic() - started:.0f}s. Users log in as owner<supplier id>@scale.test, "
+            f"buyer<consumer id>@scale.test, ... with password {options['password']!r}."
+        ))
+
+    def run(self, copy, batches, pool):
+        started = time.monotonic()
+        tasks = [(copy, batch) for batch in batches]
+        rows = sum(pool.imap_unordered(run_batch, tasks) if pool else map(run_batch, tasks))
+        elapsed = time.monotonic() - started
+        name = copy.__name__.removeprefix('copy_')
+        self.stdout.write(f"{name:>10} {rows:>12,} rows {elapsed:>8.1f}s {rows / max(elapsed, 1e-6):>12,.0f} rows/s")
@@ -1,8 +1,14 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F, Sum
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
-from companies.models import Supplier, Consumer
+from companies.models import Supplier, Consumer, Link, LinkStatus
+from orders.models import Order, OrderItem
+from products.models import Product
 from users.models import UserRole
 
 User = get_user_model()
@@ -295,4 +301,37 @@ class UserAuthTests(APITestCase):
         self.assertFalse(staff.is_active)
 
         staff2 = User .objects.get(email="staff2@test.com")
-        self.assertFalse(staff2.is_active)
\ No newline at end of file
+        self.assertFalse(staff2.is_active)
+
+
+class SeedScaleTests(APITestCase):
+    def seed(self):
+        """
+        Run seed_scale and return what it made of the orders.
+        """
+        before = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        call_command('seed_scale', suppliers=4, consumers=12, products=80, orders=60, batch_size=7, jobs=1,
+                     stdout=StringIO())
+        return list(Order.objects.filter(id__gt=before).order_by('id')
+                    .values_list('status', 'total_amount', 'delivery_method'))
+
+    def test_seeds_consistent_data(self):
+        self.seed()
+
+        self.assertEqual((Supplier.objects.count(), Consumer.objects.count(), Product.objects.count(),
+                          Order.objects.count()), (4, 12, 80, 60))
+        self.assertEqual(User.objects.filter(supplier__isnull=False).count(), 4 * 3)
+        self.assertEqual(User.objects.filter(role=UserRole.CONSUMER).count(), 12)
+        self.assertTrue(self.client.login(email=User.objects.filter(role=UserRole.OWNER).first().email,
+                                          password="scalepass"))
+        # Orders only between linked companies, for the supplier's own products
+        for order in Order.objects.all():
+            self.assertTrue(Link.objects.filter(supplier=order.supplier_id, consumer=order.consumer_id,
+                                                status=LinkStatus.ACCEPTED).exists())
+            total = order.items.aggregate(total=Sum(F('quantity') * F('price_at_time_of_order')))['total']
+            self.assertEqual(order.total_amount, total)
+        self.assertFalse(OrderItem.objects.exclude(product__supplier=F('order__supplier')).exists())
+
+    def test_same_seed_gives_same_data(self):
+        first = self.seed()
+        self.assertEqual(self.seed(), first)
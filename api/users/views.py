@@ -44,6 +44,7 @@ class StaffViewSet(viewsets.ModelViewSet):
     """
     permission_classes = [IsOwnerOrManager]
     queryset = User.objects.none()
+    ordering = ('-date_joined', '-id')
 
     def get_queryset(self):
         return User.objects.filter(supplier=self.request.user.supplier).exclude(id=self.request.user.id)
@@ -5,9 +5,10 @@ import {
 } from 'react-native';
 import BorderedInput from '@/components/borderedinput';
 import { GlobalContext } from '@/util/context';
-import { callGet, callPost } from '@/util/fetch';
+import { syncProducts } from '@/util/catalog';
+import { callPost } from '@/util/fetch';
 import type { OrderRead } from '@/types/order';
-import type { OrderProduct, ProductInfo } from '@/types/product';
+import type { OrderProduct } from '@/types/product';
 import type { SupplierSearchParams } from '@/types/supplier';
 
 function Product({ info }: { info: OrderProduct }) {
@@ -56,9 +57,9 @@ export default function NewOrder() {
   const [products, setProducts] = useState<OrderProduct[]>([]);
   const router = useRouter();
   useEffect(() => {
-    callGet<ProductInfo[]>('/api/products/', context).then(result => {
+    syncProducts(context).then(result => {
       const filtered = result.filter(p => p.supplier == id);
-      const ps: OrderProduct[] = result.map((p, i) => ({
+      const ps: OrderProduct[] = filtered.map((p, i) => ({
         product: p,
         amount: 0,
         setAmount: n => {
@@ -1,6 +1,7 @@
 import { useContext } from 'react';
 import { Pressable } from 'react-native';
 import MaterialIcons from '@expo/vector-icons/MaterialIcons';
+import { resetCatalog } from '@/util/catalog';
 import { GlobalContext } from '@/util/context'
 
 export default function Logout() {
@@ -10,6 +11,7 @@ export default function Logout() {
       onPress={() => {
         context.setAccessToken(null);
         context.setRefreshToken(null);
+        resetCatalog();
       }}
     >
     {({pressed}) => (
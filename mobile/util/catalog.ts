@@ -0,0 +1,41 @@
+import { GlobalState } from '@/types/state';
+import type { ProductInfo } from '@/types/product';
+import { callGet } from '@/util/fetch';
+
+type Changes = {
+  token: string;
+  more: boolean;
+  full: boolean;
+  changed: ProductInfo[];
+  removed: number[];
+  removed_suppliers: number[];
+};
+
+// Local copy of every product the user can see. After the first download
+// only products changed since the last sync token are fetched.
+const products = new Map<number, ProductInfo>();
+let token: string | null = null;
+
+export function resetCatalog() {
+  products.clear();
+  token = null;
+}
+
+export async function syncProducts(state: GlobalState): Promise<ProductInfo[]> {
+  let more = true;
+  while (more) {
+    const query = token === null ? '' : `?since=${encodeURIComponent(token)}`;
+    const page = await callGet<Changes>(`/api/products/changes/${query}`, state);
+    if (page.full && token === null) products.clear();
+    for (const supplier of page.removed_suppliers) {
+      for (const [id, product] of products) {
+        if (product.supplier == supplier) products.delete(id);
+      }
+    }
+    for (const id of page.removed) products.delete(id);
+    for (const product of page.changed) products.set(product.id, product);
+    token = page.token;
+    more = page.more;
+  }
+  return [...products.values()];
+}
@@ -2,18 +2,32 @@ import { GlobalState } from '@/types/state';
 
 const SERVER_URL = 'http://192.168.0.13:8000';
 
+// Last body and ETag per GET path. The server answers 304 when nothing
+// changed, so screens reuse the cached body instead of downloading it again.
+const etagCache = new Map<string, { etag: string; body: unknown }>();
+
+// Sent with every POST and reused by its retries, so the server creates
+// an order or message once even if a response was lost on the way back.
+function newIdempotencyKey(): string {
+  const random = () => Math.random().toString(36).slice(2);
+  return `${Date.now().toString(36)}-${random()}${random()}`;
+}
+
 async function callMethodRaw(
   method: string,
   path: string,
   data: object | null = null,
   state: GlobalState | null = null,
   retry: boolean = true,
+  idempotencyKey: string | null = method === 'POST' ? newIdempotencyKey() : null,
 ): Promise<Response> {
   if (path.startsWith('/')) path = path.substr(1);
   const headers: {
     'Accept': string;
     'Content-Type'?: string;
     'Authorization'?: string;
+    'If-None-Match'?: string;
+    'Idempotency-Key'?: string;
   } = { 'Accept': 'application/json' };
   const request: RequestInit = { method, headers };
   if (data !== null) {
@@ -23,7 +37,25 @@ async function callMethodRaw(
   if (state?.accessToken !== null) {
     headers['Authorization'] = `Bearer ${state!.accessToken!}`;
   }
-  const response = await fetch(`${SERVER_URL}/${path}`, request);
+  const cached = method === 'GET' ? etagCache.get(path) : undefined;
+  if (cached !== undefined) {
+    headers['If-None-Match'] = cached.etag;
+  }
+  if (idempotencyKey !== null) {
+    headers['Idempotency-Key'] = idempotencyKey;
+  }
+  let response: Response;
+  try {
+    response = await fetch(`${SERVER_URL}/${path}`, request);
+  } catch (e) {
+    // The request may have reached the server: only resend it when the
+    // key makes a second delivery harmless
+    if (idempotencyKey === null || !retry) throw e;
+    return await callMethodRaw(method, path, data, state, false, idempotencyKey);
+  }
+  if (response.status === 304 && cached !== undefined) {
+    return response;
+  }
   if (!response.ok) {
     if (state?.refreshToken !== null && retry) {
       try {
@@ -33,7 +65,7 @@ async function callMethodRaw(
           { refresh: state!.refreshToken! },
         );
         state!.setAccessToken(access);
-        return await callMethodRaw(method, path, data, state, false);
+        return await callMethodRaw(method, path, data, state, false, idempotencyKey);
       } catch(e) {}
     }
     throw response.status;
@@ -48,7 +80,14 @@ export async function callMethod<T>(
   state: GlobalState | null = null,
 ): Promise<T> {
   const raw = await callMethodRaw(method, path, data, state);
-  return await raw.json() as T;
+  if (method !== 'GET') return await raw.json() as T;
+
+  const key = path.startsWith('/') ? path.substr(1) : path;
+  if (raw.status === 304) return etagCache.get(key)!.body as T;
+  const body = await raw.json();
+  const etag = raw.headers.get('ETag');
+  if (etag !== null) etagCache.set(key, { etag, body });
+  return body as T;
 }
 
 export async function callPost<T>(
@@ -59,12 +98,29 @@ export async function callPost<T>(
   return await callMethod('POST', path, data, state);
 }
 
+type Page = { next: string | null; results: unknown[] };
+
+function isPage(body: unknown): body is Page {
+  return body !== null && typeof body === 'object'
+    && 'next' in body && Array.isArray((body as Page).results);
+}
+
 export async function callGet<T>(
   path: string,
   state: GlobalState,
   data: object | null = null,
 ): Promise<T> {
-  return await callMethod('GET', path, data, state);
+  const body = await callMethod<unknown>('GET', path, data, state);
+  if (!isPage(body)) return body as T;
+  // List endpoints are cursor-paginated: follow `next` to read every page
+  let results = body.results;
+  let next = body.next;
+  while (next !== null) {
+    const page = await callMethod<Page>('GET', next.replace(/^https?:\/\/[^/]+/, ''), data, state);
+    results = results.concat(page.results);
+    next = page.next;
+  }
+  return results as T;
 }
 
 export async function callPatch<T>(
@@ -62,6 +62,8 @@ export default function OrdersPage() {
       );
     } catch (err) {
       alert(`Error updating order status: ${err.message}`);
+      // Someone else may have changed the order first; show its real status
+      fetchOrders();
     } finally {
       setProcessingId(null);
     }
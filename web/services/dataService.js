@@ -35,11 +35,25 @@ const handleResponse = async (response) => {
   return response.json();
 };
 
+// Helper to read every page of a cursor-paginated list endpoint
+const getAllPages = async (url) => {
+  let results = [];
+  let next = url;
+  while (next) {
+    const response = await fetch(next, { method: 'GET', headers: getHeaders() });
+    const page = await handleResponse(response);
+    results = results.concat(page.results);
+    next = page.next;
+  }
+  return results;
+};
+
 export const dataService = {
   // --- PRODUCTS ---
-  async getProducts() {
-    const response = await fetch(`${BASE_URL}/api/products/`, { method: 'GET', headers: getHeaders() });
-    return handleResponse(response);
+  // Optional search text is matched server-side (ranked, typo tolerant)
+  async getProducts(query = '') {
+    const params = query ? `?q=${encodeURIComponent(query)}` : '';
+    return getAllPages(`${BASE_URL}/api/products/${params}`);
   },
 
   async createProduct(data) {
@@ -63,8 +77,7 @@ export const dataService = {
 
   // --- ORDERS ---
   async getOrders() {
-    const response = await fetch(`${BASE_URL}/api/orders/`, { method: 'GET', headers: getHeaders() });
-    return handleResponse(response);
+    return getAllPages(`${BASE_URL}/api/orders/`);
   },
 
   async updateOrderStatus(id, status) {
@@ -78,8 +91,7 @@ export const dataService = {
 
   // --- ACCOUNTS (STAFF) ---
   async getAccounts() {
-    const response = await fetch(`${BASE_URL}/api/auth/staff/`, { method: 'GET', headers: getHeaders() });
-    return handleResponse(response);
+    return getAllPages(`${BASE_URL}/api/auth/staff/`);
   },
 
   async createAccount(userData) {
@@ -99,8 +111,7 @@ export const dataService = {
   // --- UC4: COMPLAINTS ---
   // GET /api/support/complaints/
   async getComplaints() {
-    const response = await fetch(`${BASE_URL}/api/support/complaints/`, { method: 'GET', headers: getHeaders() });
-    return handleResponse(response);
+    return getAllPages(`${BASE_URL}/api/support/complaints/`);
   },
 
   // PATCH /api/support/complaints/{id}/ - Resolve or Dismiss